@@ -1,54 +1,27 @@
 import json
 import os
 
-from mana.feeder import PcapFeeder
-from mana.handler import DetectionHandler
+from mana.evaluation import record_dataset, precision_recall_curves
 from mana.method import load_methods_json
-from mana.utility import calculate_precision_recall_f1, print_precision_recall_f1
+from mana.utility import print_precision_recall_f1
 
-
-class Counter:
-
-    def __init__(self):
-        self.value = 0
-
-    def increment_by_one(self, *args, **kwargs):
-        self.value += 1
-
-    def reset(self):
-        self.value = 0
-
-
-def is_pcap_spoofed(file, counter, handler):
-    feeder = PcapFeeder(handler, file)
-    feeder.run()
-    return counter.value > 0
-
-
-counter = Counter()
 device_ids, method_classes, method_options = load_methods_json("methods.json")
 
 base_path = "../data/dataset/"
 with open(os.path.join(base_path, "dataset.json")) as json_file:
     data = json.load(json_file)
 
-tp, fp, fn = 0, 0, 0
-for entry in data:
-    file = entry['filename']
-    label = entry['label']
+recordings = [os.path.join(base_path, entry['filename']) for entry in data]
+labels = [entry['label'] == "spoofed" for entry in data]
 
-    counter.reset()
-    handler = DetectionHandler(device_ids=device_ids, method_classes=method_classes,
-                               method_options=method_options, on_spoofing_attack=counter.increment_by_one,
-                               detection_threshold=0.1)
+recorded_spoofing_indicators = record_dataset(recordings, device_ids, method_classes, method_options)
+method_names = [method_class.__name__ for method_class in method_classes]
+curves = precision_recall_curves(recorded_spoofing_indicators, labels, groups={"any method": (max, method_names)})
 
-    spoofed = is_pcap_spoofed(os.path.join(base_path, file), counter, handler)
-    if spoofed and label == "spoofed":
-        tp += 1
-    elif spoofed and label == "unspoofed":
-        fp += 1
-    elif not spoofed and label == "spoofed":
-        fn += 1
+print("any method at threshold 0.1")
+print_precision_recall_f1(*curves["any method"].at_threshold(0.1))
 
-precision, recall, f1 = calculate_precision_recall_f1(tp, fp, fn)
-print_precision_recall_f1(precision, recall, f1)
+for name, curve in curves.items():
+    threshold, precision, recall, f1 = curve.best_threshold()
+    print(name, "best threshold", threshold)
+    print_precision_recall_f1(precision, recall, f1)
@@ -12,7 +12,6 @@ setup(
         "ephem",
         "Pillow",
         "scapy",
-        "numpy",
-        "sklearn"
+        "numpy"
     ],
 )
\ No newline at end of file
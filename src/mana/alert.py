@@ -0,0 +1,339 @@
+import json
+import socket
+import time
+import urllib.request
+from dataclasses import dataclass, field
+from datetime import datetime
+from queue import Queue, Empty, Full
+from threading import Thread, Event
+
+
+@dataclass
+class Detection:
+    device_id: str = field(default=None)
+    method_name: str = field(default=None)
+    spoofing_indicator: float = field(default=None)
+    update_time: datetime = field(default=None)
+    last_nmea_sentence: str = field(default=None)
+    received_time: float = field(default=None)
+
+
+@dataclass
+class Incident:
+    device_id: str = field(default=None)
+    method_name: str = field(default=None)
+    first_update_time: datetime = field(default=None)
+    last_update_time: datetime = field(default=None)
+    last_received_time: float = field(default=None)
+    last_alert_time: float = field(default=None)
+    detection_count: int = field(default=0)
+    max_spoofing_indicator: float = field(default=0)
+    last_nmea_sentence: str = field(default=None)
+    is_open: bool = field(default=False)
+
+
+@dataclass
+class Alert:
+    kind: str = field(default=None)
+    device_id: str = field(default=None)
+    method_name: str = field(default=None)
+    first_update_time: datetime = field(default=None)
+    last_update_time: datetime = field(default=None)
+    detection_count: int = field(default=0)
+    max_spoofing_indicator: float = field(default=0)
+    last_nmea_sentence: str = field(default=None)
+
+    def to_dict(self):
+        return {
+            "kind": self.kind,
+            "device_id": self.device_id,
+            "method": self.method_name,
+            "first_update_time": datetime_to_string(self.first_update_time),
+            "last_update_time": datetime_to_string(self.last_update_time),
+            "detection_count": self.detection_count,
+            "max_spoofing_indicator": self.max_spoofing_indicator,
+            "last_nmea_sentence": self.last_nmea_sentence,
+        }
+
+
+def datetime_to_string(datetime_object):
+    if datetime_object is None:
+        return None
+    return datetime_object.isoformat()
+
+
+def alert_from_incident(kind, incident):
+    return Alert(kind=kind, device_id=incident.device_id, method_name=incident.method_name,
+                 first_update_time=incident.first_update_time, last_update_time=incident.last_update_time,
+                 detection_count=incident.detection_count,
+                 max_spoofing_indicator=incident.max_spoofing_indicator,
+                 last_nmea_sentence=incident.last_nmea_sentence)
+
+
+class IncidentTracker:
+
+    def __init__(self, min_detections=1, incident_timeout=10, update_interval=30):
+        self.min_detections = min_detections
+        self.incident_timeout = incident_timeout
+        self.update_interval = update_interval
+        self.incidents = {}
+
+    def add_detection(self, detection):
+        alerts = []
+        key = (detection.device_id, detection.method_name)
+        incident = self.incidents.get(key)
+        if incident is not None and detection.received_time - incident.last_received_time > self.incident_timeout:
+            alerts.extend(self.close_incident(key))
+            incident = None
+        if incident is None:
+            incident = Incident(device_id=detection.device_id, method_name=detection.method_name,
+                                first_update_time=detection.update_time)
+            self.incidents[key] = incident
+        incident.last_update_time = detection.update_time
+        incident.last_received_time = detection.received_time
+        incident.last_nmea_sentence = detection.last_nmea_sentence
+        incident.detection_count += 1
+        incident.max_spoofing_indicator = max(incident.max_spoofing_indicator, detection.spoofing_indicator)
+        if not incident.is_open and incident.detection_count >= self.min_detections:
+            incident.is_open = True
+            incident.last_alert_time = detection.received_time
+            alerts.append(alert_from_incident("opened", incident))
+        elif incident.is_open and detection.received_time - incident.last_alert_time >= self.update_interval:
+            incident.last_alert_time = detection.received_time
+            alerts.append(alert_from_incident("updated", incident))
+        return alerts
+
+    def expire_incidents(self, current_time):
+        alerts = []
+        expired_keys = [key for key, incident in self.incidents.items()
+                        if current_time - incident.last_received_time > self.incident_timeout]
+        for key in expired_keys:
+            alerts.extend(self.close_incident(key))
+        return alerts
+
+    def close_all_incidents(self):
+        alerts = []
+        for key in list(self.incidents.keys()):
+            alerts.extend(self.close_incident(key))
+        return alerts
+
+    def close_incident(self, key):
+        incident = self.incidents.pop(key)
+        if not incident.is_open:
+            return []
+        incident.is_open = False
+        return [alert_from_incident("closed", incident)]
+
+
+class TokenBucket:
+
+    def __init__(self, rate, capacity=1, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.tokens = capacity
+        self.last_refill_time = clock()
+
+    def try_acquire(self):
+        current_time = self.clock()
+        elapsed_time = current_time - self.last_refill_time
+        self.last_refill_time = current_time
+        self.tokens = min(self.capacity, self.tokens + elapsed_time * self.rate)
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+
+def coalesce_alerts(alerts):
+    latest_update_index = {}
+    for i, alert in enumerate(alerts):
+        if alert.kind == "updated":
+            latest_update_index[(alert.device_id, alert.method_name)] = i
+    coalesced_alerts = []
+    for i, alert in enumerate(alerts):
+        if alert.kind == "updated" and latest_update_index[(alert.device_id, alert.method_name)] != i:
+            continue
+        coalesced_alerts.append(alert)
+    return coalesced_alerts
+
+
+class AlertDispatcher:
+
+    def __init__(self, sinks, min_detections=1, incident_timeout=10, update_interval=30, max_queue_size=10000,
+                 batch_size=100, max_batch_delay=1.0, max_batches_per_second=None, max_pending_alerts=10000,
+                 poll_interval=0.1, clock=time.monotonic):
+        self.sinks = sinks
+        self.batch_size = batch_size
+        self.max_batch_delay = max_batch_delay
+        self.max_pending_alerts = max_pending_alerts
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self.incident_tracker = IncidentTracker(min_detections=min_detections, incident_timeout=incident_timeout,
+                                                update_interval=update_interval)
+        self.rate_limiter = None
+        if max_batches_per_second is not None:
+            self.rate_limiter = TokenBucket(max_batches_per_second, clock=clock)
+        self.queue = Queue(maxsize=max_queue_size)
+        self.pending_alerts = []
+        self.pending_since = None
+        self.dropped_detection_count = 0
+        self.dropped_alert_count = 0
+        self.sent_alert_count = 0
+        self.sent_batch_count = 0
+        self.failed_batch_count = 0
+        self.undelivered_alert_count = 0
+        self.undelivered_batch_count = 0
+        self.stopping = Event()
+        self.thread = None
+
+    def on_spoofing_attack(self, device_id, spoofing_indicator, method, state):
+        detection = Detection(device_id=device_id, method_name=type(method).__name__,
+                              spoofing_indicator=spoofing_indicator, update_time=state.update_time,
+                              last_nmea_sentence=state.last_nmea_sentence, received_time=self.clock())
+        try:
+            self.queue.put_nowait(detection)
+        except Full:
+            self.dropped_detection_count += 1
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for sink in self.sinks:
+            sink.close()
+
+    def run(self):
+        while not self.stopping.is_set() or not self.queue.empty():
+            self.process_next_detection()
+            self.add_pending_alerts(self.incident_tracker.expire_incidents(self.clock()))
+            self.dispatch_pending_alerts()
+        self.add_pending_alerts(self.incident_tracker.close_all_incidents())
+        while self.pending_alerts:
+            self.dispatch_pending_alerts(force=True)
+
+    def process_next_detection(self):
+        try:
+            detection = self.queue.get(timeout=self.poll_interval)
+        except Empty:
+            return
+        self.add_pending_alerts(self.incident_tracker.add_detection(detection))
+
+    def add_pending_alerts(self, alerts):
+        if not alerts:
+            return
+        if not self.pending_alerts:
+            self.pending_since = self.clock()
+        self.pending_alerts.extend(alerts)
+        if len(self.pending_alerts) > self.max_pending_alerts:
+            self.pending_alerts = coalesce_alerts(self.pending_alerts)
+        overflow = len(self.pending_alerts) - self.max_pending_alerts
+        if overflow > 0:
+            self.dropped_alert_count += overflow
+            self.pending_alerts = self.pending_alerts[overflow:]
+
+    def dispatch_pending_alerts(self, force=False):
+        if not self.pending_alerts:
+            return
+        is_batch_full = len(self.pending_alerts) >= self.batch_size
+        is_batch_due = self.clock() - self.pending_since >= self.max_batch_delay
+        if not (force or is_batch_full or is_batch_due):
+            return
+        if not force and self.rate_limiter is not None and not self.rate_limiter.try_acquire():
+            return
+        self.pending_alerts = coalesce_alerts(self.pending_alerts)
+        batch = self.pending_alerts[:self.batch_size]
+        self.pending_alerts = self.pending_alerts[self.batch_size:]
+        self.pending_since = self.clock()
+        self.send_batch(batch)
+
+    def send_batch(self, alerts):
+        # A batch counts as sent if at least one sink accepted it, failed_batch_count counts the failures per sink
+        is_delivered = False
+        for sink in self.sinks:
+            try:
+                sink.send(alerts)
+                is_delivered = True
+            except Exception:
+                self.failed_batch_count += 1
+        if is_delivered:
+            self.sent_alert_count += len(alerts)
+            self.sent_batch_count += 1
+        else:
+            self.undelivered_alert_count += len(alerts)
+            self.undelivered_batch_count += 1
+
+
+class AlertSink:
+
+    def send(self, alerts):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    @staticmethod
+    def alerts_to_json_lines(alerts):
+        return "".join(json.dumps(alert.to_dict()) + "\n" for alert in alerts)
+
+
+class FileAlertSink(AlertSink):
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(self.filename, 'a')
+
+    def send(self, alerts):
+        self.file.write(self.alerts_to_json_lines(alerts))
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class UnixSocketAlertSink(AlertSink):
+
+    def __init__(self, path, timeout=1.0):
+        self.path = path
+        self.timeout = timeout
+        self.socket = None
+
+    def send(self, alerts):
+        data = self.alerts_to_json_lines(alerts).encode()
+        try:
+            if self.socket is None:
+                self.connect()
+            self.socket.sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def connect(self):
+        self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.socket.settimeout(self.timeout)
+        self.socket.connect(self.path)
+
+    def close(self):
+        if self.socket is not None:
+            self.socket.close()
+            self.socket = None
+
+
+class HttpAlertSink(AlertSink):
+
+    def __init__(self, url, timeout=1.0):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, alerts):
+        data = json.dumps({"alerts": [alert.to_dict() for alert in alerts]}).encode()
+        request = urllib.request.Request(self.url, data=data, headers={"Content-Type": "application/json"},
+                                         method="POST")
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
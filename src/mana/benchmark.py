@@ -0,0 +1,258 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+from datetime import datetime
+from time import perf_counter
+
+from mana.feeder import LogFeeder, PcapFeeder, SentenceFeeder
+from mana.handler import Handler, DetectionHandler
+from mana.method import MultipleReceiversMethod, PhysicalSpeedLimitMethod, PhysicalRateOfTurnLimitMethod, \
+    PhysicalHeightLimitMethod, PhysicalEnvironmentLimitMethod, OrbitPositionsMethod, TimeDriftMethod, \
+    CarrierToNoiseDensityMethod
+from mana.nmea_parser import NmeaParser, InvalidNmeaSentenceException, NmeaSentenceNotSupportedException
+from mana.simulation import NmeaStreamSimulator, SpoofingRamp
+from mana.state import NmeaState, StateHistory
+
+benchmark_version = 1
+benchmark_method_classes = [MultipleReceiversMethod, PhysicalSpeedLimitMethod, PhysicalRateOfTurnLimitMethod,
+                            PhysicalHeightLimitMethod, PhysicalEnvironmentLimitMethod, OrbitPositionsMethod,
+                            TimeDriftMethod, CarrierToNoiseDensityMethod]
+
+
+class ArrivalTimingHandler(Handler):
+
+    def __init__(self, measurement):
+        # The latency of a sentence is the time the feeder took since it handed over the previous sentence
+        self.measurement = measurement
+        self.previous_time = perf_counter()
+
+    def handle(self, device_id, time, sentence):
+        now = perf_counter()
+        self.measurement.add(now - self.previous_time)
+        self.previous_time = now
+
+
+class TimingHandler(Handler):
+
+    def __init__(self, handler, measurement):
+        self.handler = handler
+        self.measurement = measurement
+
+    def handle(self, device_id, time, sentence):
+        start_time = perf_counter()
+        self.handler.handle(device_id=device_id, time=time, sentence=sentence)
+        self.measurement.add(perf_counter() - start_time)
+
+    def flush(self):
+        self.handler.flush()
+
+
+class StageMeasurement:
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.latencies = []
+
+    def add(self, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.latencies.append(seconds)
+
+    def result(self):
+        result = {
+            "count": self.count,
+            "seconds": self.seconds,
+            "per_second": self.count / self.seconds if self.seconds > 0 else None,
+            "mean_us": self.seconds / self.count * 1e6 if self.count > 0 else None,
+        }
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            for name, q in [("p50_us", 0.5), ("p95_us", 0.95), ("p99_us", 0.99)]:
+                result[name] = latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e6
+        return result
+
+
+def benchmark_method_options(simulator):
+    device_ids = simulator.device_ids()
+    # Neighbouring receivers are compared, which keeps the pairs linear in the number of receivers
+    pairs = list(zip(device_ids, device_ids[1:]))
+    return {
+        "distances": {pair: simulator.receiver_distance for pair in pairs},
+        "distance_ratio_thresholds": {pair: 0.5 for pair in pairs},
+        "max_speed": 30,
+        "max_rate_of_turn": 7.5,
+        "min_speed_to_determine_rate_of_turn": 15,
+        "min_height": 0,
+        "max_height": 20,
+        "on_land": False,
+        "on_water": True,
+        "min_elevation": 5,
+        "allowed_azimuth_deviation": 1,
+        "allowed_elevation_deviation": 1,
+        "max_clock_drift_dev": 0.1,
+        "min_carrier_to_noise_density": 20,
+        "max_carrier_to_noise_density": 50,
+    }
+
+
+def benchmark_feeder(create_feeder):
+    measurement = StageMeasurement()
+    create_feeder(ArrivalTimingHandler(measurement)).run()
+    return measurement
+
+
+def benchmark_parser_and_history(sentences):
+    parser_measurement = StageMeasurement()
+    history_measurement = StageMeasurement()
+    states = {}
+    state_histories = {}
+    for device_id, time, sentence in sentences:
+        state_history = state_histories.setdefault(device_id, StateHistory())
+        state = states.get(device_id) or NmeaState()
+        start_time = perf_counter()
+        try:
+            state = NmeaParser.parse(state, time, sentence)
+        except (InvalidNmeaSentenceException, NmeaSentenceNotSupportedException):
+            continue
+        parser_measurement.add(perf_counter() - start_time)
+        start_time = perf_counter()
+        state_history.add_state(state)
+        history_measurement.add(perf_counter() - start_time)
+        states[device_id] = state_history.state(0)
+    return parser_measurement, history_measurement
+
+
+def benchmark_method(sentences, device_ids, method_class, method_options):
+    handler = DetectionHandler(device_ids=device_ids, method_classes=[method_class], method_options=method_options,
+                               detection_threshold=float("inf"), on_spoofing_attack=None)
+    method = handler.methods[0]
+    measurement = StageMeasurement()
+    spoofing_indicator = method.spoofing_indicator
+
+    def timed_spoofing_indicator(*args):
+        start_time = perf_counter()
+        result = spoofing_indicator(*args)
+        measurement.add(perf_counter() - start_time)
+        return result
+
+    method.spoofing_indicator = timed_spoofing_indicator
+    SentenceFeeder(handler, sentences).run()
+    return measurement
+
+
+def benchmark_end_to_end(sentences, device_ids, method_classes, method_options):
+    handler = DetectionHandler(device_ids=device_ids, method_classes=method_classes, method_options=method_options,
+                               detection_threshold=float("inf"), on_spoofing_attack=None)
+    measurement = StageMeasurement()
+    SentenceFeeder(TimingHandler(handler, measurement), sentences).run()
+    return measurement
+
+
+def run_benchmarks(simulator, method_classes=None, repeat=3):
+    method_classes = method_classes or benchmark_method_classes
+    sentences = simulator.sentences()
+    device_ids = simulator.device_ids()
+    method_options = benchmark_method_options(simulator)
+    with tempfile.TemporaryDirectory() as directory:
+        log_file = simulator.write_log(os.path.join(directory, "simulation.log"), sentences)
+        pcap_file = simulator.write_pcap(os.path.join(directory, "simulation.pcap"), sentences)
+        stages = {
+            "feeder.SentenceFeeder": lambda: benchmark_feeder(lambda handler: SentenceFeeder(handler, sentences)),
+            "feeder.LogFeeder": lambda: benchmark_feeder(lambda handler: LogFeeder(handler, log_file)),
+            "feeder.PcapFeeder": lambda: benchmark_feeder(lambda handler: PcapFeeder(handler, pcap_file)),
+            "parser": lambda: benchmark_parser_and_history(sentences)[0],
+            "history": lambda: benchmark_parser_and_history(sentences)[1],
+        }
+        for method_class in method_classes:
+            stages["method." + method_class.__name__] = \
+                lambda method_class=method_class: benchmark_method(sentences, device_ids, method_class, method_options)
+        stages["end_to_end"] = lambda: benchmark_end_to_end(sentences, device_ids, method_classes, method_options)
+        results = {}
+        for name, stage in stages.items():
+            # The fastest of the repetitions is the least disturbed by other processes
+            measurements = [stage().result() for _ in range(repeat)]
+            results[name] = min(measurements, key=lambda result: result["seconds"])
+    return {
+        "version": benchmark_version,
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "simulation": {
+            "receivers": simulator.receiver_count,
+            "duration": simulator.duration,
+            "spoofed": simulator.spoofing_attack is not None,
+            "seed": simulator.seed,
+            "sentences": len(sentences),
+        },
+        "results": results,
+    }
+
+
+def save_benchmark(filename, benchmark):
+    with open(filename, "w") as file:
+        json.dump(benchmark, file, indent=2)
+
+
+def load_benchmark(filename):
+    with open(filename) as file:
+        return json.load(file)
+
+
+def compare_benchmarks(baseline, benchmark, tolerance=0.1):
+    comparisons = []
+    for name, result in benchmark["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if baseline_result is None or not baseline_result["per_second"] or not result["per_second"]:
+            continue
+        change = result["per_second"] / baseline_result["per_second"] - 1
+        comparisons.append((name, baseline_result["per_second"], result["per_second"], change, change < -tolerance))
+    return comparisons
+
+
+def print_comparisons(comparisons):
+    print("{:<45} {:>14} {:>14} {:>9}".format("stage", "baseline/s", "current/s", "change"))
+    for name, baseline_per_second, per_second, change, is_regression in comparisons:
+        print("{:<45} {:>14.1f} {:>14.1f} {:>8.1f}%{}".format(name, baseline_per_second, per_second, change * 100,
+                                                              " REGRESSION" if is_regression else ""))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(prog="python -m mana.benchmark")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run")
+    run_parser.add_argument("--output", default="benchmark.json")
+    run_parser.add_argument("--receivers", type=int, default=2)
+    run_parser.add_argument("--duration", type=int, default=120)
+    run_parser.add_argument("--spoofing", action="store_true")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("--repeat", type=int, default=3)
+    compare_parser = subparsers.add_parser("compare")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("benchmark")
+    compare_parser.add_argument("--tolerance", type=float, default=0.1)
+    arguments = parser.parse_args(arguments)
+
+    if arguments.command == "run":
+        simulator = NmeaStreamSimulator(receiver_count=arguments.receivers, duration=arguments.duration,
+                                        spoofing_attack=SpoofingRamp(start=arguments.duration // 2)
+                                        if arguments.spoofing else None, seed=arguments.seed)
+        benchmark = run_benchmarks(simulator, repeat=arguments.repeat)
+        save_benchmark(arguments.output, benchmark)
+        for name, result in benchmark["results"].items():
+            print("{:<45} {:>14.1f}/s".format(name, result["per_second"] or 0))
+        return 0
+    baseline = load_benchmark(arguments.baseline)
+    benchmark = load_benchmark(arguments.benchmark)
+    if baseline["simulation"] != benchmark["simulation"]:
+        print("Warning: the benchmarks were run on different simulations")
+    comparisons = compare_benchmarks(baseline, benchmark, arguments.tolerance)
+    print_comparisons(comparisons)
+    return 1 if any(is_regression for *_, is_regression in comparisons) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,57 @@
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+from mana.feeder import PcapFeeder
+from mana.handler import DetectionHandler
+
+
+@contextmanager
+def calibration_mode(method_classes):
+    previous_calibrations = [method_class.calibration for method_class in method_classes]
+    for method_class in method_classes:
+        method_class.calibration = True
+    try:
+        yield
+    finally:
+        for method_class, calibration in zip(method_classes, previous_calibrations):
+            method_class.calibration = calibration
+
+
+def ignore_spoofing_attack(**_kwargs):
+    pass
+
+
+def create_calibration_handler(device_ids, method_classes, method_options):
+    with calibration_mode(method_classes):
+        return DetectionHandler(device_ids=device_ids, method_classes=method_classes, method_options=method_options,
+                                detection_threshold=float("inf"), on_spoofing_attack=ignore_spoofing_attack)
+
+
+def calibrate_recording(recording, device_ids, method_classes, method_options, feeder_class=PcapFeeder):
+    handler = create_calibration_handler(device_ids, method_classes, method_options)
+    with calibration_mode(method_classes):
+        feeder_class(handler, recording).run()
+    return [getattr(method, "measurements", None) for method in handler.methods]
+
+
+def calibrate(recordings, device_ids, method_classes, method_options, feeder_class=PcapFeeder, processes=None):
+    calibrate_one_recording = partial(calibrate_recording, device_ids=device_ids, method_classes=method_classes,
+                                      method_options=method_options, feeder_class=feeder_class)
+    if processes == 1:
+        recording_measurements = [calibrate_one_recording(recording) for recording in recordings]
+    else:
+        with ProcessPoolExecutor(processes) as executor:
+            recording_measurements = list(executor.map(calibrate_one_recording, recordings))
+
+    handler = create_calibration_handler(device_ids, method_classes, method_options)
+    for measurements in recording_measurements:
+        for method, method_measurements in zip(handler.methods, measurements):
+            if method_measurements is not None:
+                method.merge_measurements(method_measurements)
+
+    calibrated_method_options = dict(method_options)
+    for method in handler.methods:
+        if getattr(method, "measurements", None) is not None:
+            calibrated_method_options.update(method.calculate_parameters())
+    return calibrated_method_options
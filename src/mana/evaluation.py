@@ -0,0 +1,175 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from mana.feeder import PcapFeeder, stop_feeding
+from mana.handler import DetectionHandler
+from mana.utility import lazy_import
+
+np = lazy_import("numpy")
+
+
+class RecordingDetectionHandler(DetectionHandler):
+
+    def __init__(self, device_ids, method_classes, method_options, record_traces=False):
+        super().__init__(device_ids=device_ids, method_classes=method_classes, method_options=method_options,
+                         detection_threshold=float("inf"), on_spoofing_attack=None)
+        self.record_traces = record_traces
+        self.max_spoofing_indicators = {method_name(method): float("-inf") for method in self.methods}
+        self.spoofing_indicator_traces = {method_name(method): [] for method in self.methods}
+
+    def handle_spoofing_indicator(self, device_id, spoofing_indicator, method, state):
+        name = method_name(method)
+        if spoofing_indicator > self.max_spoofing_indicators[name]:
+            self.max_spoofing_indicators[name] = spoofing_indicator
+        if self.record_traces:
+            self.spoofing_indicator_traces[name].append((state.update_time, device_id, spoofing_indicator))
+
+
+class RecordedSpoofingIndicators:
+
+    def __init__(self, recording, max_spoofing_indicators, spoofing_indicator_traces=None):
+        self.recording = recording
+        self.max_spoofing_indicators = max_spoofing_indicators
+        self.spoofing_indicator_traces = spoofing_indicator_traces
+
+
+class PrecisionRecallCurve:
+
+    def __init__(self, thresholds, true_positives, false_positives, false_negatives):
+        self.thresholds = thresholds
+        self.true_positives = true_positives
+        self.false_positives = false_positives
+        self.false_negatives = false_negatives
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.precisions = true_positives / (true_positives + false_positives)
+            self.recalls = true_positives / (true_positives + false_negatives)
+            self.f1s = 2 * true_positives / (2 * true_positives + false_positives + false_negatives)
+
+    def best_threshold(self):
+        i = int(np.argmax(np.nan_to_num(self.f1s, nan=-1)))
+        return float(self.thresholds[i]), float(self.precisions[i]), float(self.recalls[i]), float(self.f1s[i])
+
+    def at_threshold(self, threshold):
+        # No recording has a maximum spoofing indicator between two consecutive thresholds
+        i = int(np.searchsorted(self.thresholds, threshold, side="right")) - 1
+        return float(self.precisions[i]), float(self.recalls[i]), float(self.f1s[i])
+
+
+def method_name(method):
+    return type(method).__name__
+
+
+def record_spoofing_indicators(recording, device_ids, method_classes, method_options, feeder_class=PcapFeeder,
+                               record_traces=False):
+    handler = RecordingDetectionHandler(device_ids, method_classes, method_options, record_traces=record_traces)
+    feeder_class(handler, recording).run()
+    return RecordedSpoofingIndicators(recording, handler.max_spoofing_indicators,
+                                      handler.spoofing_indicator_traces if record_traces else None)
+
+
+def record_spoofing_indicators_of_methods(recording, method_classes, device_ids, method_options, feeder_class,
+                                          record_traces):
+    return record_spoofing_indicators(recording, device_ids, method_classes, method_options,
+                                      feeder_class=feeder_class, record_traces=record_traces)
+
+
+def record_dataset(recordings, device_ids, method_classes, method_options, feeder_class=PcapFeeder,
+                   record_traces=False, processes=None, result_cache=None):
+    summaries_by_recording = [{} for _ in recordings]
+    if result_cache is not None:
+        for recording, summaries in zip(recordings, summaries_by_recording):
+            for method_class in method_classes:
+                summary = result_cache.get(recording, device_ids, feeder_class, method_class, method_options,
+                                           record_traces=record_traces)
+                if summary is not None:
+                    summaries[method_class.__name__] = summary
+    pending = []
+    for i, (recording, summaries) in enumerate(zip(recordings, summaries_by_recording)):
+        missing_method_classes = [method_class for method_class in method_classes
+                                  if method_class.__name__ not in summaries]
+        if missing_method_classes:
+            pending.append((i, recording, missing_method_classes))
+    record_one_recording = partial(record_spoofing_indicators_of_methods, device_ids=device_ids,
+                                   method_options=method_options, feeder_class=feeder_class,
+                                   record_traces=record_traces)
+    if processes == 1 or not pending:
+        recorded = [record_one_recording(recording, classes) for _, recording, classes in pending]
+    else:
+        with ProcessPoolExecutor(processes) as executor:
+            recorded = list(executor.map(record_one_recording, *list(zip(*pending))[1:]))
+
+    for (i, recording, classes), recorded_spoofing_indicators in zip(pending, recorded):
+        for method_class in classes:
+            name = method_class.__name__
+            summary = {"max_spoofing_indicator": recorded_spoofing_indicators.max_spoofing_indicators[name]}
+            if record_traces:
+                summary["spoofing_indicator_trace"] = recorded_spoofing_indicators.spoofing_indicator_traces[name]
+            if result_cache is not None:
+                result_cache.put(recording, device_ids, feeder_class, method_class, method_options, summary,
+                                 record_traces=record_traces)
+            summaries_by_recording[i][name] = summary
+    return [recorded_spoofing_indicators_from_summaries(recording, summaries, method_classes, record_traces)
+            for recording, summaries in zip(recordings, summaries_by_recording)]
+
+
+def recorded_spoofing_indicators_from_summaries(recording, summaries, method_classes, record_traces):
+    names = [method_class.__name__ for method_class in method_classes]
+    max_spoofing_indicators = {name: summaries[name]["max_spoofing_indicator"] for name in names}
+    spoofing_indicator_traces = None
+    if record_traces:
+        spoofing_indicator_traces = {name: summaries[name]["spoofing_indicator_trace"] for name in names}
+    return RecordedSpoofingIndicators(recording, max_spoofing_indicators, spoofing_indicator_traces)
+
+
+def is_recording_spoofed(recording, device_ids, method_classes, method_options, detection_threshold,
+                         feeder_class=PcapFeeder):
+    handler = DetectionHandler(device_ids=device_ids, method_classes=method_classes, method_options=method_options,
+                               detection_threshold=detection_threshold, on_spoofing_attack=stop_feeding)
+    feeder = feeder_class(handler, recording)
+    feeder.run()
+    return feeder.stopped
+
+
+def detect_dataset(recordings, device_ids, method_classes, method_options, detection_threshold,
+                   feeder_class=PcapFeeder, processes=None):
+    is_one_recording_spoofed = partial(is_recording_spoofed, device_ids=device_ids, method_classes=method_classes,
+                                       method_options=method_options, detection_threshold=detection_threshold,
+                                       feeder_class=feeder_class)
+    if processes == 1:
+        return [is_one_recording_spoofed(recording) for recording in recordings]
+    with ProcessPoolExecutor(processes) as executor:
+        return list(executor.map(is_one_recording_spoofed, recordings))
+
+
+def combined_max_spoofing_indicators(recorded_spoofing_indicators, method_names, combine=max):
+    return [combine(recorded.max_spoofing_indicators.get(name, float("-inf")) for name in method_names)
+            for recorded in recorded_spoofing_indicators]
+
+
+def precision_recall_curve(max_spoofing_indicators, labels):
+    scores = np.asarray(max_spoofing_indicators, dtype=float)
+    is_spoofed = np.asarray(labels, dtype=bool)
+    thresholds = np.concatenate(([float("-inf")], np.unique(scores[np.isfinite(scores)])))
+    spoofed_scores = np.sort(scores[is_spoofed])
+    unspoofed_scores = np.sort(scores[~is_spoofed])
+    # A recording is detected at a threshold if its maximum spoofing indicator exceeds the threshold
+    true_positives = len(spoofed_scores) - np.searchsorted(spoofed_scores, thresholds, side="right")
+    false_positives = len(unspoofed_scores) - np.searchsorted(unspoofed_scores, thresholds, side="right")
+    false_negatives = len(spoofed_scores) - true_positives
+    return PrecisionRecallCurve(thresholds, true_positives, false_positives, false_negatives)
+
+
+def precision_recall_curves(recorded_spoofing_indicators, labels, groups=None):
+    method_names = []
+    for recorded in recorded_spoofing_indicators:
+        for name in recorded.max_spoofing_indicators:
+            if name not in method_names:
+                method_names.append(name)
+    curves = {}
+    for name in method_names:
+        scores = combined_max_spoofing_indicators(recorded_spoofing_indicators, [name])
+        curves[name] = precision_recall_curve(scores, labels)
+    for group_name, (combine, group_method_names) in (groups or {}).items():
+        scores = combined_max_spoofing_indicators(recorded_spoofing_indicators, group_method_names, combine=combine)
+        curves[group_name] = precision_recall_curve(scores, labels)
+    return curves
@@ -1,45 +1,173 @@
+import random
 import re
-from threading import Thread
+import socket
+from threading import Thread, Event
 from datetime import datetime
+from time import perf_counter, sleep
 
-from serial import Serial
-from scapy.all import sniff
-from scapy.layers.inet import UDP, IP
+from mana.metrics import metrics_registry
+from mana.statistics import QuantileSketch
+from mana.utility import string_to_datetime, lazy_import
 
-from mana.utility import string_to_datetime
+serial = lazy_import("serial")
+scapy_all = lazy_import("scapy.all")
+
+
+class StopFeeding(Exception):
+    pass
+
+
+def stop_feeding(**_kwargs):
+    raise StopFeeding()
+
+
+class ReplayClock:
+
+    def __init__(self, speed=None, jitter=0.0, seed=0, now=perf_counter, sleep=sleep):
+        # speed is the number of recorded seconds replayed per second: 1 replays in real time and None replays as
+        # fast as possible. Every record is delayed by a random jitter of up to jitter seconds.
+        self.speed = speed
+        self.jitter = jitter
+        self.random_generator = random.Random(seed)
+        self.now = now
+        self.sleep = sleep
+        self.start_time = None
+        self.start_record_time = None
+        # The lags of long accelerated replays exceed the buckets of the metrics, so the quantiles are sketched
+        self.lags = QuantileSketch()
+        self.lag_sum = 0.0
+        self.late_count = 0
+        self.max_lag = 0.0
+
+    def wait(self, record_time):
+        if self.speed is None:
+            return
+        now = self.now()
+        if self.start_time is None:
+            self.start_time, self.start_record_time = now, record_time
+        scheduled_time = self.start_time + (record_time - self.start_record_time).total_seconds() / self.speed
+        if self.jitter > 0:
+            scheduled_time += self.random_generator.uniform(0, self.jitter)
+        if scheduled_time > now:
+            self.sleep(scheduled_time - now)
+            now = self.now()
+        elif scheduled_time < now:
+            self.late_count += 1
+        # The lag is how far the replay is behind its schedule, e.g. because the handler is too slow
+        lag = max(0.0, now - scheduled_time)
+        self.lags.add(lag)
+        self.lag_sum += lag
+        self.max_lag = max(self.max_lag, lag)
+        if metrics_registry.enabled:
+            metrics_registry.observe("mana_replay_lag_seconds", lag)
+
+    def lag_summary(self):
+        return {
+            "count": self.lags.count,
+            "late": self.late_count,
+            "mean": self.lag_sum / self.lags.count if self.lags.count > 0 else None,
+            "p50": self.lags.quantile(0.5),
+            "p95": self.lags.quantile(0.95),
+            "p99": self.lags.quantile(0.99),
+            "max": self.max_lag,
+        }
 
 
 class Feeder:
 
     def __init__(self, handler):
         self.handler = handler
+        self.stopped = False
+        self.stopped_by_handler = False
 
     def run(self):
         raise NotImplementedError()
 
+    def stop(self):
+        self.stopped = True
+
+    def is_stopped(self, _packet=None):
+        return self.stopped
+
+    def handle(self, device_id, time, sentence):
+        try:
+            self.handler.handle(device_id=device_id, time=time, sentence=sentence)
+        except StopFeeding:
+            self.stop()
+            self.stopped_by_handler = True
+
+    def idle(self):
+        # Lets the handler hand over sentences it held back for too long while no sentence arrives
+        try:
+            self.handler.idle()
+        except StopFeeding:
+            self.stop()
+            self.stopped_by_handler = True
+
+    def finish(self):
+        # Hands over the sentences the handler still holds back, unless the handler stopped the feeding
+        if self.stopped_by_handler:
+            return
+        try:
+            self.handler.flush()
+        except StopFeeding:
+            self.stop()
+            self.stopped_by_handler = True
+
+    def record_input(self):
+        if metrics_registry.enabled:
+            metrics_registry.increment("mana_feeder_records_total", feeder=type(self).__name__)
+
 
 class LogFeeder(Feeder):
 
-    def __init__(self, handler, log_file):
+    def __init__(self, handler, log_file, replay_clock=None):
         super().__init__(handler)
         self.log_file = log_file
-        self.line_format = re.compile('([0-9-]+ +[0-9:.]+) +([a-zA-Z0-9]+) +(.+)')
+        self.replay_clock = replay_clock
+        self.line_format = re.compile('([0-9-]+ +[0-9:.]+) +([a-zA-Z0-9.:]+) +(.+)')
 
     def run(self):
         lines = self.read_lines_from_log_file()
         for line in lines:
+            if self.stopped:
+                break
+            self.record_input()
             match = self.line_format.match(line)
             if not match:
                 continue
             time_string, device_id, sentence = match.groups()
             time = string_to_datetime(time_string)
-            self.handler.handle(device_id=device_id, time=time, sentence=sentence)
+            if self.replay_clock is not None:
+                self.replay_clock.wait(time)
+            self.handle(device_id=device_id, time=time, sentence=sentence)
+        self.finish()
 
     def read_lines_from_log_file(self):
         with open(self.log_file, 'r') as file:
             return file.readlines()
 
 
+class SentenceFeeder(Feeder):
+
+    def __init__(self, handler, sentences, replay_clock=None):
+        super().__init__(handler)
+        self.sentences = sentences
+        self.replay_clock = replay_clock
+        self.index = None
+
+    def run(self):
+        for index, (device_id, time, sentence) in enumerate(self.sentences):
+            if self.stopped:
+                break
+            self.index = index
+            self.record_input()
+            if self.replay_clock is not None:
+                self.replay_clock.wait(time)
+            self.handle(device_id=device_id, time=time, sentence=sentence)
+        self.finish()
+
+
 class SerialFeeder(Feeder):
 
     def __init__(self, handler, ports):
@@ -66,11 +194,25 @@ class SerialThread(Thread):
         self.connect_to_serial_port()
 
     def run(self):
+        stopped_by_handler = False
         while self.is_running():
             sentence = self.read_sentence()
-            if len(sentence) == 0:
-                continue
-            self.handler.handle(device_id=self.port, time=self.current_datetime(), sentence=sentence)
+            try:
+                if len(sentence) == 0:
+                    self.handler.idle()
+                    continue
+                self.handler.handle(device_id=self.port, time=self.current_datetime(), sentence=sentence)
+            except StopFeeding:
+                self.stop()
+                stopped_by_handler = True
+        if not stopped_by_handler:
+            try:
+                self.handler.flush()
+            except StopFeeding:
+                pass
+
+    def stop(self):
+        self.running = False
 
     def is_running(self):
         return self.running
@@ -82,7 +224,7 @@ class SerialThread(Thread):
         return sentence
 
     def connect_to_serial_port(self):
-        self.serial = Serial(self.port, 9600, timeout=.1)
+        self.serial = serial.Serial(self.port, 9600, timeout=.1)
 
     def read_line_from_serial_connection(self):
         received_bytes = self.serial.readline()
@@ -95,46 +237,115 @@ class SerialThread(Thread):
 
 class PcapFeeder(Feeder):
 
-    def __init__(self, handler, pcap_file):
+    def __init__(self, handler, pcap_file, replay_clock=None):
         super().__init__(handler)
         self.pcap_file = pcap_file
+        self.replay_clock = replay_clock
 
     def run(self):
-        sniff(offline=self.pcap_file, prn=self.handle_packet, store=0)
+        scapy_all.sniff(offline=self.pcap_file, prn=self.handle_packet, stop_filter=self.is_stopped, store=0)
+        self.finish()
 
     def handle_packet(self, packet):
-        if UDP not in packet or IP not in packet:
+        self.record_input()
+        if scapy_all.UDP not in packet or scapy_all.IP not in packet:
             return
-        ip_packet = packet[IP]
-        udp_packet = packet[UDP]
+        ip_packet = packet[scapy_all.IP]
+        udp_packet = packet[scapy_all.UDP]
         ms = packet.time * 1000
-        time = datetime.fromtimestamp(ms//1000).replace(microsecond=ms%1000*1000)
+        time = datetime.fromtimestamp(int(ms//1000)).replace(microsecond=int(ms%1000*1000))
+        if self.replay_clock is not None:
+            self.replay_clock.wait(time)
         source_ip = ip_packet.src
         payload = bytes(udp_packet.payload)
         sentences = list(filter(None, payload.split(b'\r\n')))
         for sentence in sentences:
+            if self.stopped:
+                break
             sentence = sentence.decode(errors='ignore')
-            self.handler.handle(device_id=source_ip, time=time, sentence=sentence)
+            self.handle(device_id=source_ip, time=time, sentence=sentence)
 
 
 class NetworkFeeder(Feeder):
 
-    def __init__(self, handler, interface=None):
+    def __init__(self, handler, interface=None, timeout=0.1):
         super().__init__(handler)
         self.interface = interface
+        self.timeout = timeout
 
     def run(self):
-        sniff(iface=self.interface, prn=self.handle_packet, store=0)
+        # The capture socket stays open between the sniffs, so no packet is missed while the handler is idle
+        sniff_socket = scapy_all.conf.L2listen(iface=self.interface)
+        try:
+            while not self.stopped:
+                scapy_all.sniff(opened_socket=sniff_socket, prn=self.handle_packet, stop_filter=self.is_stopped,
+                                store=0, timeout=self.timeout)
+                if not self.stopped:
+                    self.idle()
+            self.finish()
+        finally:
+            sniff_socket.close()
 
     def handle_packet(self, packet):
-        if UDP not in packet or IP not in packet:
+        self.record_input()
+        if scapy_all.UDP not in packet or scapy_all.IP not in packet:
             return
-        ip_packet = packet[IP]
-        udp_packet = packet[UDP]
+        ip_packet = packet[scapy_all.IP]
+        udp_packet = packet[scapy_all.UDP]
         time = datetime.fromtimestamp(packet.time)
         source_ip = ip_packet.src
         payload = bytes(udp_packet.payload)
         sentences = list(filter(None, payload.split(b'\r\n')))
         for sentence in sentences:
+            if self.stopped:
+                break
             sentence = sentence.decode(errors='ignore')
-            self.handler.handle(device_id=source_ip, time=time, sentence=sentence)
+            self.handle(device_id=source_ip, time=time, sentence=sentence)
+
+
+class UdpFeeder(Feeder):
+
+    def __init__(self, handler, port=10110, address="0.0.0.0", multicast_group=None,
+                 multicast_interface="0.0.0.0", timeout=0.1):
+        super().__init__(handler)
+        self.port = port
+        self.address = address
+        self.multicast_group = multicast_group
+        self.multicast_interface = multicast_interface
+        self.timeout = timeout
+        self.ready = Event()
+
+    def run(self):
+        udp_socket = self.open_socket()
+        self.ready.set()
+        try:
+            while not self.stopped:
+                try:
+                    payload, (source_ip, _) = udp_socket.recvfrom(65535)
+                except socket.timeout:
+                    self.idle()
+                    continue
+                self.handle_datagram(source_ip, datetime.now(), payload)
+            self.finish()
+        finally:
+            udp_socket.close()
+
+    def handle_datagram(self, source_ip, time, payload):
+        self.record_input()
+        sentences = list(filter(None, payload.split(b'\r\n')))
+        for sentence in sentences:
+            if self.stopped:
+                break
+            sentence = sentence.decode(errors='ignore')
+            self.handle(device_id=source_ip, time=time, sentence=sentence)
+
+    def open_socket(self):
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        udp_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        udp_socket.bind((self.address, self.port))
+        if self.multicast_group is not None:
+            membership = socket.inet_aton(self.multicast_group) + socket.inet_aton(self.multicast_interface)
+            udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        udp_socket.settimeout(self.timeout)
+        return udp_socket
+
@@ -1,7 +1,17 @@
-from datetime import datetime
+import heapq
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from functools import partial
+from time import perf_counter
 
-from mana.nmea_parser import NmeaParser, InvalidNmeaSentenceException, NmeaSentenceNotSupportedException
+from mana.feeder import StopFeeding
+from mana.method import load_methods_json
+from mana.metrics import metrics_registry
+from mana.nmea_parser import NmeaParser, InvalidNmeaSentenceException, NmeaSentenceNotSupportedException, \
+    parse_error_type, nmea_time_of_day
 from mana.state import NmeaState, StateHistory
+from mana.tracing import tracer
 from mana.utility import is_state_different, is_state_sufficiently_defined
 
 
@@ -10,6 +20,116 @@ class Handler:
     def handle(self, device_id, time, sentence):
         raise NotImplementedError()
 
+    def flush(self):
+        pass
+
+    def idle(self):
+        pass
+
+
+class ReorderingHandler(Handler):
+
+    def __init__(self, handler, max_latency=1.0, event_time=None, drop_late=False, now=perf_counter):
+        # Sentences are held back until the watermark has passed their event time and are then handed to the handler
+        # in the order of their event time. The watermark follows the latest event time minus max_latency seconds,
+        # and a sentence held back for max_latency seconds of processing time moves it as well. If the stream stops,
+        # this is only checked when the feeder calls idle, as the live feeders do while no sentence arrives, so only
+        # then no sentence waits much longer than max_latency.
+        self.handler = handler
+        self.max_latency = max_latency
+        self.event_time = event_time or NmeaEventTime()
+        self.drop_late = drop_late
+        self.now = now
+        self.buffer = []
+        self.arrivals = deque()
+        self.sequence = 0
+        self.watermark = None
+        self.late_count = 0
+        self.handed_over_times = {}
+
+    def handle(self, device_id, time, sentence):
+        now = self.now()
+        event_time = self.event_time(device_id, time, sentence)
+        if event_time is None:
+            self.hand_over(device_id, time, sentence)
+        elif self.watermark is not None and event_time < self.watermark:
+            # The sentences the late sentence belongs between were already handed over
+            self.late_count += 1
+            if metrics_registry.enabled:
+                metrics_registry.increment("mana_reorder_late_total", device=device_id)
+            if not self.drop_late:
+                self.hand_over(device_id, time, sentence)
+        else:
+            heapq.heappush(self.buffer, (event_time, self.sequence, device_id, time, sentence))
+            self.arrivals.append((now, event_time))
+            self.sequence += 1
+            self.advance(event_time - timedelta(seconds=self.max_latency))
+        self.release_expired(now)
+
+    def idle(self):
+        self.release_expired(self.now())
+
+    def release_expired(self, now):
+        watermark = None
+        while self.arrivals and self.arrivals[0][0] <= now - self.max_latency:
+            _, event_time = self.arrivals.popleft()
+            watermark = event_time if watermark is None else max(watermark, event_time)
+        if watermark is not None:
+            self.advance(watermark)
+
+    def advance(self, watermark):
+        if self.watermark is None or watermark > self.watermark:
+            self.watermark = watermark
+            self.release(watermark)
+
+    def release(self, watermark=None):
+        while self.buffer and (watermark is None or self.buffer[0][0] <= watermark):
+            _, _, device_id, time, sentence = heapq.heappop(self.buffer)
+            self.hand_over(device_id, time, sentence)
+
+    def hand_over(self, device_id, time, sentence):
+        # The state history of a device expects its update times not to decrease
+        handed_over_time = self.handed_over_times.get(device_id)
+        if handed_over_time is not None and time < handed_over_time:
+            time = handed_over_time
+        self.handed_over_times[device_id] = time
+        self.handler.handle(device_id=device_id, time=time, sentence=sentence)
+
+    def flush(self):
+        self.release()
+        self.arrivals.clear()
+        self.handler.flush()
+
+
+class NmeaEventTime:
+
+    def __init__(self):
+        self.event_times = {}
+        self.feeder_time_offset = None
+
+    def __call__(self, device_id, time, sentence):
+        # The GPS time of RMC, GGA, and GLL sentences on the day nearest to the time of the feeder. The other sentences
+        # of a device take the event time of its last timed sentence, and before the first one the time of the feeder
+        # shifted into the GPS time, which is unknown until any device sent a timed sentence.
+        time_of_day = nmea_time_of_day(sentence)
+        if time_of_day is None:
+            event_time = self.event_times.get(device_id)
+            if event_time is None and self.feeder_time_offset is not None:
+                event_time = time + self.feeder_time_offset
+            return event_time
+        event_time = datetime.combine(time.date(), time_of_day)
+        if event_time - time > timedelta(hours=12):
+            event_time -= timedelta(days=1)
+        elif time - event_time > timedelta(hours=12):
+            event_time += timedelta(days=1)
+        self.event_times[device_id] = event_time
+        self.feeder_time_offset = event_time - time
+        return event_time
+
+
+def feeder_time(_device_id, time, _sentence):
+    return time
+
 
 class LoggingHandler(Handler):
 
@@ -40,39 +160,79 @@ class StateHistoryHandler(Handler):
         super().__init__()
         self.devices = []
         self.setup_devices(device_ids)
+        self.devices_by_id = {device.device_id: device for device in self.devices}
 
     def handle(self, device_id, time, sentence):
         device = self.device(device_id)
         if device is None:
             return
-        device = self.device(device_id)
+        if tracer.enabled and tracer.begin_sentence(device_id, sentence):
+            trace_start_time = tracer.now()
+            try:
+                self.handle_sentence(device, time, sentence)
+            finally:
+                tracer.end_sentence(trace_start_time)
+            return
+        self.handle_sentence(device, time, sentence)
+
+    def handle_sentence(self, device, time, sentence):
+        device_id = device.device_id
         state_history = device.state_history
         latest_state = state_history.state(0)
         if latest_state is None:
             latest_state = NmeaState()
+        is_traced = tracer.enabled and tracer.is_sampled()
+        is_measured = metrics_registry.enabled
+        if is_measured:
+            metrics_registry.increment("mana_sentences_total", device=device_id)
+            start_time = perf_counter()
+        if is_traced:
+            trace_start_time = tracer.now()
         try:
             latest_state = NmeaParser.parse(latest_state, time, sentence)
-        except (InvalidNmeaSentenceException, NmeaSentenceNotSupportedException):
+        except (InvalidNmeaSentenceException, NmeaSentenceNotSupportedException) as e:
+            if is_measured:
+                metrics_registry.increment("mana_parse_errors_total", error=parse_error_type(e))
+            if is_traced:
+                tracer.add_span("parse", "parser", trace_start_time, error=parse_error_type(e))
             return
+        if is_measured:
+            metrics_registry.observe("mana_parse_seconds", perf_counter() - start_time)
+        if is_traced:
+            tracer.add_span("parse", "parser", trace_start_time)
+        self.handle_parsed_state(device, latest_state, is_traced)
+
+    def handle_parsed_state(self, device, latest_state, is_traced=False):
+        state_history = device.state_history
+        is_measured = metrics_registry.enabled
+        if is_measured:
+            start_time = perf_counter()
+        if is_traced:
+            trace_start_time = tracer.now()
         state_history.add_state(latest_state)
-        self.handle_state(device_id, latest_state, state_history)
+        if is_measured:
+            metrics_registry.observe("mana_history_add_seconds", perf_counter() - start_time)
+        if is_traced:
+            tracer.add_span("history_insert", "history", trace_start_time)
+        self.handle_state(device.device_id, latest_state, state_history)
 
     def handle_state(self, device_id, latest_state, state_history):
         raise NotImplementedError()
 
     def device(self, device_id):
-        for device in self.devices:
-            if device.device_id == device_id:
-                return device
-        return None
+        return self.devices_by_id.get(device_id)
 
     def setup_devices(self, device_ids):
         for device_id in device_ids:
-            device = Device()
-            device.device_id = device_id
-            device.state_history = StateHistory()
-            device.previous_state = device.state_history.state(0)
-            self.devices.append(device)
+            self.devices.append(self.create_device(device_id))
+
+    @staticmethod
+    def create_device(device_id):
+        device = Device()
+        device.device_id = device_id
+        device.state_history = StateHistory()
+        device.previous_state = device.state_history.state(0)
+        return device
 
 
 class DetectionHandler(StateHistoryHandler):
@@ -81,13 +241,17 @@ class DetectionHandler(StateHistoryHandler):
         super().__init__(device_ids)
         self.detection_threshold = detection_threshold
         self.on_spoofing_attack = on_spoofing_attack
+        self.method_classes = method_classes
+        self.method_options = method_options
         self.methods = []
         self.previous_states = {}
+        self.on_spoofing_indicator = None
         self.setup_methods(method_classes, method_options)
 
     def handle_state(self, device_id, latest_state, state_history):
         for method in self.methods:
             if not is_state_sufficiently_defined(latest_state, method.required_state_fields):
+                self.record_method_skip(method, "insufficient_state")
                 continue
             previous_states_key = (device_id, type(method))
             previous_state = None
@@ -95,23 +259,160 @@ class DetectionHandler(StateHistoryHandler):
                 previous_state = self.previous_states[previous_states_key]
             if previous_state is not None \
                     and not is_state_different(latest_state, previous_state, method.variable_state_fields):
+                self.record_method_skip(method, "unchanged_state")
                 continue
             sufficient_satellite_state_count = 0
             for satellite_state in latest_state.satellites:
                 if is_state_sufficiently_defined(satellite_state, method.required_satellite_state_fields):
                     sufficient_satellite_state_count += 1
             if sufficient_satellite_state_count < method.min_sufficient_satellite_state_count:
+                self.record_method_skip(method, "insufficient_satellites")
                 continue
             self.previous_states[previous_states_key] = latest_state
             if previous_state is None:
+                self.record_method_skip(method, "first_state")
                 continue
+            is_measured = metrics_registry.enabled
+            if is_measured:
+                start_time = perf_counter()
+            is_traced = tracer.enabled and tracer.is_sampled()
+            if is_traced:
+                trace_start_time = tracer.now()
             spoofing_indicator = method.spoofing_indicator(device_id, latest_state, previous_state, state_history)
-            if spoofing_indicator <= self.detection_threshold:
-                continue
-            self.on_spoofing_attack(device_id=device_id, spoofing_indicator=spoofing_indicator, method=method,
-                                    state=latest_state)
+            if is_traced:
+                tracer.add_span(type(method).__name__, "method", trace_start_time,
+                                spoofing_indicator=spoofing_indicator)
+            if is_measured:
+                method_name = type(method).__name__
+                metrics_registry.observe("mana_method_seconds", perf_counter() - start_time, method=method_name)
+                metrics_registry.increment("mana_method_evaluations_total", method=method_name)
+            if self.on_spoofing_indicator is not None:
+                self.on_spoofing_indicator(device_id, spoofing_indicator, method, latest_state)
+            else:
+                self.handle_spoofing_indicator(device_id, spoofing_indicator, method, latest_state)
+
+    @contextmanager
+    def redirected_spoofing_indicators(self, methods, on_spoofing_indicator):
+        # Evaluates only the given methods and hands their spoofing indicators to on_spoofing_indicator instead of
+        # handling them, e.g. to merge them with spoofing indicators computed elsewhere
+        handler_methods = self.methods
+        self.methods = methods
+        self.on_spoofing_indicator = on_spoofing_indicator
+        try:
+            yield self
+        finally:
+            self.methods = handler_methods
+            self.on_spoofing_indicator = None
+
+    @contextmanager
+    def recorded_detections(self, methods, sentence_index, method_positions=None,
+                            min_spoofing_indicator=float("-inf")):
+        # Records the spoofing indicators of the given methods as detections (sentence index, method position, device
+        # ID, spoofing indicator, state) to hand them over with hand_over_detections once all detections are known
+        if method_positions is None:
+            method_positions = [self.methods.index(method) for method in methods]
+        positions = {id(method): position for method, position in zip(methods, method_positions)}
+        detections = []
+
+        def record_spoofing_indicator(device_id, spoofing_indicator, method, state):
+            if spoofing_indicator > min_spoofing_indicator:
+                detections.append((sentence_index(), positions[id(method)], device_id, spoofing_indicator, state))
+
+        with self.redirected_spoofing_indicators(methods, record_spoofing_indicator):
+            yield detections
+
+    def hand_over_detections(self, detections, load_state=None):
+        # Hands over the detections in the order of the serial path: by sentence, then by method. Detections without a
+        # state get it from load_state(sentence_index).
+        detections.sort(key=lambda detection: detection[:2])
+        for sentence_index, position, device_id, spoofing_indicator, state in detections:
+            if state is None:
+                state = load_state(sentence_index)
+            self.handle_spoofing_indicator(device_id, spoofing_indicator, self.methods[position], state)
+
+    def handle_spoofing_indicator(self, device_id, spoofing_indicator, method, state):
+        if spoofing_indicator <= self.detection_threshold:
+            return
+        if metrics_registry.enabled:
+            metrics_registry.increment("mana_detections_total", method=type(method).__name__)
+        self.on_spoofing_attack(device_id=device_id, spoofing_indicator=spoofing_indicator, method=method,
+                                state=state)
+
+    def min_reported_spoofing_indicator(self):
+        # The default handling ignores spoofing indicators up to the detection threshold
+        if type(self).handle_spoofing_indicator is DetectionHandler.handle_spoofing_indicator:
+            return self.detection_threshold
+        return float("-inf")
+
+    @staticmethod
+    def record_method_skip(method, reason):
+        if metrics_registry.enabled:
+            metrics_registry.increment("mana_method_skips_total", method=type(method).__name__, reason=reason)
 
     def setup_methods(self, method_classes, method_options):
         for method_class in method_classes:
             method = method_class(self, **method_options)
             self.methods.append(method)
+
+
+class DetectionConfiguration:
+
+    def __init__(self, name, device_ids, method_classes, method_options, detection_threshold):
+        self.name = name
+        self.device_ids = device_ids
+        self.method_classes = method_classes
+        self.method_options = method_options
+        self.detection_threshold = detection_threshold
+
+
+def load_detection_configuration(filepath, detection_threshold, name=None):
+    device_ids, method_classes, method_options = load_methods_json(filepath)
+    return DetectionConfiguration(name or filepath, device_ids, method_classes, method_options, detection_threshold)
+
+
+class ConfigurationDetectionHandler(DetectionHandler):
+
+    def __init__(self, configuration, shared_devices_by_id, on_spoofing_attack):
+        self.configuration = configuration
+        self.shared_devices_by_id = shared_devices_by_id
+        super().__init__(device_ids=configuration.device_ids, method_classes=configuration.method_classes,
+                         method_options=configuration.method_options,
+                         detection_threshold=configuration.detection_threshold, on_spoofing_attack=on_spoofing_attack)
+
+    def setup_devices(self, device_ids):
+        for device_id in device_ids:
+            self.devices.append(self.shared_devices_by_id[device_id])
+
+
+class MultiConfigurationDetectionHandler(StateHistoryHandler):
+
+    def __init__(self, configurations, on_spoofing_attack=None):
+        device_ids = list(dict.fromkeys(device_id for configuration in configurations
+                                        for device_id in configuration.device_ids))
+        super().__init__(device_ids)
+        self.configurations = configurations
+        self.on_spoofing_attack = on_spoofing_attack
+        self.detection_counts = {configuration.name: 0 for configuration in configurations}
+        self.configuration_handlers = [
+            ConfigurationDetectionHandler(configuration, self.devices_by_id,
+                                          partial(self.handle_configuration_spoofing_attack, configuration))
+            for configuration in configurations]
+        self.configuration_handlers_by_device_id = {
+            device_id: [handler for handler in self.configuration_handlers if device_id in handler.devices_by_id]
+            for device_id in device_ids}
+
+    def handle_state(self, device_id, latest_state, state_history):
+        stop_feeding = None
+        for handler in self.configuration_handlers_by_device_id[device_id]:
+            try:
+                handler.handle_state(device_id, latest_state, state_history)
+            except StopFeeding as e:
+                # The other configurations still evaluate the state before the feeding stops
+                stop_feeding = e
+        if stop_feeding is not None:
+            raise stop_feeding
+
+    def handle_configuration_spoofing_attack(self, configuration, **detection):
+        self.detection_counts[configuration.name] += 1
+        if self.on_spoofing_attack is not None:
+            self.on_spoofing_attack(configuration=configuration, **detection)
@@ -0,0 +1,314 @@
+import argparse
+import ipaddress
+import socket
+import sys
+from collections import deque
+from datetime import datetime
+from itertools import groupby
+from threading import Thread, Lock
+from time import perf_counter, sleep
+
+from mana.benchmark import benchmark_method_options, benchmark_method_classes
+from mana.feeder import SentenceFeeder, UdpFeeder, ReplayClock
+from mana.handler import Handler, DetectionHandler
+from mana.method import load_methods_json
+from mana.simulation import NmeaStreamSimulator, SpoofingRamp, ReplayAttack, MeaconingAttack
+
+spoofing_attack_classes = {"simulator": SpoofingRamp, "replay": ReplayAttack, "meaconing": MeaconingAttack}
+
+
+class SentDatagram:
+
+    def __init__(self, device_id, sentences, send_time):
+        self.device_id = device_id
+        self.sentences = sentences
+        self.send_time = send_time
+        # The offline comparison stamps the sentences with the time the datagram was received, or sent if it was lost,
+        # as the live feeder does
+        self.time = datetime.now()
+        self.received_sentences = 0
+        self.is_settled = False
+
+
+class UdpLoadGenerator:
+
+    def __init__(self, simulator, address="127.0.0.1", port=10110, speed=1.0, multicast_interface="127.0.0.1",
+                 bind_sources=True, record_send_times=False, send_time_retention=2.0, on_datagram=None):
+        # The send times are only recorded for a consumer that measures the latency. A datagram is settled once all of
+        # its sentences were received, a later datagram of its receiver was received, or send_time_retention seconds
+        # passed, and the settled datagrams are handed to on_datagram(device_id, time, sentences) in send order.
+        self.simulator = simulator
+        self.address = address
+        self.port = port
+        self.multicast_interface = multicast_interface
+        self.bind_sources = bind_sources
+        self.is_multicast = ipaddress.ip_address(address).is_multicast
+        self.replay_clock = ReplayClock(speed)
+        self.stopped = False
+        self.sent_datagrams = 0
+        self.sent_sentences = 0
+        self.record_send_times = record_send_times
+        self.send_time_retention = send_time_retention
+        self.on_datagram = on_datagram
+        self.pending_datagrams = {}
+        self.receiving_datagrams = {}
+        self.sent_order = deque()
+        self.send_times_lock = Lock()
+
+    def stop(self):
+        self.stopped = True
+
+    def run(self):
+        sockets = {device_id: self.open_socket(device_id) for device_id in self.simulator.device_ids()}
+        try:
+            for device_id, update_time, sentences in simulated_datagrams(self.simulator):
+                if self.stopped:
+                    return
+                self.replay_clock.wait(update_time)
+                if self.record_send_times:
+                    self.add_send_times(device_id, sentences)
+                payload = "".join(sentence + "\r\n" for sentence in sentences).encode()
+                sockets[device_id].sendto(payload, (self.address, self.port))
+                self.sent_datagrams += 1
+                self.sent_sentences += len(sentences)
+        finally:
+            for udp_socket in sockets.values():
+                udp_socket.close()
+
+    def open_socket(self, device_id):
+        udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if self.bind_sources:
+            # The feeders use the source address as device id, so every receiver sends from its own address
+            udp_socket.bind((device_id, 0))
+        if self.is_multicast:
+            udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(self.multicast_interface))
+            udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+            udp_socket.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, 1)
+        return udp_socket
+
+    def add_send_times(self, device_id, sentences):
+        datagram = SentDatagram(device_id, sentences, perf_counter())
+        with self.send_times_lock:
+            self.pending_datagrams.setdefault(device_id, deque()).append(datagram)
+            self.sent_order.append(datagram)
+        self.settle_datagrams(datagram.send_time - self.send_time_retention)
+
+    def pop_send_time(self, device_id, sentence, receive_time=None):
+        # A receiver sends its datagrams in order and the sentences of a datagram arrive together, so a sentence
+        # continues the datagram being received or starts the oldest pending datagram it begins, and the pending
+        # datagrams before that one were lost. Matching by datagram keeps repeated sentences, e.g. an unchanged GSA,
+        # from taking the send time of an earlier datagram.
+        with self.send_times_lock:
+            datagram = self.receiving_datagrams.pop(device_id, None)
+            if datagram is None or datagram.sentences[datagram.received_sentences] != sentence:
+                if datagram is not None:
+                    datagram.is_settled = True
+                pending_datagrams = self.pending_datagrams.get(device_id, ())
+                position = next((i for i, pending_datagram in enumerate(pending_datagrams)
+                                 if pending_datagram.sentences[0] == sentence), None)
+                if position is None:
+                    return None
+                for _ in range(position):
+                    pending_datagrams.popleft().is_settled = True
+                datagram = pending_datagrams.popleft()
+                if receive_time is not None:
+                    datagram.time = receive_time
+            datagram.received_sentences += 1
+            if datagram.received_sentences < len(datagram.sentences):
+                self.receiving_datagrams[device_id] = datagram
+            else:
+                datagram.is_settled = True
+        return datagram.send_time
+
+    def settle_datagrams(self, expiry_send_time=None):
+        # Hands the settled datagrams over in send order, together with the datagrams sent before expiry_send_time or
+        # all datagrams if it is None
+        settled_datagrams = []
+        with self.send_times_lock:
+            while self.sent_order and (self.sent_order[0].is_settled or expiry_send_time is None or
+                                       self.sent_order[0].send_time < expiry_send_time):
+                datagram = self.sent_order.popleft()
+                if not datagram.is_settled:
+                    datagram.is_settled = True
+                    pending_datagrams = self.pending_datagrams[datagram.device_id]
+                    if datagram in pending_datagrams:
+                        pending_datagrams.remove(datagram)
+                    elif self.receiving_datagrams.get(datagram.device_id) is datagram:
+                        del self.receiving_datagrams[datagram.device_id]
+                settled_datagrams.append(datagram)
+        if self.on_datagram is not None:
+            for datagram in settled_datagrams:
+                self.on_datagram(datagram.device_id, datagram.time, datagram.sentences)
+
+
+class LatencyMeasuringHandler(Handler):
+
+    def __init__(self, load_generator):
+        self.load_generator = load_generator
+        self.handler = None
+        self.received_sentences = 0
+        self.latencies = []
+        self.detection_latencies = []
+        self.detections = {}
+        self.send_time = None
+
+    def handle(self, device_id, time, sentence):
+        self.send_time = self.load_generator.pop_send_time(device_id, sentence, time)
+        self.handler.handle(device_id, time, sentence)
+        self.received_sentences += 1
+        if self.send_time is not None:
+            self.latencies.append(perf_counter() - self.send_time)
+
+    def on_spoofing_attack(self, device_id, spoofing_indicator, method, state):
+        name = type(method).__name__
+        self.detections[name] = self.detections.get(name, 0) + 1
+        if self.send_time is not None:
+            self.detection_latencies.append(perf_counter() - self.send_time)
+
+
+class SoakTestReport:
+
+    def __init__(self, sent_sentences, received_sentences, latencies, detection_latencies, detections,
+                 expected_detections, max_schedule_lag):
+        self.sent_sentences = sent_sentences
+        self.received_sentences = received_sentences
+        self.sentence_loss = 1 - received_sentences / sent_sentences if sent_sentences > 0 else 0
+        self.latencies = latency_summary(latencies)
+        self.detection_latencies = latency_summary(detection_latencies)
+        self.detections = detections
+        self.expected_detections = expected_detections
+        expected_detection_count = sum(expected_detections.values())
+        missed_detection_count = sum(max(0, count - detections.get(name, 0))
+                                     for name, count in expected_detections.items())
+        self.detection_loss = missed_detection_count / expected_detection_count if expected_detection_count > 0 else 0
+        self.max_schedule_lag = max_schedule_lag
+
+
+def latency_summary(latencies):
+    if not latencies:
+        return {}
+    latencies = sorted(latencies)
+    summary = {name: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+               for name, q in [("p50", 0.5), ("p95", 0.95), ("p99", 0.99)]}
+    summary["max"] = latencies[-1]
+    return summary
+
+
+def loopback_device_ids(receiver_count):
+    return ["127.1.{}.{}".format(i // 250, i % 250 + 1) for i in range(receiver_count)]
+
+
+def simulated_datagrams(simulator):
+    for second_sentences in simulator.seconds():
+        # Each receiver sends the sentences of one update in one datagram
+        for (device_id, update_time), burst in groupby(second_sentences, key=lambda s: (s[0], s[1])):
+            yield device_id, update_time, [sentence for _, _, sentence in burst]
+
+
+class DetectionCounter:
+
+    def __init__(self, device_ids, method_classes, method_options, detection_threshold):
+        self.detections = {}
+        self.handler = DetectionHandler(device_ids=device_ids, method_classes=method_classes,
+                                        method_options=method_options, detection_threshold=detection_threshold,
+                                        on_spoofing_attack=self.count_detection)
+
+    def count_detection(self, method, **_detection):
+        self.detections[type(method).__name__] = self.detections.get(type(method).__name__, 0) + 1
+
+    def handle_datagram(self, device_id, time, sentences):
+        # The live feeder stamps the sentences when they are received, so stamping them with the receive time of their
+        # datagram keeps time based methods like TimeDriftMethod comparable at any speed
+        for sentence in sentences:
+            self.handler.handle(device_id=device_id, time=time, sentence=sentence)
+
+
+def expected_detections(simulator, method_classes, method_options, detection_threshold):
+    detection_counter = DetectionCounter(simulator.device_ids(), method_classes, method_options, detection_threshold)
+    SentenceFeeder(detection_counter.handler, simulator.sentences()).run()
+    return detection_counter.detections
+
+
+def soak_test(simulator, method_classes, method_options, detection_threshold=0.1, port=10110, multicast_group=None,
+              speed=1.0, drain_timeout=2.0):
+    # The offline run counts the detections of the datagrams as they are settled, so no send or receive times of the
+    # whole stream are kept
+    detection_counter = DetectionCounter(simulator.device_ids(), method_classes, method_options, detection_threshold)
+    load_generator = UdpLoadGenerator(simulator, address=multicast_group or "127.0.0.1", port=port, speed=speed,
+                                      record_send_times=True, send_time_retention=drain_timeout,
+                                      on_datagram=detection_counter.handle_datagram)
+    measuring_handler = LatencyMeasuringHandler(load_generator)
+    measuring_handler.handler = DetectionHandler(device_ids=simulator.device_ids(), method_classes=method_classes,
+                                                 method_options=method_options,
+                                                 detection_threshold=detection_threshold,
+                                                 on_spoofing_attack=measuring_handler.on_spoofing_attack)
+    feeder = UdpFeeder(measuring_handler, port=port, address="0.0.0.0" if multicast_group else "127.0.0.1",
+                       multicast_group=multicast_group, multicast_interface="127.0.0.1")
+    feeder_thread = Thread(target=feeder.run, daemon=True)
+    feeder_thread.start()
+    feeder.ready.wait()
+    load_generator.run()
+    drain_end_time = perf_counter() + drain_timeout
+    while measuring_handler.received_sentences < load_generator.sent_sentences and perf_counter() < drain_end_time:
+        sleep(0.01)
+    feeder.stop()
+    feeder_thread.join()
+    load_generator.settle_datagrams()
+    return SoakTestReport(load_generator.sent_sentences, measuring_handler.received_sentences,
+                          measuring_handler.latencies, measuring_handler.detection_latencies,
+                          measuring_handler.detections, detection_counter.detections,
+                          load_generator.replay_clock.max_lag)
+
+
+def print_report(report):
+    print("Sentences sent: {}, received: {}, loss: {:.2%}".format(report.sent_sentences, report.received_sentences,
+                                                                   report.sentence_loss))
+    for title, latencies in [("Sentence latency", report.latencies), ("Detection latency", report.detection_latencies)]:
+        print("{}: {}".format(title, ", ".join("{} {:.3f} ms".format(name, latency * 1000)
+                                               for name, latency in latencies.items())))
+    print("Detections received: {}, expected: {}, loss: {:.2%}".format(report.detections, report.expected_detections,
+                                                                        report.detection_loss))
+    print("Maximum schedule lag: {:.3f} ms".format(report.max_schedule_lag * 1000))
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(prog="python -m mana.load_generator")
+    parser.add_argument("--receivers", type=int, default=100)
+    parser.add_argument("--duration", type=int, default=120)
+    parser.add_argument("--speed", type=float, default=1.0, help="Simulated seconds per second, 0 sends at once")
+    parser.add_argument("--address", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10110)
+    parser.add_argument("--attack", choices=sorted(spoofing_attack_classes))
+    parser.add_argument("--attack-start", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--soak", action="store_true", help="Receive and detect in this process and report")
+    parser.add_argument("--methods", help="methods.json of the soak test, the device ids are replaced")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    arguments = parser.parse_args(arguments)
+
+    spoofing_attack = None
+    if arguments.attack is not None:
+        spoofing_attack = spoofing_attack_classes[arguments.attack](start=arguments.attack_start)
+    # The receiving feeders stamp the sentences with the current time, so the simulation starts now to keep the
+    # satellite positions consistent with the update times
+    simulator = NmeaStreamSimulator(duration=arguments.duration, start_time=datetime.now().replace(microsecond=0),
+                                    spoofing_attack=spoofing_attack, seed=arguments.seed,
+                                    device_ids=loopback_device_ids(arguments.receivers))
+    speed = arguments.speed or None
+    if not arguments.soak:
+        load_generator = UdpLoadGenerator(simulator, address=arguments.address, port=arguments.port, speed=speed)
+        load_generator.run()
+        print("Sent {} sentences in {} datagrams".format(load_generator.sent_sentences, load_generator.sent_datagrams))
+        return 0
+    method_classes, method_options = benchmark_method_classes, benchmark_method_options(simulator)
+    if arguments.methods is not None:
+        _, method_classes, method_options = load_methods_json(arguments.methods)
+    multicast_group = arguments.address if ipaddress.ip_address(arguments.address).is_multicast else None
+    report = soak_test(simulator, method_classes, method_options, detection_threshold=arguments.threshold,
+                       port=arguments.port, multicast_group=multicast_group, speed=speed)
+    print_report(report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ from mana.method.method import Method, AverageMethod, GroupMethod, OrGroupMethod
     AverageGroupMethod, MultipleReceiversMethod, PhysicalSpeedLimitMethod, PhysicalRateOfTurnLimitMethod, \
     PhysicalHeightLimitMethod, PhysicalEnvironmentLimitMethod, OrbitPositionsMethod, \
     TimeDriftMethod, CarrierToNoiseDensityMethod
+from mana.utility import import_object
 
 method_name_to_class_dict = {
     "MultipleReceiversMethod".lower(): MultipleReceiversMethod,
@@ -17,7 +18,14 @@ method_name_to_class_dict = {
 }
 
 
+def register_method(name, method_class):
+    method_name_to_class_dict[name.lower()] = method_class
+
+
 def method_name_to_class(name):
+    # Methods of other packages are named by their module:Class path
+    if ":" in name:
+        return import_object(name)
     return method_name_to_class_dict[name.lower()]
 
 
@@ -40,3 +48,18 @@ def load_methods_json(filepath):
             method_options[key] = value
 
     return device_ids, method_classes, method_options
+
+
+def save_methods_json(filepath, device_ids, method_classes, method_options):
+    options = {}
+    for key, value in method_options.items():
+        if isinstance(value, dict):
+            value = {", ".join(k) if isinstance(k, tuple) else k: v for k, v in value.items()}
+        options[key] = value
+    data = {
+        "device_ids": device_ids,
+        "methods": [method_class.__name__ for method_class in method_classes],
+        "options": options,
+    }
+    with open(filepath, "w") as f:
+        json.dump(data, f, indent=2)
@@ -1,29 +1,29 @@
-import math
-from copy import deepcopy
+import os
+from time import perf_counter
 
-import numpy as np
-from sklearn import linear_model
+from mana.statistics import RollingTheilSenRegression, RollingMean, SmoothedZScorePeakDetector, Ewma, \
+    QuantileSketch, LinearRegressionSummary, merge_summaries
+from mana.tracing import tracer
+from mana.utility import minimum_angle_difference, is_state_sufficiently_defined, \
+    distances_between_geograpic_positions, lazy_import
 
-from mana.method.two_line_element import actual_satellite_constellation_two_line_elements
-from mana.method.water_map import WaterMap
-from mana.utility import minimum_angle_difference, is_state_sufficiently_defined
-
-
-def find_min_max_in_list(measurements):
-    min_measurement = float('inf')
-    max_measurement = -float('inf')
-    for measurement in measurements:
-        min_measurement = min(measurement, min_measurement)
-        max_measurement = max(measurement, max_measurement)
-    return min_measurement, max_measurement
+np = lazy_import("numpy")
 
 
 class Method:
     debug = False
-
-    def __init__(self, handler, *args, **kwargs):
+    calibration = False
+    stateful = False
+    batch = False
+    cross_device = False
+    # Modules and files besides the modules of the class hierarchy whose changes change the results of the method
+    dependency_modules = []
+    dependency_files = []
+
+    def __init__(self, handler, calibration_percentile=None, *args, **kwargs):
         super().__init__()
         self.handler = handler
+        self.calibration_percentile = calibration_percentile
         self.required_state_fields = []
         self.variable_state_fields = []
         self.required_satellite_state_fields = []
@@ -35,17 +35,37 @@ class Method:
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
         raise NotImplementedError()
 
+    def detect_batch(self, columns, rows, previous_rows):
+        raise NotImplementedError()
+
+    def merge_measurements(self, measurements):
+        self.measurements = merge_summaries(self.measurements, measurements)
+
+    def calibration_maximum(self, measurements):
+        if self.calibration_percentile is None:
+            return measurements.maximum
+        return measurements.quantile(self.calibration_percentile / 100)
+
+    def calibration_minimum(self, measurements):
+        if self.calibration_percentile is None:
+            return measurements.minimum
+        return measurements.quantile(1 - self.calibration_percentile / 100)
+
     def _print_debug_message(self, *args):
         if self.debug:
             print(*args)
+        if tracer.enabled and tracer.is_sampled():
+            tracer.add_instant(type(self).__name__, "debug", message=" ".join(str(arg) for arg in args))
 
 
 class AverageMethod(Method):
+    stateful = True
+    cross_device = True
 
     def __init__(self, handler, max_previous_spoofing_indicators_count=100, *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
         self.max_previous_spoofing_indicators_count = max_previous_spoofing_indicators_count
-        self.previous_spoofing_indicators = [0] * self.max_previous_spoofing_indicators_count
+        self.previous_spoofing_indicators = RollingMean(self.max_previous_spoofing_indicators_count, fill_value=0)
 
     def spoofing_indicator(self, device_id, latest_state, previous_state, state_history):
         spoofing_indicator = super().spoofing_indicator(device_id, latest_state, previous_state, state_history)
@@ -54,15 +74,10 @@ class AverageMethod(Method):
         return average_spoofing_indicator
 
     def add_spoofing_indicator(self, spoofing_attack_probability):
-        self.previous_spoofing_indicators.insert(0, spoofing_attack_probability)
-        self.previous_spoofing_indicators = \
-            self.previous_spoofing_indicators[:self.max_previous_spoofing_indicators_count]
+        self.previous_spoofing_indicators.add(spoofing_attack_probability)
 
     def calculate_average_spoofing_indicator(self):
-        previous_spoofing_indicators_length = len(self.previous_spoofing_indicators)
-        previous_spoofing_indicators_sum = sum(self.previous_spoofing_indicators)
-        average_spoofing_indicator = previous_spoofing_indicators_sum / previous_spoofing_indicators_length
-        return average_spoofing_indicator
+        return self.previous_spoofing_indicators.mean()
 
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
         raise NotImplementedError()
@@ -94,21 +109,99 @@ class GroupMethod(Method):
         self.required_satellite_state_fields.extend(method.required_satellite_state_fields)
         self.min_sufficient_satellite_state_count = max(self.min_sufficient_satellite_state_count,
                                                         method.min_sufficient_satellite_state_count)
+        self.stateful = self.stateful or method.stateful or method.calibration
+        self.cross_device = self.cross_device or method.cross_device
         self.methods.append(method)
 
 
-class OrGroupMethod(GroupMethod):
+class MethodEvaluationStatistics:
 
-    def spoofing_indicator(self, device_id, latest_state, previous_state, state_history):
-        return max(method.spoofing_indicator(device_id, latest_state, previous_state, state_history) for method in
-                   self.methods)
+    def __init__(self, method, weight):
+        self.method = method
+        self.cost = Ewma(weight)
+        self.decisive_rate = Ewma(weight)
+
+    def add_evaluation(self, cost, is_decisive):
+        self.cost.add(cost)
+        self.decisive_rate.add(1 if is_decisive else 0)
+
+    def score(self):
+        if self.cost.value is None:
+            return 0
+        return self.cost.value / max(self.decisive_rate.value, 1e-3)
 
 
-class AndGroupMethod(GroupMethod):
+class ShortCircuitGroupMethod(GroupMethod):
+
+    def __init__(self, handler, method_classes, method_options=None, short_circuit=True, reorder_interval=100,
+                 new_evaluation_weight=0.05, *args, **kwargs):
+        self.short_circuit = short_circuit
+        self.reorder_interval = reorder_interval
+        self.new_evaluation_weight = new_evaluation_weight
+        self.stateful_methods = []
+        self.method_evaluation_statistics = []
+        self.evaluation_count = 0
+        super().__init__(handler=handler, method_classes=method_classes, method_options=method_options, *args,
+                         **kwargs)
+
+    def add_method(self, method):
+        super().add_method(method)
+        # Methods with internal state (windows, regressions, calibration measurements) have to see every state, so
+        # they are always evaluated and only stateless methods are skipped once the result is decided
+        if method.stateful or method.calibration:
+            self.stateful_methods.append(method)
+        else:
+            self.method_evaluation_statistics.append(MethodEvaluationStatistics(method, self.new_evaluation_weight))
 
     def spoofing_indicator(self, device_id, latest_state, previous_state, state_history):
-        return min(method.spoofing_indicator(device_id, latest_state, previous_state, state_history) for method in
-                   self.methods)
+        if not self.short_circuit:
+            return self.combine_spoofing_indicators(
+                method.spoofing_indicator(device_id, latest_state, previous_state, state_history) for method in
+                self.methods)
+        spoofing_indicators = [method.spoofing_indicator(device_id, latest_state, previous_state, state_history) for
+                               method in self.stateful_methods]
+        spoofing_indicator = self.combine_spoofing_indicators(spoofing_indicators) if spoofing_indicators else None
+        for method_evaluation_statistics in self.method_evaluation_statistics:
+            if spoofing_indicator is not None and self.is_decided(spoofing_indicator):
+                break
+            start_time = perf_counter()
+            method_spoofing_indicator = method_evaluation_statistics.method.spoofing_indicator(
+                device_id, latest_state, previous_state, state_history)
+            method_evaluation_statistics.add_evaluation(perf_counter() - start_time,
+                                                        self.is_decided(method_spoofing_indicator))
+            spoofing_indicator = method_spoofing_indicator if spoofing_indicator is None else \
+                self.combine_spoofing_indicators((spoofing_indicator, method_spoofing_indicator))
+        self.evaluation_count += 1
+        if self.evaluation_count % self.reorder_interval == 0:
+            self.order_methods()
+        return spoofing_indicator
+
+    def order_methods(self):
+        self.method_evaluation_statistics.sort(key=lambda statistics: statistics.score())
+
+    def combine_spoofing_indicators(self, spoofing_indicators):
+        raise NotImplementedError()
+
+    def is_decided(self, spoofing_indicator):
+        raise NotImplementedError()
+
+
+class OrGroupMethod(ShortCircuitGroupMethod):
+
+    def combine_spoofing_indicators(self, spoofing_indicators):
+        return max(spoofing_indicators)
+
+    def is_decided(self, spoofing_indicator):
+        return spoofing_indicator >= 1
+
+
+class AndGroupMethod(ShortCircuitGroupMethod):
+
+    def combine_spoofing_indicators(self, spoofing_indicators):
+        return min(spoofing_indicators)
+
+    def is_decided(self, spoofing_indicator):
+        return spoofing_indicator <= 0
 
 
 class AverageGroupMethod(GroupMethod):
@@ -136,6 +229,8 @@ class WeightedAverageGroupMethod(GroupMethod):
 
 class MultipleReceiversMethod(Method):  # PDM
     calibration = False
+    stateful = True
+    cross_device = True
 
     def __init__(self, handler, distances, distance_ratio_thresholds, new_measurement_weight=0.1, *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
@@ -145,18 +240,28 @@ class MultipleReceiversMethod(Method):  # PDM
         if self.calibration:
             self.measurements = {}
 
-        self.past_measurements = {}
+        self.pair_device_ids = list(distances)
+        self.expected_distances = np.array([distances[device_ids] for device_ids in self.pair_device_ids],
+                                           dtype=float)
+        self.min_distance_ratios = np.array(
+            [distance_ratio_thresholds.get(device_ids, np.nan) for device_ids in self.pair_device_ids], dtype=float)
+        self.average_distances = self.expected_distances.copy()
+        self.pairs_by_device_id = self.index_pairs_by_device_id()
         self.required_state_fields.extend(["gps_time", "update_time", "latitude", "longitude"])
         self.variable_state_fields.extend(["gps_time", "latitude", "longitude"])
 
+    def index_pairs_by_device_id(self):
+        pairs_by_device_id = {}
+        for pair_index, (device_id_a, device_id_b) in enumerate(self.pair_device_ids):
+            pairs_by_device_id.setdefault(device_id_a, []).append((pair_index, device_id_b))
+            if device_id_b != device_id_a:
+                pairs_by_device_id.setdefault(device_id_b, []).append((pair_index, device_id_a))
+        return pairs_by_device_id
+
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
-        for device_ids, expected_distance in self.distances.items():
-            if device_id not in device_ids:
-                continue
-            device_id_a, device_id_b = device_ids
-            other_device_id = device_id_a
-            if device_id_a == device_id:
-                other_device_id = device_id_b
+        pair_indices = []
+        positions = []
+        for pair_index, other_device_id in self.pairs_by_device_id.get(device_id, ()):
             other_device = self.handler.device(other_device_id)
             if other_device is None:
                 continue
@@ -164,36 +269,35 @@ class MultipleReceiversMethod(Method):  # PDM
             other_latest_state = other_state_history.state(0)
             if not is_state_sufficiently_defined(other_latest_state, self.required_state_fields):
                 continue
-            target_state_history, reference_state = min(
-                (other_state_history, latest_state), (state_history, other_latest_state),
-                key=lambda x: x[1].update_time)
-            reference_time = reference_state.update_time
-            estimated_state = self.estimate_state(target_state_history, reference_time)
-            if not is_state_sufficiently_defined(estimated_state, self.required_state_fields):
+            if latest_state.update_time <= other_latest_state.update_time:
+                target_state_history, reference_state = other_state_history, latest_state
+            else:
+                target_state_history, reference_state = state_history, other_latest_state
+            estimated_position = self.estimate_position(target_state_history, reference_state.update_time)
+            if estimated_position is None:
                 continue
-            measured_distance = self.positional_distance_between_states(reference_state, estimated_state)
-
-            if device_ids not in self.past_measurements:
-                self.past_measurements[device_ids] = []
-                self.past_measurements[device_ids] = expected_distance
-
-            self.past_measurements[device_ids] = (1 - self.new_measurement_weight) * self.past_measurements[
-                device_ids] + self.new_measurement_weight * measured_distance
+            pair_indices.append(pair_index)
+            positions.append((reference_state.latitude, reference_state.longitude) + estimated_position)
+        if len(pair_indices) == 0:
+            return 0
 
-            average_distance = self.past_measurements[device_ids]
-            if self.calibration:
-                if device_ids not in self.measurements:
-                    self.measurements[device_ids] = []
-                self.measurements[device_ids].append(average_distance)
+        pair_indices = np.array(pair_indices)
+        latitudes1, longitudes1, latitudes2, longitudes2 = np.array(positions).T
+        measured_distances = distances_between_geograpic_positions(latitudes1, longitudes1, latitudes2, longitudes2)
+        average_distances = (1 - self.new_measurement_weight) * self.average_distances[pair_indices] \
+            + self.new_measurement_weight * measured_distances
+        self.average_distances[pair_indices] = average_distances
+        if self.calibration:
+            for pair_index, average_distance in zip(pair_indices.tolist(), average_distances.tolist()):
+                self.measurements.setdefault(self.pair_device_ids[pair_index], QuantileSketch()).add(average_distance)
 
-            distance_ratio = average_distance / expected_distance
-            if distance_ratio < self.distance_ratio_thresholds[device_ids]:
-                return 1
+        distance_ratios = average_distances / self.expected_distances[pair_indices]
+        if np.any(distance_ratios < self.min_distance_ratios[pair_indices]):
+            return 1
         return 0
 
-    def estimate_state(self, state_history, reference_time):
-        state_after_reference_time = state_history.state_after(reference_time)
-        state_before_reference_time = state_history.state_before(reference_time)
+    def estimate_position(self, state_history, reference_time):
+        state_before_reference_time, state_after_reference_time = state_history.surrounding_states(reference_time)
         if not is_state_sufficiently_defined(state_after_reference_time, self.required_state_fields) \
                 or not is_state_sufficiently_defined(state_before_reference_time, self.required_state_fields):
             return None
@@ -202,13 +306,9 @@ class MultipleReceiversMethod(Method):  # PDM
         delta = new_delta / old_delta if old_delta != 0 else 0
         latitude_difference = state_after_reference_time.latitude - state_before_reference_time.latitude
         longitude_difference = state_after_reference_time.longitude - state_before_reference_time.longitude
-        new_latitude = state_before_reference_time.latitude + latitude_difference * delta
-        new_longitude = state_before_reference_time.longitude + longitude_difference * delta
-        estimated_state = deepcopy(state_before_reference_time)
-        estimated_state.update_time = reference_time
-        estimated_state.latitude = new_latitude
-        estimated_state.longitude = new_longitude
-        return estimated_state
+        latitude = state_before_reference_time.latitude + latitude_difference * delta
+        longitude = state_before_reference_time.longitude + longitude_difference * delta
+        return latitude, longitude
 
     def calculate_parameters(self):
         parameters = {
@@ -218,25 +318,15 @@ class MultipleReceiversMethod(Method):  # PDM
 
         for device_ids, device_measurements in self.measurements.items():
             actual_distance = self.distances[device_ids]
-            min_measurement, max_measurement = find_min_max_in_list(self.measurements[device_ids])
-            parameters['distance_ratio_thresholds'][device_ids] = min_measurement / actual_distance
+            parameters['distance_ratio_thresholds'][device_ids] = \
+                self.calibration_minimum(device_measurements) / actual_distance
 
         return parameters
 
-    @staticmethod
-    def positional_distance_between_states(state1, state2):
-        latitude1 = math.radians(state1.latitude)
-        latitude2 = math.radians(state2.latitude)
-        dlon = math.radians(state2.longitude) - math.radians(state1.longitude)
-        dlat = latitude2 - latitude1
-        a = math.sin(dlat / 2) ** 2 + math.cos(latitude1) * math.cos(latitude2) * math.sin(dlon / 2) ** 2
-        c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-        distance = 6378100 * c
-        return distance
-
 
 class PhysicalSpeedLimitMethod(Method):  # PCCspeed
     calibration = False
+    batch = True
 
     def __init__(self, handler, max_speed, *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
@@ -244,47 +334,50 @@ class PhysicalSpeedLimitMethod(Method):  # PCCspeed
         self.required_state_fields.extend(["update_time", "speed"])
         self.variable_state_fields.extend(["update_time", "speed"])
         if self.calibration:
-            self.measurements = []
+            self.measurements = QuantileSketch()
 
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
         speed = latest_state.speed
         if self.calibration:
-            self.measurements.append(speed)
+            self.measurements.add(speed)
             self._print_debug_message(latest_state.update_time, "PhysicalSpeedLimitMethod", speed)
         if speed > self.max_speed:
             self._print_debug_message(latest_state.update_time, "PhysicalSpeedLimitMethod", "DETECTED")
             return 1
         return 0
 
+    def detect_batch(self, columns, rows, previous_rows):
+        return (columns["speed"][rows] > self.max_speed).astype(int)
+
     def calculate_parameters(self):
         parameters = {
-            "max_speed": 0
+            "max_speed": self.calibration_maximum(self.measurements)
         }
-        _, max_measurement = find_min_max_in_list(self.measurements)
-        parameters["max_speed"] = max_measurement
         return parameters
 
 
 class PhysicalRateOfTurnLimitMethod(Method):  # PCCrate_of_turn
     calibration = False
 
-    def __init__(self, handler, max_rate_of_turn, min_speed_to_determine_rate_of_turn, *args, **kwargs):
+    def __init__(self, handler, max_rate_of_turn, min_speed_to_determine_rate_of_turn, detection_mode="limit",
+                 z_score_lag=10, z_score_threshold=50, z_score_influence=0.05, *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
+        if detection_mode not in ("limit", "z_score"):
+            raise ValueError("Unknown rate of turn detection mode {}".format(detection_mode))
         self.max_rate_of_turn = max_rate_of_turn
         self.min_speed_to_determine_rate_of_turn = min_speed_to_determine_rate_of_turn
+        self.detection_mode = detection_mode
+        self.stateful = detection_mode == "z_score"
+        self.batch = detection_mode == "limit"
+        self.z_score_lag = z_score_lag
+        self.z_score_threshold = z_score_threshold
+        self.z_score_influence = z_score_influence
+        self.peak_detectors = {}
         self.required_state_fields.extend(["update_time", "course", "speed"])
         self.variable_state_fields.extend(["update_time"])
 
-        self.signals = {}
-        self.filteredY = {}
-        self.avgFilter = {}
-        self.stdFilter = {}
-        self.lag = 10
-        self.threshold = 50
-        self.influence = 0.05
-
         if self.calibration:
-            self.measurements = []
+            self.measurements = QuantileSketch()
 
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
         speed = latest_state.speed
@@ -296,24 +389,43 @@ class PhysicalRateOfTurnLimitMethod(Method):  # PCCrate_of_turn
 
         self._print_debug_message(latest_state.update_time, "PhysicalRateOfTurnLimitMethod", rate_of_turn)
         if self.calibration:
-            self.measurements.append(rate_of_turn)
+            self.measurements.add(rate_of_turn)
 
-        if rate_of_turn > self.max_rate_of_turn:
+        if self.detection_mode == "z_score":
+            is_detected = self.peak_detector(device_id).add(rate_of_turn) == 1
+        else:
+            is_detected = rate_of_turn > self.max_rate_of_turn
+        if is_detected:
             self._print_debug_message(latest_state.update_time, "PhysicalRateOfTurnLimitMethod", "DETECTED")
             return 1
         return 0
 
+    def detect_batch(self, columns, rows, previous_rows):
+        speed = columns["speed"][rows]
+        delta = (columns["update_time"][rows] - columns["update_time"][previous_rows]).astype(np.int64) / 1e6
+        phi = np.abs(columns["course"][rows] - columns["course"][previous_rows]) % 360
+        course_difference = np.where(phi > 180, 360 - phi, phi)
+        rate_of_turn = np.abs(course_difference / delta)
+        is_detected = (speed >= self.min_speed_to_determine_rate_of_turn) & (rate_of_turn > self.max_rate_of_turn)
+        return is_detected.astype(int)
+
+    def peak_detector(self, device_id):
+        peak_detector = self.peak_detectors.get(device_id)
+        if peak_detector is None:
+            peak_detector = SmoothedZScorePeakDetector(self.z_score_lag, self.z_score_threshold, self.z_score_influence)
+            self.peak_detectors[device_id] = peak_detector
+        return peak_detector
+
     def calculate_parameters(self):
         parameters = {
-            "max_rate_of_turn": 0
+            "max_rate_of_turn": self.calibration_maximum(self.measurements)
         }
-        _, max_measurement = find_min_max_in_list(self.measurements)
-        parameters["max_rate_of_turn"] = max_measurement
         return parameters
 
 
 class PhysicalHeightLimitMethod(Method):  # PCCheight
     calibration = False
+    batch = True
 
     def __init__(self, handler, min_height, max_height, *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
@@ -322,43 +434,48 @@ class PhysicalHeightLimitMethod(Method):  # PCCheight
         self.required_state_fields.extend(["height_above_sea_level"])
         self.variable_state_fields.extend(["height_above_sea_level"])
         if self.calibration:
-            self.measurements = []
+            self.measurements = QuantileSketch()
 
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
         height = latest_state.height_above_sea_level
         if self.calibration:
-            self.measurements.append(height)
+            self.measurements.add(height)
         self._print_debug_message(latest_state.update_time, "PhysicalHeightLimitMethod", height)
         if not self.min_height <= height <= self.max_height:
             self._print_debug_message(latest_state.update_time, "PhysicalHeightLimitMethod", "DETECTED")
             return 1
         return 0
 
+    def detect_batch(self, columns, rows, previous_rows):
+        height = columns["height_above_sea_level"][rows]
+        return (~((self.min_height <= height) & (height <= self.max_height))).astype(int)
+
     def calculate_parameters(self):
         parameters = {
-            "min_height": 0,
-            "max_height": 0,
+            "min_height": self.calibration_minimum(self.measurements),
+            "max_height": self.calibration_maximum(self.measurements),
         }
-        min_measurement, max_measurement = find_min_max_in_list(self.measurements)
-        parameters["min_height"] = min_measurement
-        parameters["max_height"] = max_measurement
         return parameters
 
 
 class PhysicalEnvironmentLimitMethod(Method):  # PCCenvironment
     calibration = False
+    dependency_modules = ["mana.method.water_map", "mana.method.tiled_water_map"]
+    dependency_files = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "water_map.png")]
 
-    def __init__(self, handler, on_land, on_water, *args, **kwargs):
+    def __init__(self, handler, on_land, on_water, bit_packed_water_map=False, tiled_water_map_directory=None,
+                 *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
         self.on_land = on_land
         self.on_water = on_water
+        self.bit_packed_water_map = bit_packed_water_map
+        self.tiled_water_map_directory = tiled_water_map_directory
         self.water_map = None
         self.required_state_fields.extend(["latitude", "longitude"])
         self.variable_state_fields.extend(["latitude", "longitude"])
         self.load_world_map()
         if self.calibration:
-            self.measurements_on_land = []
-            self.measurements_on_water = []
+            self.measurements = {"on_land": False, "on_water": False}
 
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
         if self.on_water and self.on_land and not self.calibration:
@@ -369,31 +486,45 @@ class PhysicalEnvironmentLimitMethod(Method):  # PCCenvironment
         is_on_water = self.water_map.is_on_water(latitude, longitude)
         is_on_land = self.water_map.is_on_land(latitude, longitude)
         if self.calibration:
-            self.measurements_on_land.append(is_on_land)
-            self.measurements_on_water.append(is_on_water)
+            self.measurements["on_land"] = self.measurements["on_land"] or is_on_land
+            self.measurements["on_water"] = self.measurements["on_water"] or is_on_water
         if (self.on_water and not is_on_water) \
                 or (self.on_land and not is_on_land):
             return 1
         return 0
 
     def load_world_map(self):
-        self.water_map = WaterMap()
+        from mana.method.tiled_water_map import TiledWaterMap
+        from mana.method.water_map import WaterMap
+        if self.tiled_water_map_directory is not None:
+            self.water_map = TiledWaterMap(self.tiled_water_map_directory)
+        else:
+            self.water_map = WaterMap(bit_packed=self.bit_packed_water_map)
+
+    def merge_measurements(self, measurements):
+        for key, value in measurements.items():
+            self.measurements[key] = self.measurements[key] or value
 
     def calculate_parameters(self):
         parameters = {
-            "on_land": any(self.measurements_on_land),
-            "on_water": any(self.measurements_on_water),
+            "on_land": self.measurements["on_land"],
+            "on_water": self.measurements["on_water"],
         }
         return parameters
 
 
 class OrbitPositionsMethod(Method):
     calibration = False
+    dependency_modules = ["mana.method.orbit_propagator", "mana.method.sky_position_cache",
+                          "mana.method.two_line_element"]
+    dependency_files = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "gps.tle")]
 
-    def __init__(self, handler, min_elevation, allowed_azimuth_deviation, allowed_elevation_deviation, *args,
-                 **kwargs):
+    def __init__(self, handler, min_elevation, allowed_azimuth_deviation, allowed_elevation_deviation,
+                 sky_position_cache_accuracy=0.1, *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
-        self.two_line_elements = None
+        self.orbit_propagator = None
+        self.sky_position_cache = None
+        self.sky_position_cache_accuracy = sky_position_cache_accuracy
         self.min_elevation = min_elevation
         self.allowed_azimuth_deviation = allowed_azimuth_deviation
         self.allowed_elevation_deviation = allowed_elevation_deviation
@@ -407,17 +538,16 @@ class OrbitPositionsMethod(Method):
     def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
         spoofing_score = 0
         counter = 0
+        expected_satellite_views = self.expected_satellite_views(latest_state)
         for satellite_state in latest_state.satellites:
             if not is_state_sufficiently_defined(satellite_state, self.required_satellite_state_fields):
                 continue
             if not satellite_state.is_visible:
                 continue
-            two_line_element = self.two_line_element(satellite_state.pseudo_random_noise)
-            if two_line_element is None:
+            expected_satellite_view = expected_satellite_views.get(satellite_state.pseudo_random_noise)
+            if expected_satellite_view is None:
                 continue
-            elevation, azimuth = two_line_element.observer_view(latest_state.update_time, latest_state.latitude,
-                                                                latest_state.longitude,
-                                                                latest_state.height_above_sea_level)
+            elevation, azimuth = expected_satellite_view
             azimuth_diff = minimum_angle_difference(azimuth, satellite_state.azimuth)
             elevation_diff = minimum_angle_difference(elevation, satellite_state.elevation)
             if satellite_state.elevation < self.min_elevation or \
@@ -428,14 +558,22 @@ class OrbitPositionsMethod(Method):
         spoofing_indicator = spoofing_score / counter if counter > 0 else 0
         return spoofing_indicator
 
-    def two_line_element(self, pseudo_random_noise):
-        for two_line_element in self.two_line_elements:
-            if two_line_element.pseudo_random_noise == pseudo_random_noise:
-                return two_line_element
-        return None
+    def expected_satellite_views(self, state):
+        if self.sky_position_cache is not None:
+            return self.sky_position_cache.observer_views(state.update_time, state.latitude, state.longitude,
+                                                          state.height_above_sea_level)
+        elevations, azimuths = self.orbit_propagator.observer_views(state.update_time, state.latitude,
+                                                                    state.longitude, state.height_above_sea_level)
+        return dict(zip(self.orbit_propagator.pseudo_random_noises, zip(elevations.tolist(), azimuths.tolist())))
 
     def load_two_line_elements(self):
-        self.two_line_elements = actual_satellite_constellation_two_line_elements()
+        from mana.method.orbit_propagator import actual_satellite_constellation_orbit_propagator
+        from mana.method.sky_position_cache import shared_sky_position_cache
+        self.orbit_propagator = actual_satellite_constellation_orbit_propagator()
+        if self.sky_position_cache_accuracy is not None:
+            max_deviation = self.sky_position_cache_accuracy * min(self.allowed_azimuth_deviation,
+                                                                   self.allowed_elevation_deviation)
+            self.sky_position_cache = shared_sky_position_cache(self.orbit_propagator, max_deviation)
 
     @staticmethod
     def is_satellite_state_sufficiently_defined(state):
@@ -448,6 +586,7 @@ class OrbitPositionsMethod(Method):
 
 class TimeDriftMethod(Method):
     calibration = False
+    stateful = True
 
     def __init__(self, handler, max_clock_drift_dev, *args, **kwargs):
         super().__init__(handler=handler, *args, **kwargs)
@@ -467,47 +606,40 @@ class TimeDriftMethod(Method):
 
         if device_id not in self.base_line:
             self.base_line[device_id] = update_time
-            self.past_measurements[device_id] = []
+            self.past_measurements[device_id] = RollingTheilSenRegression(self.max_past_measurements)
 
         time_since_start = (update_time - self.base_line[device_id]).total_seconds()
         clock_drift = (gps_time - update_time).total_seconds()
 
-        self.past_measurements[device_id].append((time_since_start, clock_drift))
-
         if self.calibration:
             if device_id not in self.measurements:
-                self.measurements[device_id] = []
-            self.measurements[device_id].append((time_since_start, clock_drift))
-
-        if len(self.past_measurements[device_id]) < self.min_past_measurements:
-            return 0
+                self.measurements[device_id] = LinearRegressionSummary()
+            self.measurements[device_id].add(time_since_start, clock_drift)
 
-        X, y = zip(*self.past_measurements[device_id][:-1])
-        X = np.array([X]).T
-        y = np.array(y)
-        y += np.random.normal(0.000001, 0.0001, y.shape)  # BUG: perfect horizontal lines throw a value error
-
-        ransac = linear_model.RANSACRegressor()
-        try:
-            ransac.fit(X, y)
-        except ValueError:
+        past_measurements = self.past_measurements[device_id]
+        if len(past_measurements) + 1 < self.min_past_measurements:
+            past_measurements.add(time_since_start, clock_drift)
             return 0
 
-        expected_clock_drift = ransac.predict(np.array([[time_since_start]]))[0]
+        expected_clock_drift = past_measurements.predict(time_since_start)
+        past_measurements.add(time_since_start, clock_drift)
 
         difference = expected_clock_drift - clock_drift
-        self.past_measurements[device_id] = self.past_measurements[device_id][-self.max_past_measurements:]
 
         if difference > self.max_clock_drift_dev:
             return 1
         return 0
 
+    def merge_measurements(self, measurements):
+        # The time since start of every recording begins at its own base line, so the regressions of different
+        # recordings are kept apart instead of being pooled per device
+        for device_id, measurement in measurements.items():
+            self.measurements[(device_id, len(self.measurements))] = measurement
+
     def calculate_parameters(self):
         m, b = -float('inf'), -float('inf')
-        for device_id in self.measurements.keys():
-            x, y = zip(*self.measurements[device_id])
-            result = np.polyfit(x, y, 1)
-            m, b = max(m, abs(result[0])), max(b, abs(result[1]))
+        for measurement in self.measurements.values():
+            m, b = max(m, abs(measurement.slope())), max(b, abs(measurement.intercept()))
         parameters = {
             "start_clock_drift": b,
             "expected_clock_drift_per_second": m,
@@ -516,6 +648,7 @@ class TimeDriftMethod(Method):
 
 
 class CarrierToNoiseDensityMethod(Method):
+    batch = True
 
     def __init__(self, handler, min_carrier_to_noise_density, max_carrier_to_noise_density, *args,
                  **kwargs):
@@ -544,6 +677,18 @@ class CarrierToNoiseDensityMethod(Method):
         spoofing_indicator = spoofing_score / counter if counter > 0 else 0
         return spoofing_indicator
 
+    def detect_batch(self, columns, rows, previous_rows):
+        carrier_to_noise_density = columns["carrier_to_noise_density"]
+        is_counted = columns["is_visible"] & ~np.isnan(carrier_to_noise_density)
+        is_outside = is_counted & ((self.min_carrier_to_noise_density > carrier_to_noise_density)
+                                   | (self.max_carrier_to_noise_density < carrier_to_noise_density))
+        counted = np.concatenate(([0], np.cumsum(is_counted)))
+        outside = np.concatenate(([0], np.cumsum(is_outside)))
+        start, end = columns["satellite_start"][rows], columns["satellite_end"][rows]
+        counter = counted[end] - counted[start]
+        spoofing_score = outside[end] - outside[start]
+        return np.divide(spoofing_score, counter, out=np.zeros(len(rows)), where=counter > 0)
+
     @staticmethod
     def is_satellite_state_sufficiently_defined(state):
         return state is not None and all(a is not None for a in [state.carrier_to_noise_density, state.is_visible])
@@ -0,0 +1,157 @@
+import datetime as dt
+import math
+from functools import lru_cache
+
+from mana.method.two_line_element import actual_satellite_constellation_two_line_element_lines
+from mana.utility import lazy_import
+
+np = lazy_import("numpy")
+
+earth_radius = 6378.135
+earth_gravitational_parameter = 398600.8
+j2 = 0.001082616
+ke = 60.0 / math.sqrt(earth_radius ** 3 / earth_gravitational_parameter)
+wgs84_semi_major_axis = 6378.137
+wgs84_flattening = 1 / 298.257223563
+wgs84_eccentricity_squared = wgs84_flattening * (2 - wgs84_flattening)
+minutes_per_day = 1440.0
+
+
+def parse_two_line_element_epoch(line1):
+    year = int(line1[18:20])
+    year += 2000 if year < 57 else 1900
+    day_of_year = float(line1[20:32])
+    return dt.datetime(year, 1, 1) + dt.timedelta(days=day_of_year - 1)
+
+
+def parse_two_line_element_elements(line2):
+    inclination = float(line2[8:16])
+    right_ascension_of_ascending_node = float(line2[17:25])
+    eccentricity = float("0." + line2[26:33].strip())
+    argument_of_perigee = float(line2[34:42])
+    mean_anomaly = float(line2[43:51])
+    mean_motion = float(line2[52:63])
+    return inclination, right_ascension_of_ascending_node, eccentricity, argument_of_perigee, mean_anomaly, \
+        mean_motion
+
+
+def seconds_since_unix_epoch(time):
+    return (time - dt.datetime(1970, 1, 1)).total_seconds()
+
+
+def julian_date(time):
+    return 2440587.5 + seconds_since_unix_epoch(time) / 86400.0
+
+
+def greenwich_mean_sidereal_time(time):
+    julian_centuries = (julian_date(time) - 2451545.0) / 36525.0
+    seconds = 67310.54841 + (876600.0 * 3600.0 + 8640184.812866) * julian_centuries \
+        + 0.093104 * julian_centuries ** 2 - 6.2e-6 * julian_centuries ** 3
+    return math.radians((seconds % 86400.0) / 240.0)
+
+
+def geodetic_to_ecef(latitude, longitude, height):
+    latitude = math.radians(latitude)
+    longitude = math.radians(longitude)
+    height = height / 1000.0
+    sin_latitude = math.sin(latitude)
+    prime_vertical_radius = wgs84_semi_major_axis / math.sqrt(1 - wgs84_eccentricity_squared * sin_latitude ** 2)
+    x = (prime_vertical_radius + height) * math.cos(latitude) * math.cos(longitude)
+    y = (prime_vertical_radius + height) * math.cos(latitude) * math.sin(longitude)
+    z = (prime_vertical_radius * (1 - wgs84_eccentricity_squared) + height) * sin_latitude
+    return x, y, z
+
+
+def east_north_up_rotation(latitude, longitude):
+    latitude = math.radians(latitude)
+    longitude = math.radians(longitude)
+    sin_latitude, cos_latitude = math.sin(latitude), math.cos(latitude)
+    sin_longitude, cos_longitude = math.sin(longitude), math.cos(longitude)
+    return np.array([
+        [-sin_longitude, -sin_latitude * cos_longitude, cos_latitude * cos_longitude],
+        [cos_longitude, -sin_latitude * sin_longitude, cos_latitude * sin_longitude],
+        [0, cos_latitude, sin_latitude],
+    ])
+
+
+def ecef_to_east_north_up(positions, latitude, longitude, height):
+    observer_position = np.array(geodetic_to_ecef(latitude, longitude, height))
+    return (positions - observer_position) @ east_north_up_rotation(latitude, longitude)
+
+
+def east_north_up_to_elevation_azimuth(east_north_up):
+    east, north, up = east_north_up.T
+    elevations = np.degrees(np.arctan2(up, np.hypot(east, north)))
+    azimuths = np.degrees(np.arctan2(east, north)) % 360
+    return elevations, azimuths
+
+
+class OrbitPropagator:
+
+    def __init__(self, pseudo_random_noises, lines1, lines2):
+        self.pseudo_random_noises = [int(pseudo_random_noise) for pseudo_random_noise in pseudo_random_noises]
+        self.index_by_pseudo_random_noise = {p: i for i, p in enumerate(self.pseudo_random_noises)}
+        self.epoch_seconds = np.array([seconds_since_unix_epoch(parse_two_line_element_epoch(line1))
+                                       for line1 in lines1])
+        elements = np.array([parse_two_line_element_elements(line2) for line2 in lines2], dtype=float).reshape(-1, 6)
+        inclination, node, eccentricity, argument_of_perigee, mean_anomaly, mean_motion = elements.T
+        self.inclination = np.radians(inclination)
+        self.eccentricity = eccentricity
+        self.setup_secular_rates(mean_motion * 2 * np.pi / minutes_per_day)
+        self.angles_at_epoch = np.stack([np.radians(mean_anomaly), np.radians(argument_of_perigee), np.radians(node)])
+        self.angle_rates = np.stack([self.mean_anomaly_rate, self.argument_of_perigee_rate, self.node_rate])
+        self.cos_inclination = np.cos(self.inclination)
+        self.sin_inclination = np.sin(self.inclination)
+        self.semi_minor_axis = self.semi_major_axis * np.sqrt(1 - eccentricity ** 2)
+        self.focal_distance = self.semi_major_axis * eccentricity
+
+    def setup_secular_rates(self, kozai_mean_motion):
+        cos_inclination = np.cos(self.inclination)
+        theta2 = cos_inclination ** 2
+        beta0_squared = 1 - self.eccentricity ** 2
+        beta0 = np.sqrt(beta0_squared)
+        k2 = 0.5 * j2
+        semi_major_axis1 = (ke / kozai_mean_motion) ** (2 / 3)
+        delta1 = 1.5 * k2 * (3 * theta2 - 1) / (semi_major_axis1 ** 2 * beta0 * beta0_squared)
+        semi_major_axis0 = semi_major_axis1 * (1 - delta1 / 3 - delta1 ** 2 - 134 / 81 * delta1 ** 3)
+        delta0 = 1.5 * k2 * (3 * theta2 - 1) / (semi_major_axis0 ** 2 * beta0 * beta0_squared)
+        self.mean_motion = kozai_mean_motion / (1 + delta0)
+        self.semi_major_axis = semi_major_axis0 / (1 - delta0) * earth_radius
+        semi_latus_rectum = self.semi_major_axis / earth_radius * beta0_squared
+        rate = 1.5 * j2 * self.mean_motion / semi_latus_rectum ** 2
+        self.mean_anomaly_rate = self.mean_motion + 0.5 * rate * beta0 * (3 * theta2 - 1)
+        self.argument_of_perigee_rate = -0.5 * rate * (1 - 5 * theta2)
+        self.node_rate = -rate * cos_inclination
+
+    def positions_ecef(self, time):
+        minutes = (seconds_since_unix_epoch(time) - self.epoch_seconds) / 60.0
+        angles = self.angles_at_epoch + self.angle_rates * minutes
+        angles[2] -= greenwich_mean_sidereal_time(time)
+        mean_anomaly = angles[0]
+        eccentricity = self.eccentricity
+        sin_mean_anomaly, cos_mean_anomaly = np.sin(mean_anomaly), np.cos(mean_anomaly)
+        # Second order solution of Kepler's equation, the error is below 0.5 * e^3 rad (< 2e-6 rad for GPS orbits)
+        angles[0] += eccentricity * sin_mean_anomaly * (1 + eccentricity * cos_mean_anomaly)
+        (cos_eccentric_anomaly, cos_perigee, cos_node), (sin_eccentric_anomaly, sin_perigee, sin_node) = \
+            np.cos(angles), np.sin(angles)
+        x_orbit = self.semi_major_axis * cos_eccentric_anomaly - self.focal_distance
+        y_orbit = self.semi_minor_axis * sin_eccentric_anomaly
+        x_node = x_orbit * cos_perigee - y_orbit * sin_perigee
+        y_node = x_orbit * sin_perigee + y_orbit * cos_perigee
+        y_node_equator = y_node * self.cos_inclination
+        positions = np.empty((len(x_orbit), 3))
+        positions[:, 0] = cos_node * x_node - sin_node * y_node_equator
+        positions[:, 1] = sin_node * x_node + cos_node * y_node_equator
+        positions[:, 2] = y_node * self.sin_inclination
+        return positions
+
+    def observer_views(self, time, latitude, longitude, height):
+        positions = self.positions_ecef(time)
+        east_north_up = ecef_to_east_north_up(positions, latitude, longitude, height)
+        return east_north_up_to_elevation_azimuth(east_north_up)
+
+
+@lru_cache(maxsize=None)
+def actual_satellite_constellation_orbit_propagator():
+    pseudo_random_noises, lines1, lines2 = zip(*actual_satellite_constellation_two_line_element_lines())
+    return OrbitPropagator(pseudo_random_noises, lines1, lines2)
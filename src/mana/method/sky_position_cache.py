@@ -0,0 +1,151 @@
+import datetime as dt
+import math
+from collections import OrderedDict
+from threading import Lock
+
+from mana.method.orbit_propagator import seconds_since_unix_epoch
+from mana.metrics import metrics_registry
+from mana.utility import lazy_import
+
+np = lazy_import("numpy")
+
+earth_radius = 6378.137
+min_gps_satellite_range = 20200.0
+kilometers_per_degree = 111.32
+max_gps_angular_acceleration = 1e-7
+height_error_share = 0.1
+
+
+class InterpolatedSkyView:
+
+    def __init__(self, cache, entry, fraction, time, latitude, longitude, height):
+        self.cache = cache
+        self.entry = entry
+        self.fraction = fraction
+        self.time = time
+        self.latitude = latitude
+        self.longitude = longitude
+        self.height = height
+        self.exact_views = None
+
+    def get(self, pseudo_random_noise):
+        entry = self.entry
+        i = entry.index_by_pseudo_random_noise.get(pseudo_random_noise)
+        if i is None:
+            return None
+        if i in entry.exact_indices:
+            return self.exact_view(i)
+        elevation = entry.elevations[i] + entry.elevation_deltas[i] * self.fraction
+        azimuth = (entry.azimuths[i] + entry.azimuth_deltas[i] * self.fraction) % 360
+        return elevation, azimuth
+
+    def exact_view(self, i):
+        if self.exact_views is None:
+            self.exact_views = self.cache.orbit_propagator.observer_views(self.time, self.latitude, self.longitude,
+                                                                          self.height)
+        elevations, azimuths = self.exact_views
+        return float(elevations[i]), float(azimuths[i])
+
+
+class SkyPositionCacheEntry:
+
+    def __init__(self, index_by_pseudo_random_noise, start_views, end_views, max_interpolated_elevation):
+        start_elevations, start_azimuths = start_views
+        end_elevations, end_azimuths = end_views
+        self.index_by_pseudo_random_noise = index_by_pseudo_random_noise
+        self.elevations = start_elevations.tolist()
+        self.elevation_deltas = (end_elevations - start_elevations).tolist()
+        self.azimuths = start_azimuths.tolist()
+        self.azimuth_deltas = ((end_azimuths - start_azimuths + 180) % 360 - 180).tolist()
+        is_near_zenith = np.maximum(start_elevations, end_elevations) > max_interpolated_elevation
+        self.exact_indices = set(np.flatnonzero(is_near_zenith).tolist())
+
+
+class SkyPositionCache:
+
+    def __init__(self, orbit_propagator, time_bucket_seconds=60, grid_cell_degrees=0.05, height_cell_meters=1000,
+                 max_entries=1024, max_interpolated_elevation=80):
+        self.orbit_propagator = orbit_propagator
+        self.time_bucket_seconds = time_bucket_seconds
+        self.grid_cell_degrees = grid_cell_degrees
+        self.height_cell_meters = height_cell_meters
+        self.max_entries = max_entries
+        self.max_interpolated_elevation = max_interpolated_elevation
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_max_deviation(cls, orbit_propagator, max_deviation, max_entries=1024, max_interpolated_elevation=80):
+        # Half of the error budget is spent on the observer's offset from the cell center, which shifts the line of
+        # sight and tilts the local horizon, and half on the linear interpolation within the time bucket. Azimuth
+        # errors grow with 1 / cos(elevation), so both budgets hold up to the highest interpolated elevation. A small
+        # share of the offset budget goes to the height offset from the cell center, which only shifts the line of
+        # sight, so one height cell spans hundreds of meters.
+        max_error = math.radians(max_deviation) / 2 * math.cos(math.radians(max_interpolated_elevation))
+        max_offset = max_error * (1 - height_error_share) / (1 / earth_radius + 1 / min_gps_satellite_range)
+        grid_cell_degrees = max_offset / (kilometers_per_degree * math.sqrt(2) / 2)
+        height_cell_meters = 2 * max_error * height_error_share * min_gps_satellite_range * 1000
+        time_bucket_seconds = math.sqrt(8 * max_error / max_gps_angular_acceleration)
+        return cls(orbit_propagator, time_bucket_seconds=time_bucket_seconds, grid_cell_degrees=grid_cell_degrees,
+                   height_cell_meters=height_cell_meters, max_entries=max_entries,
+                   max_interpolated_elevation=max_interpolated_elevation)
+
+    def observer_views(self, time, latitude, longitude, height):
+        bucket_position = seconds_since_unix_epoch(time) / self.time_bucket_seconds
+        bucket = math.floor(bucket_position)
+        latitude_cell = math.floor(latitude / self.grid_cell_degrees)
+        longitude_cell = math.floor(longitude / self.grid_cell_degrees)
+        height_cell = math.floor(height / self.height_cell_meters)
+        key = (bucket, latitude_cell, longitude_cell, height_cell)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+        is_hit = entry is not None
+        if not is_hit:
+            entry = self.create_entry(bucket, latitude_cell, longitude_cell, height_cell)
+            with self.lock:
+                self.misses += 1
+                self.entries[key] = entry
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        if metrics_registry.enabled:
+            metrics_registry.increment("mana_sky_position_cache_requests_total",
+                                       result="hit" if is_hit else "miss")
+        return InterpolatedSkyView(self, entry, bucket_position - bucket, time, latitude, longitude, height)
+
+    def create_entry(self, bucket, latitude_cell, longitude_cell, height_cell):
+        latitude = (latitude_cell + 0.5) * self.grid_cell_degrees
+        longitude = (longitude_cell + 0.5) * self.grid_cell_degrees
+        height = (height_cell + 0.5) * self.height_cell_meters
+        start_time = unix_epoch_seconds_to_datetime(bucket * self.time_bucket_seconds)
+        end_time = unix_epoch_seconds_to_datetime((bucket + 1) * self.time_bucket_seconds)
+        start_views = self.orbit_propagator.observer_views(start_time, latitude, longitude, height)
+        end_views = self.orbit_propagator.observer_views(end_time, latitude, longitude, height)
+        return SkyPositionCacheEntry(self.orbit_propagator.index_by_pseudo_random_noise, start_views, end_views,
+                                     self.max_interpolated_elevation)
+
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0
+
+
+def unix_epoch_seconds_to_datetime(seconds):
+    return dt.datetime(1970, 1, 1) + dt.timedelta(seconds=seconds)
+
+
+shared_sky_position_caches = {}
+shared_sky_position_caches_lock = Lock()
+
+
+def shared_sky_position_cache(orbit_propagator, max_deviation, max_entries=1024):
+    key = (id(orbit_propagator), max_deviation, max_entries)
+    with shared_sky_position_caches_lock:
+        cache = shared_sky_position_caches.get(key)
+        if cache is None:
+            cache = SkyPositionCache.for_max_deviation(orbit_propagator, max_deviation, max_entries=max_entries)
+            shared_sky_position_caches[key] = cache
+    return cache
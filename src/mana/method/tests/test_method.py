@@ -2,12 +2,14 @@ from collections import namedtuple
 from datetime import datetime
 from unittest import mock
 
+import numpy as np
 import pytest
 
 from mana.handler import Device
 from mana.method import Method, AverageMethod, OrGroupMethod, AndGroupMethod, AverageGroupMethod, \
     MultipleReceiversMethod, PhysicalSpeedLimitMethod, PhysicalRateOfTurnLimitMethod, PhysicalHeightLimitMethod, \
-    PhysicalEnvironmentLimitMethod, OrbitPositionsMethod, TimeDriftMethod, CarrierToNoiseDensityMethod
+    PhysicalEnvironmentLimitMethod, OrbitPositionsMethod, TimeDriftMethod, CarrierToNoiseDensityMethod, \
+    method_name_to_class, register_method
 from mana.state import StateHistory, NmeaState, SatelliteState
 
 
@@ -100,6 +102,62 @@ def test_or_and_average_group_method_spoofing_indicator():
     assert spoofing_indicator == pytest.approx(0.66666666)
 
 
+class CountingMethodDummy(MethodDummy):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.call_count = 0
+
+    def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
+        self.call_count += 1
+        return self.static_spoofing_indicator
+
+
+class ZeroCountingMethodDummy(CountingMethodDummy):
+    static_spoofing_indicator = 0
+
+
+class OneCountingMethodDummy(CountingMethodDummy):
+    static_spoofing_indicator = 1
+
+
+class StatefulCountingMethodDummy(CountingMethodDummy):
+    static_spoofing_indicator = 0.5
+    stateful = True
+
+
+@pytest.mark.parametrize('group_method_class,decisive_method_class,expected_spoofing_indicator', [
+    (OrGroupMethod, OneCountingMethodDummy, 1),
+    (AndGroupMethod, ZeroCountingMethodDummy, 0),
+])
+def test_group_method_short_circuit(group_method_class, decisive_method_class, expected_spoofing_indicator):
+    other_method_class = ZeroCountingMethodDummy if decisive_method_class is OneCountingMethodDummy else \
+        OneCountingMethodDummy
+    handler = HandlerDummy()
+    group_method = group_method_class(handler, [other_method_class, decisive_method_class, StatefulCountingMethodDummy],
+                                      reorder_interval=2)
+    assert group_method.stateful
+    other_method, decisive_method, stateful_method = group_method.methods
+    for _ in range(10):
+        spoofing_indicator = group_method.spoofing_indicator(device_id='DEVICE1', latest_state=None,
+                                                             previous_state=None, state_history=StateHistoryDummy())
+        assert spoofing_indicator == expected_spoofing_indicator
+    assert stateful_method.call_count == 10
+    assert decisive_method.call_count == 10
+    assert other_method.call_count == 2
+    assert [statistics.method for statistics in group_method.method_evaluation_statistics] == \
+        [decisive_method, other_method]
+
+
+def test_group_method_without_short_circuit():
+    handler = HandlerDummy()
+    group_method = OrGroupMethod(handler, [OneCountingMethodDummy, ZeroCountingMethodDummy], short_circuit=False)
+    for _ in range(3):
+        assert group_method.spoofing_indicator(device_id='DEVICE1', latest_state=None, previous_state=None,
+                                               state_history=StateHistoryDummy()) == 1
+    assert [method.call_count for method in group_method.methods] == [3, 3]
+
+
 def test_multiple_receivers_method_default_parameters():
     handler = HandlerDummy()
     multiple_receivers_method = MultipleReceiversMethod(handler, distances={}, distance_ratio_thresholds={})
@@ -139,6 +197,33 @@ def test_multiple_receivers_method_detect_spoofing_attack(data_port1, data_port2
     assert spoofing_indicator == expected_spoofing_indicator
 
 
+def test_multiple_receivers_method_detect_spoofing_attack_with_many_receivers():
+    devices = []
+    for i, longitude in enumerate([0, 0.00001, 0.00002, 0.00003]):
+        device = Device()
+        device.device_id = 'DEVICE{}'.format(i)
+        device.state_history = create_state_history_with_multiple_receivers_method_dummy_states([(1, 0, longitude)])
+        devices.append(device)
+    handler = HandlerDummy(devices=devices)
+    distances = {('DEVICE0', 'DEVICE1'): 1.1, ('DEVICE0', 'DEVICE3'): 3.3, ('DEVICE1', 'DEVICE2'): 1.1,
+                 ('DEVICE2', 'DEVICE3'): 1.1}
+    distance_ratio_thresholds = {device_ids: 0.5 for device_ids in distances}
+    method = MultipleReceiversMethod(handler, distances=distances, distance_ratio_thresholds=distance_ratio_thresholds,
+                                     new_measurement_weight=0.6)
+    assert method.pairs_by_device_id['DEVICE0'] == [(0, 'DEVICE1'), (1, 'DEVICE3')]
+    state_history = devices[0].state_history
+    spoofing_indicator = method.detect_spoofing_attack(device_id='DEVICE0', latest_state=state_history.state(0),
+                                                       previous_state=None, state_history=state_history)
+    assert spoofing_indicator == 0
+    assert method.average_distances.tolist() == pytest.approx([1.1, 3.3, 1.1, 1.1], rel=0.01)
+    devices[3].state_history = create_state_history_with_multiple_receivers_method_dummy_states([(1, 0, 0)])
+    devices[1].state_history = create_state_history_with_multiple_receivers_method_dummy_states([(1, 0, 0)])
+    spoofing_indicator = method.detect_spoofing_attack(device_id='DEVICE0', latest_state=state_history.state(0),
+                                                       previous_state=None, state_history=state_history)
+    assert spoofing_indicator == 1
+    assert method.average_distances.tolist() == pytest.approx([0.44, 1.32, 1.1, 1.1], rel=0.01)
+
+
 def create_state_history_with_multiple_receivers_method_dummy_states(data):
     state_history = StateHistory()
     for seconds, latitude, longitude in data:
@@ -181,6 +266,30 @@ def test_physical_rate_of_turn_limit_method_detect_spoofing_attack(speed, course
     assert spoofing_indicator == expected_spoofing_indicator
 
 
+def test_physical_rate_of_turn_limit_method_z_score_detection_mode():
+    handler = HandlerDummy()
+    method = PhysicalRateOfTurnLimitMethod(handler, max_rate_of_turn=5, min_speed_to_determine_rate_of_turn=0.5,
+                                           detection_mode="z_score", z_score_lag=5, z_score_threshold=3)
+    courses = [0, 1, 2, 3, 4, 5, 6, 7, 50, 51]
+    spoofing_indicators = []
+    previous_state = None
+    for seconds, course in enumerate(courses):
+        time = datetime(2018, 1, 1, 0, 0, seconds)
+        latest_state = NmeaState(update_time=time, gps_time=time, course=course + seconds % 2 * 0.1, speed=1)
+        if previous_state is not None:
+            spoofing_indicators.append(method.detect_spoofing_attack(device_id='DEVICE1', latest_state=latest_state,
+                                                                     previous_state=previous_state,
+                                                                     state_history=None))
+        previous_state = latest_state
+    assert spoofing_indicators == [0, 0, 0, 0, 0, 0, 0, 1, 0]
+
+
+def test_physical_rate_of_turn_limit_method_unknown_detection_mode():
+    with pytest.raises(ValueError):
+        PhysicalRateOfTurnLimitMethod(HandlerDummy(), max_rate_of_turn=5, min_speed_to_determine_rate_of_turn=0.5,
+                                      detection_mode="unknown")
+
+
 @pytest.mark.parametrize('height,expected_spoofing_indicator', [
     (-5, 0), (0, 0), (5, 0), (-5.1, 1), (5.1, 1)
 ])
@@ -237,23 +346,19 @@ def test_physical_environment_limit_method_detect_spoofing_attack(is_on_water, i
     assert spoofing_indicator == expected_spoofing_indicator
 
 
-class TwoLineElementDummy:
+class OrbitPropagatorDummy:
 
-    def __init__(self, pseudo_random_noise, elevation, azimuth):
-        self.pseudo_random_noise = pseudo_random_noise
-        self.elevation = elevation
-        self.azimuth = azimuth
+    def __init__(self, satellite_count):
+        self.pseudo_random_noises = list(range(satellite_count))
 
-    def observer_view(self, *_args, **_kwargs):
-        return self.elevation, self.azimuth
+    def observer_views(self, *_args, **_kwargs):
+        return np.array(self.pseudo_random_noises, dtype=float), np.array(self.pseudo_random_noises, dtype=float)
 
 
 class OrbitPositionsMethodTestable(OrbitPositionsMethod):
 
     def load_two_line_elements(self):
-        self.two_line_elements = []
-        for i in range(4):
-            self.two_line_elements.append(TwoLineElementDummy(i, i, i))
+        self.orbit_propagator = OrbitPropagatorDummy(4)
 
 
 @pytest.mark.parametrize('satellite_data, expected_spoofing_indicator', [
@@ -328,3 +433,11 @@ def create_carrier_to_noise_method_satellite_dummy_states(satellite_data):
         state_dummy = SatelliteState(carrier_to_noise_density=carrier_to_noise_density, is_visible=True)
         satellites.append(state_dummy)
     return satellites
+
+
+def test_method_name_to_class():
+    assert method_name_to_class("OrbitPositionsMethod") is OrbitPositionsMethod
+    assert method_name_to_class("physicalheightlimitmethod") is PhysicalHeightLimitMethod
+    assert method_name_to_class("mana.method.method:TimeDriftMethod") is TimeDriftMethod
+    register_method("AverageGroupMethod", AverageGroupMethod)
+    assert method_name_to_class("AverageGroupMethod") is AverageGroupMethod
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from mana.method.orbit_propagator import OrbitPropagator, parse_two_line_element_epoch, \
+    actual_satellite_constellation_orbit_propagator
+from mana.method.two_line_element import actual_satellite_constellation_two_line_elements
+from mana.utility import minimum_angle_difference
+
+two_line_element_set = [
+    "18",
+    "1 22877C 93068A   18268.70201389 -.00000000  00000-0  00000-0 0  2687",
+    "2 22877  54.4972  79.3811 0147546  77.1415 180.3797  2.00568932    11",
+    "13",
+    "1 24876C 97035A   18268.70201389  .00000000  00000-0  00000-0 0  2685",
+    "2 24876  55.4780 208.8266 0031882  83.0567 250.3308  2.00564522    19"]
+
+
+def test_parse_two_line_element_epoch():
+    epoch = parse_two_line_element_epoch(two_line_element_set[1])
+    assert abs(epoch - datetime(2018, 9, 25, 16, 50, 54)) < timedelta(milliseconds=1)
+
+
+def test_orbit_propagator_observer_views():
+    orbit_propagator = OrbitPropagator(two_line_element_set[0::3], two_line_element_set[1::3],
+                                       two_line_element_set[2::3])
+    assert orbit_propagator.pseudo_random_noises == [18, 13]
+    elevations, azimuths = orbit_propagator.observer_views(datetime(2018, 1, 1, 0, 0, 0), 0, 0, 0)
+    assert elevations[0] == pytest.approx(-12.81443, abs=0.1)
+    assert azimuths[0] == pytest.approx(216.06389, abs=0.1)
+
+
+@pytest.mark.parametrize("days,latitude,longitude,height", [
+    (0, 54.3, 10.1, 0), (1, 0, 0, 0), (30, -40, 170, 100), (180, 60, -30, 10)
+])
+def test_orbit_propagator_agrees_with_ephem(days, latitude, longitude, height):
+    time = datetime(2018, 9, 25, 17, 0) + timedelta(days=days)
+    orbit_propagator = actual_satellite_constellation_orbit_propagator()
+    elevations, azimuths = orbit_propagator.observer_views(time, latitude, longitude, height)
+    for two_line_element in actual_satellite_constellation_two_line_elements():
+        two_line_element.observer.pressure = 0
+        elevation, azimuth = two_line_element.observer_view(time, latitude, longitude, height)
+        i = orbit_propagator.index_by_pseudo_random_noise[two_line_element.pseudo_random_noise]
+        assert elevations[i] == pytest.approx(elevation, abs=0.1)
+        if 5 < elevation < 85:
+            assert minimum_angle_difference(azimuths[i], azimuth) < 0.2
+
@@ -0,0 +1,103 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from mana.method.orbit_propagator import actual_satellite_constellation_orbit_propagator
+from mana.method.sky_position_cache import SkyPositionCache, shared_sky_position_cache
+from mana.metrics import metrics_registry
+
+
+class OrbitPropagatorDummy:
+
+    def __init__(self):
+        self.pseudo_random_noises = [1, 2]
+        self.index_by_pseudo_random_noise = {1: 0, 2: 1}
+        self.call_count = 0
+
+    def observer_views(self, time, latitude, longitude, height):
+        self.call_count += 1
+        seconds = (time - datetime(1970, 1, 1)).total_seconds()
+        elevations = np.array([seconds % 60, 85.0])
+        azimuths = np.array([(359 + seconds / 10) % 360, 10.0])
+        return elevations, azimuths
+
+
+@pytest.fixture
+def enabled_metrics_registry():
+    metrics_registry.enable()
+    yield metrics_registry
+    metrics_registry.disable()
+    metrics_registry.reset()
+
+
+def test_sky_position_cache_interpolates_within_bucket():
+    orbit_propagator = OrbitPropagatorDummy()
+    cache = SkyPositionCache(orbit_propagator, time_bucket_seconds=20, grid_cell_degrees=1)
+    view = cache.observer_views(datetime(1970, 1, 1, 0, 0, 5), 54.2, 10.3, 0)
+    elevation, azimuth = view.get(1)
+    assert elevation == pytest.approx(5)
+    assert azimuth == pytest.approx(359.5)
+    assert view.get(3) is None
+    assert orbit_propagator.call_count == 2
+
+
+def test_sky_position_cache_computes_near_zenith_satellites_exactly():
+    orbit_propagator = OrbitPropagatorDummy()
+    cache = SkyPositionCache(orbit_propagator, time_bucket_seconds=20, grid_cell_degrees=1)
+    view = cache.observer_views(datetime(1970, 1, 1, 0, 0, 5), 54.2, 10.3, 0)
+    assert view.get(2) == (85.0, 10.0)
+    assert orbit_propagator.call_count == 3
+
+
+def test_sky_position_cache_hits_and_eviction(enabled_metrics_registry):
+    orbit_propagator = OrbitPropagatorDummy()
+    cache = SkyPositionCache(orbit_propagator, time_bucket_seconds=20, grid_cell_degrees=1, max_entries=2)
+    cache.observer_views(datetime(2018, 1, 1, 0, 0, 1), 54.2, 10.3, 0)
+    cache.observer_views(datetime(2018, 1, 1, 0, 0, 2), 54.3, 10.4, 0)
+    cache.observer_views(datetime(2018, 1, 1, 0, 0, 3), 55.2, 10.3, 0)
+    cache.observer_views(datetime(2018, 1, 1, 0, 0, 30), 54.2, 10.3, 0)
+    assert (cache.hits, cache.misses) == (1, 3)
+    assert cache.hit_rate() == 0.25
+    assert [(latitude_cell, longitude_cell) for _, latitude_cell, longitude_cell, _ in cache.entries] == \
+        [(55, 10), (54, 10)]
+    assert enabled_metrics_registry.counter_value("mana_sky_position_cache_requests_total", result="hit") == 1
+    assert enabled_metrics_registry.counter_value("mana_sky_position_cache_requests_total", result="miss") == 3
+
+
+def test_sky_position_cache_accuracy():
+    orbit_propagator = actual_satellite_constellation_orbit_propagator()
+    max_deviation = 0.1
+    cache = SkyPositionCache.for_max_deviation(orbit_propagator, max_deviation)
+    generator = random.Random(0)
+    for _ in range(100):
+        time = datetime(2018, 3, 1) + timedelta(seconds=generator.uniform(0, 5 * 86400))
+        latitude, longitude = generator.uniform(-70, 70), generator.uniform(-180, 180)
+        # Receivers of one cell at different heights, e.g. on a ship and an aircraft, share no entry
+        height = generator.choice([0, 20, 3000, 11000])
+        view = cache.observer_views(time, latitude, longitude, height)
+        elevations, azimuths = orbit_propagator.observer_views(time, latitude, longitude, height)
+        for pseudo_random_noise, elevation, azimuth in zip(orbit_propagator.pseudo_random_noises, elevations,
+                                                           azimuths):
+            if elevation < 0:
+                continue
+            cached_elevation, cached_azimuth = view.get(pseudo_random_noise)
+            assert cached_elevation == pytest.approx(elevation, abs=max_deviation)
+            assert abs((cached_azimuth - azimuth + 180) % 360 - 180) < max_deviation
+
+
+def test_sky_position_cache_keys_height():
+    orbit_propagator = OrbitPropagatorDummy()
+    cache = SkyPositionCache(orbit_propagator, time_bucket_seconds=20, grid_cell_degrees=1, height_cell_meters=500)
+    for height in [10, 400, 600, 10]:
+        cache.observer_views(datetime(2018, 1, 1, 0, 0, 1), 54.2, 10.3, height)
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert [key[3] for key in cache.entries] == [1, 0]
+
+
+def test_shared_sky_position_cache():
+    orbit_propagator = OrbitPropagatorDummy()
+    cache = shared_sky_position_cache(orbit_propagator, 0.1)
+    assert shared_sky_position_cache(orbit_propagator, 0.1) is cache
+    assert shared_sky_position_cache(orbit_propagator, 0.2) is not cache
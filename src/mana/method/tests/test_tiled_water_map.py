@@ -0,0 +1,79 @@
+import json
+import os
+import random
+
+import numpy as np
+import pytest
+
+from mana.method.tiled_water_map import TiledWaterMap, convert_water_grid_to_tiled_water_map
+from mana.method.water_map import WaterMap
+
+
+def water_grid_dummy():
+    water_grid = np.zeros((30, 61), dtype=np.uint8)
+    water_grid[:, 33:] = 255
+    water_grid[10:13, 3:8] = 128
+    return water_grid
+
+
+class WaterMapDummy(WaterMap):
+
+    def load_water_grid(self):
+        return water_grid_dummy(), 61
+
+
+@pytest.fixture
+def tiled_water_map_directory(tmp_path):
+    directory = str(tmp_path)
+    convert_water_grid_to_tiled_water_map(water_grid_dummy(), directory, tile_degrees=30)
+    return directory
+
+
+def test_convert_water_grid_to_tiled_water_map(tiled_water_map_directory):
+    with open(os.path.join(tiled_water_map_directory, "index.json")) as file:
+        index = json.load(file)
+    assert (index["tile_columns"], index["tile_rows"]) == (12, 6)
+    assert sorted(os.listdir(os.path.join(tiled_water_map_directory, "tiles"))) == \
+        ["0_6.npy", "1_6.npy", "2_0.npy", "2_1.npy", "2_6.npy", "3_6.npy", "4_6.npy", "5_6.npy"]
+
+
+def test_tiled_water_map_matches_water_map(tiled_water_map_directory):
+    water_map = WaterMapDummy()
+    tiled_water_map = TiledWaterMap(tiled_water_map_directory)
+    generator = random.Random(0)
+    latitudes = [generator.uniform(-90, 90) for _ in range(1000)]
+    longitudes = [generator.uniform(-180, 180) for _ in range(1000)]
+    for latitude, longitude in zip(latitudes, longitudes):
+        assert tiled_water_map.water_probability(latitude, longitude) == water_map.water_probability(latitude,
+                                                                                                     longitude)
+        assert tiled_water_map.is_on_land(latitude, longitude) == water_map.is_on_land(latitude, longitude)
+    assert np.array_equal(tiled_water_map.water_probabilities(latitudes, longitudes),
+                          water_map.water_probabilities(latitudes, longitudes))
+    assert np.array_equal(tiled_water_map.are_on_water(latitudes, longitudes),
+                          water_map.are_on_water(latitudes, longitudes))
+
+
+def test_tiled_water_map_tile_cache(tiled_water_map_directory):
+    tiled_water_map = TiledWaterMap(tiled_water_map_directory, max_cached_tiles=1)
+    assert tiled_water_map.water_probability(89, -179) == 0
+    assert tiled_water_map.tile_loads == 0
+    assert tiled_water_map.water_probability(23, -155) == pytest.approx(128 / 255)
+    assert tiled_water_map.water_probability(23, -154) == pytest.approx(128 / 255)
+    assert tiled_water_map.tile_loads == 1
+    assert tiled_water_map.water_probability(23, -150) == pytest.approx(128 / 255)
+    assert list(tiled_water_map.tiles) == [(2, 1)]
+    tiled_water_map.water_probability(23, -155)
+    assert tiled_water_map.tile_loads == 3
+
+
+def test_convert_water_grid_uniform_tolerance(tmp_path):
+    water_grid = np.full((18, 36), 250, dtype=np.uint8)
+    water_grid[0, 0] = 254
+    convert_water_grid_to_tiled_water_map(water_grid, str(tmp_path), tile_degrees=90, uniform_tolerance=5)
+    assert not os.path.exists(os.path.join(str(tmp_path), "tiles"))
+    assert TiledWaterMap(str(tmp_path)).water_probability(89, -179) == pytest.approx(252 / 255)
+
+
+def test_convert_water_grid_rejects_tiles_smaller_than_pixels(tmp_path):
+    with pytest.raises(ValueError):
+        convert_water_grid_to_tiled_water_map(np.zeros((2, 4), dtype=np.uint8), str(tmp_path), tile_degrees=30)
@@ -1,23 +1,32 @@
+import os
 from unittest import mock
 
-from mana.method.water_map import WaterMap
+import numpy as np
+from PIL import Image
+import pytest
 
+from mana.method.water_map import WaterMap, load_water_grid, bit_pack_water_grid
 
-class ImageDummy:
 
-    def __init__(self):
-        self.size = 10, 10
+def water_grid_dummy():
+    water_grid = np.zeros((10, 10), dtype=np.uint8)
+    water_grid[0, 0] = 255
+    return water_grid
 
-    @staticmethod
-    def getpixel(position):
-        if position == (0, 0):
-            return 4 * (0,)
-        return 4 * (255,)
 
+@pytest.fixture
+def water_map_image_file(tmp_path):
+    image = Image.new("RGBA", (16, 8), (255, 255, 255, 255))
+    image.putpixel((0, 0), (0, 0, 0, 255))
+    image.putpixel((15, 7), (128, 128, 128, 255))
+    filename = os.path.join(tmp_path, "water_map.png")
+    image.save(filename)
+    return filename
 
-@mock.patch("mana.method.water_map.WaterMap.get_image_resource")
-def test_water_map_is_on_water_land(get_image_resource_mock):
-    get_image_resource_mock.return_value = ImageDummy()
+
+@mock.patch("mana.method.water_map.WaterMap.load_water_grid")
+def test_water_map_is_on_water_land(load_water_grid_mock):
+    load_water_grid_mock.return_value = water_grid_dummy(), 10
     water_map = WaterMap()
     assert water_map.is_on_water(-90, -180) is True
     assert water_map.is_on_land(-90, -180) is False
@@ -25,3 +34,51 @@ def test_water_map_is_on_water_land(get_image_resource_mock):
     assert water_map.is_on_land(0, 0) is True
     assert water_map.is_on_water(45, 90) is False
     assert water_map.is_on_land(45, 90) is True
+
+
+@mock.patch("mana.method.water_map.WaterMap.load_water_grid")
+def test_water_map_are_on_water_land(load_water_grid_mock):
+    load_water_grid_mock.return_value = water_grid_dummy(), 10
+    water_map = WaterMap()
+    latitudes, longitudes = np.array([-90, 0, 45]), np.array([-180, 0, 90])
+    assert water_map.are_on_water(latitudes, longitudes).tolist() == [True, False, False]
+    assert water_map.are_on_land(latitudes, longitudes).tolist() == [False, True, True]
+    assert water_map.water_probabilities(latitudes, longitudes).tolist() == [1, 0, 0]
+
+
+@mock.patch("mana.method.water_map.WaterMap.load_water_grid")
+def test_bit_packed_water_map(load_water_grid_mock):
+    water_grid = water_grid_dummy()
+    water_grid[5, 9] = 128
+    load_water_grid_mock.return_value = bit_pack_water_grid(water_grid), 10
+    water_map = WaterMap(bit_packed=True)
+    assert water_map.is_on_water(-90, -180) is True
+    assert water_map.is_on_water(0, 170) is True
+    assert water_map.is_on_land(0, 170) is True
+    assert water_map.are_on_water([-90, 0, 45], [-180, 170, 90]).tolist() == [True, True, False]
+    with pytest.raises(ValueError):
+        water_map.is_on_water(0, 0, threshold=0.5)
+    with pytest.raises(ValueError):
+        water_map.water_probability(0, 0)
+
+
+@pytest.mark.parametrize("bit_packed", [False, True])
+def test_load_water_grid_compiles_once(water_map_image_file, tmp_path, bit_packed):
+    cache_directory = os.path.join(tmp_path, "cache")
+    water_grid, width = load_water_grid(water_map_image_file, cache_directory, bit_packed)
+    assert width == 16
+    assert isinstance(water_grid, np.memmap)
+    assert len(os.listdir(cache_directory)) == 1
+    load_water_grid.cache_clear()
+    with mock.patch("mana.method.water_map.compile_water_grid") as compile_water_grid_mock:
+        cached_water_grid, _ = load_water_grid(water_map_image_file, cache_directory, bit_packed)
+        compile_water_grid_mock.assert_not_called()
+    assert np.array_equal(cached_water_grid, water_grid)
+
+
+def test_water_map_compiled_from_image(water_map_image_file, tmp_path):
+    with mock.patch("mana.method.water_map.water_map_image_file", return_value=water_map_image_file):
+        water_map = WaterMap(cache_directory=str(tmp_path))
+    assert water_map.water_probability(90, -180) == 1
+    assert water_map.water_probability(-89, 179) == pytest.approx(127 / 255)
+    assert water_map.water_probability(0, 0) == 0
@@ -0,0 +1,141 @@
+import json
+import os
+from collections import OrderedDict
+from threading import Lock
+
+from mana.method.water_map import compile_water_grid, save_array_atomically
+from mana.utility import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+
+tiled_water_map_version = 1
+mixed_tile = -1
+
+
+class TiledWaterMap:
+
+    def __init__(self, directory, max_cached_tiles=64):
+        self.directory = directory
+        self.max_cached_tiles = max_cached_tiles
+        with open(os.path.join(directory, "index.json")) as file:
+            index = json.load(file)
+        if index["version"] != tiled_water_map_version:
+            raise ValueError("Unsupported tiled water map version {}".format(index["version"]))
+        self.width = index["width"]
+        self.height = index["height"]
+        self.tile_columns = index["tile_columns"]
+        self.tile_rows = index["tile_rows"]
+        self.coarse_grid = np.load(os.path.join(directory, "coarse.npy"))
+        self.tiles = OrderedDict()
+        self.lock = Lock()
+        self.tile_loads = 0
+
+    def is_on_land(self, latitude, longitude, threshold=0.25):
+        return not self.is_on_water(latitude, longitude, threshold=1 - threshold)
+
+    def is_on_water(self, latitude, longitude, threshold=0.25):
+        return self.water_probability(latitude, longitude) > threshold
+
+    def are_on_land(self, latitudes, longitudes, threshold=0.25):
+        return ~self.are_on_water(latitudes, longitudes, threshold=1 - threshold)
+
+    def are_on_water(self, latitudes, longitudes, threshold=0.25):
+        return self.water_probabilities(latitudes, longitudes) > threshold
+
+    def water_probability(self, latitude, longitude):
+        x = int(self.width * (180 + longitude) / 360) % self.width
+        y = int(self.height * (90 - latitude) / 180) % self.height
+        row, column = self.tile_position(x, y)
+        water_level = self.coarse_grid[row, column]
+        if water_level == mixed_tile:
+            tile = self.tile(row, column)
+            water_level = tile[y - row * self.height // self.tile_rows, x - column * self.width // self.tile_columns]
+        return water_level / 255
+
+    def water_probabilities(self, latitudes, longitudes):
+        x = (self.width * (180 + np.asarray(longitudes, dtype=float)) / 360).astype(np.int64) % self.width
+        y = (self.height * (90 - np.asarray(latitudes, dtype=float)) / 180).astype(np.int64) % self.height
+        rows, columns = self.tile_position(x, y)
+        water_levels = self.coarse_grid[rows, columns].astype(np.int16)
+        is_in_mixed_tile = water_levels == mixed_tile
+        for row, column in set(zip(rows[is_in_mixed_tile].tolist(), columns[is_in_mixed_tile].tolist())):
+            tile = self.tile(row, column)
+            is_in_tile = is_in_mixed_tile & (rows == row) & (columns == column)
+            water_levels[is_in_tile] = tile[y[is_in_tile] - row * self.height // self.tile_rows,
+                                            x[is_in_tile] - column * self.width // self.tile_columns]
+        return water_levels / 255
+
+    def tile_position(self, x, y):
+        # Tile boundaries are at floor(i * size / count), so the tile of pixel p is ceil((p + 1) * count / size) - 1
+        row = ((y + 1) * self.tile_rows - 1) // self.height
+        column = ((x + 1) * self.tile_columns - 1) // self.width
+        return row, column
+
+    def tile(self, row, column):
+        key = (row, column)
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+                return tile
+        tile = np.load(tile_file(self.directory, row, column))
+        with self.lock:
+            self.tile_loads += 1
+            self.tiles[key] = tile
+            while len(self.tiles) > self.max_cached_tiles:
+                self.tiles.popitem(last=False)
+        return tile
+
+
+def tile_file(directory, row, column):
+    return os.path.join(directory, "tiles", "{}_{}.npy".format(row, column))
+
+
+def tile_bounds(index, count, size):
+    return index * size // count, (index + 1) * size // count
+
+
+def convert_water_grid_to_tiled_water_map(water_grid, directory, tile_degrees=1, uniform_tolerance=0):
+    height, width = water_grid.shape
+    tile_columns = round(360 / tile_degrees)
+    tile_rows = round(180 / tile_degrees)
+    if tile_columns > width or tile_rows > height:
+        raise ValueError("Tiles of {} degrees are smaller than a pixel of the {}x{} raster".format(
+            tile_degrees, width, height))
+    coarse_grid = np.empty((tile_rows, tile_columns), dtype=np.int16)
+    for row in range(tile_rows):
+        top, bottom = tile_bounds(row, tile_rows, height)
+        band = np.asarray(water_grid[top:bottom])
+        for column in range(tile_columns):
+            left, right = tile_bounds(column, tile_columns, width)
+            tile = band[:, left:right]
+            min_water_level, max_water_level = int(tile.min()), int(tile.max())
+            if max_water_level - min_water_level <= uniform_tolerance:
+                coarse_grid[row, column] = round((min_water_level + max_water_level) / 2)
+            else:
+                coarse_grid[row, column] = mixed_tile
+                save_array_atomically(tile_file(directory, row, column), np.ascontiguousarray(tile, dtype=np.uint8))
+    save_array_atomically(os.path.join(directory, "coarse.npy"), coarse_grid)
+    index = {
+        "version": tiled_water_map_version,
+        "width": width,
+        "height": height,
+        "tile_columns": tile_columns,
+        "tile_rows": tile_rows,
+    }
+    with open(os.path.join(directory, "index.json"), "w") as file:
+        json.dump(index, file)
+    return index
+
+
+def convert_image_to_tiled_water_map(image_file, directory, tile_degrees=1, uniform_tolerance=0):
+    max_image_pixels = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = None
+    try:
+        with Image.open(image_file) as image:
+            water_grid = compile_water_grid(image)
+    finally:
+        Image.MAX_IMAGE_PIXELS = max_image_pixels
+    return convert_water_grid_to_tiled_water_map(water_grid, directory, tile_degrees=tile_degrees,
+                                                 uniform_tolerance=uniform_tolerance)
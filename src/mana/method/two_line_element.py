@@ -1,7 +1,9 @@
 import math
 import os
 
-import ephem
+from mana.utility import lazy_import
+
+ephem = lazy_import("ephem")
 
 
 def actual_satellite_constellation_two_line_elements():
@@ -11,12 +13,17 @@ def actual_satellite_constellation_two_line_elements():
 
 
 def actual_satellite_constellation_two_line_element_generator():
+    for pseudo_random_noise, line1, line2 in actual_satellite_constellation_two_line_element_lines():
+        two_line_element = TwoLineElement(pseudo_random_noise, line1, line2)
+        yield two_line_element
+
+
+def actual_satellite_constellation_two_line_element_lines():
     i = 0
     lines = read_lines_of_resource()
-    while i < len(lines):
+    while i + 2 < len(lines):
         pseudo_random_noise, line1, line2 = lines[i], lines[i + 1], lines[i + 2]
-        two_line_element = TwoLineElement(int(pseudo_random_noise), line1, line2)
-        yield two_line_element
+        yield int(pseudo_random_noise), line1, line2
         i += 3
 
 
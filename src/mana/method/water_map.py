@@ -1,40 +1,118 @@
+import hashlib
 import os
+import tempfile
+from functools import lru_cache
 
-from PIL import Image
+from mana.utility import lazy_import
+
+np = lazy_import("numpy")
+Image = lazy_import("PIL.Image")
+bit_packed_water_thresholds = (0.25, 0.75)
 
 
 class WaterMap:
 
-    def __init__(self):
-        self.map_image = self.get_image_resource()
-        self.width, self.height = self.map_image.size
+    def __init__(self, bit_packed=False, cache_directory=None):
+        self.bit_packed = bit_packed
+        self.cache_directory = cache_directory or default_cache_directory()
+        self.water_grid, self.width = self.load_water_grid()
+        self.height = self.water_grid.shape[-2]
 
     def is_on_land(self, latitude, longitude, threshold=0.25):
         return not self.is_on_water(latitude, longitude, threshold=1 - threshold)
 
     def is_on_water(self, latitude, longitude, threshold=0.25):
-        water_probability = self.water_probability(latitude, longitude)
-        return water_probability > threshold
+        x, y = self.latitude_longitude_to_pixel_position(latitude, longitude)
+        if self.bit_packed:
+            plane = self.water_grid[self.bit_packed_plane_index(threshold)]
+            return bool(plane[y, x >> 3] >> (7 - (x & 7)) & 1)
+        return bool(self.water_grid[y, x] > threshold * 255)
+
+    def are_on_land(self, latitudes, longitudes, threshold=0.25):
+        return ~self.are_on_water(latitudes, longitudes, threshold=1 - threshold)
+
+    def are_on_water(self, latitudes, longitudes, threshold=0.25):
+        x, y = self.latitudes_longitudes_to_pixel_positions(latitudes, longitudes)
+        if self.bit_packed:
+            plane = self.water_grid[self.bit_packed_plane_index(threshold)]
+            return (plane[y, x >> 3] >> (7 - (x & 7)) & 1).astype(bool)
+        return self.water_grid[y, x] > threshold * 255
 
     def water_probability(self, latitude, longitude):
-        pixel_position = self.latitude_longitude_to_pixel_position(latitude, longitude)
-        rgba = self.map_image.getpixel(pixel_position)
-        grayscale = self.rgb_to_grayscale(rgba)
-        water_probability = 1 - grayscale / 255
-        return water_probability
+        if self.bit_packed:
+            raise ValueError("A bit packed water map only stores the thresholds {}".format(bit_packed_water_thresholds))
+        x, y = self.latitude_longitude_to_pixel_position(latitude, longitude)
+        return self.water_grid[y, x] / 255
+
+    def water_probabilities(self, latitudes, longitudes):
+        if self.bit_packed:
+            raise ValueError("A bit packed water map only stores the thresholds {}".format(bit_packed_water_thresholds))
+        x, y = self.latitudes_longitudes_to_pixel_positions(latitudes, longitudes)
+        return self.water_grid[y, x] / 255
 
     def latitude_longitude_to_pixel_position(self, latitude, longitude):
         x = self.width * (180 + longitude) / 360
         y = self.height * (90 - latitude) / 180
         return int(x) % self.width, int(y) % self.height
 
-    @staticmethod
-    def get_image_resource():
-        water_map_file = os.path.dirname(os.path.abspath(__file__)) + "/water_map.png"
-        return Image.open(water_map_file)
+    def latitudes_longitudes_to_pixel_positions(self, latitudes, longitudes):
+        x = self.width * (180 + np.asarray(longitudes, dtype=float)) / 360
+        y = self.height * (90 - np.asarray(latitudes, dtype=float)) / 180
+        return x.astype(np.int64) % self.width, y.astype(np.int64) % self.height
+
+    def load_water_grid(self):
+        return load_water_grid(water_map_image_file(), self.cache_directory, self.bit_packed)
 
     @staticmethod
-    def rgb_to_grayscale(rgba):
-        r, g, b, _ = rgba
-        grayscale = ((r + g + b) / 3)
-        return grayscale
+    def bit_packed_plane_index(threshold):
+        try:
+            return bit_packed_water_thresholds.index(threshold)
+        except ValueError:
+            raise ValueError("A bit packed water map only stores the thresholds {}".format(bit_packed_water_thresholds))
+
+
+def default_cache_directory():
+    return os.environ.get("MANA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mana"))
+
+
+def water_map_image_file():
+    return os.path.dirname(os.path.abspath(__file__)) + "/water_map.png"
+
+
+def compile_water_grid(image):
+    rgb = np.asarray(image.convert("RGBA"), dtype=np.uint16)[..., :3]
+    grayscale = np.round(rgb.sum(axis=2) / 3)
+    return (255 - grayscale).astype(np.uint8)
+
+
+def bit_pack_water_grid(water_grid):
+    thresholds = np.array(bit_packed_water_thresholds)[:, np.newaxis, np.newaxis] * 255
+    return np.packbits(water_grid[np.newaxis] > thresholds, axis=2)
+
+
+@lru_cache(maxsize=None)
+def load_water_grid(image_file, cache_directory, bit_packed):
+    with open(image_file, "rb") as file:
+        digest = hashlib.sha256(file.read()).hexdigest()[:16]
+    with Image.open(image_file) as image:
+        width = image.size[0]
+        grid_file = os.path.join(cache_directory,
+                                 "water_map-{}{}.npy".format(digest, "-bit-packed" if bit_packed else ""))
+        if os.path.exists(grid_file):
+            return np.load(grid_file, mmap_mode="r"), width
+        water_grid = compile_water_grid(image)
+    if bit_packed:
+        water_grid = bit_pack_water_grid(water_grid)
+    try:
+        save_array_atomically(grid_file, water_grid)
+    except OSError:
+        return water_grid, width
+    return np.load(grid_file, mmap_mode="r"), width
+
+
+def save_array_atomically(filename, array):
+    directory = os.path.dirname(filename)
+    os.makedirs(directory, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".npy", delete=False) as file:
+        np.save(file, array)
+    os.replace(file.name, filename)
@@ -0,0 +1,195 @@
+import bisect
+import time
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+
+default_latency_buckets = (0.000001, 0.0000025, 0.000005, 0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001,
+                           0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+
+    def __init__(self, buckets=default_latency_buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        # Plain increments without a lock: concurrent observers may rarely lose an update, which is acceptable for
+        # statistics and keeps the hot path cheap.
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_bucket_counts(self):
+        cumulative_bucket_counts = []
+        total = 0
+        for bucket_count in self.bucket_counts:
+            total += bucket_count
+            cumulative_bucket_counts.append(total)
+        return cumulative_bucket_counts
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        rank = q * self.count
+        for upper_bound, cumulative_count in zip(self.buckets, self.cumulative_bucket_counts()):
+            if cumulative_count >= rank:
+                return upper_bound
+        return float('inf')
+
+
+class MetricsRegistry:
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.monotonic()
+
+    def enable(self):
+        self.reset()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        self.counters = {}
+        self.histograms = {}
+        self.start_time = time.monotonic()
+
+    def increment(self, name, value=1, **labels):
+        key = (name, tuple(labels.items()))
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(labels.items()))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(value)
+
+    def counter_value(self, name, **labels):
+        return self.counters.get((name, tuple(labels.items())), 0)
+
+    def histogram(self, name, **labels):
+        return self.histograms.get((name, tuple(labels.items())))
+
+    def uptime(self):
+        return time.monotonic() - self.start_time
+
+    def snapshot(self):
+        uptime = self.uptime()
+        counters = []
+        for (name, labels), value in sorted(list(self.counters.items()), key=metric_sort_key):
+            counters.append({
+                "name": name,
+                "labels": dict(labels),
+                "value": value,
+                "rate": value / uptime if uptime > 0 else 0,
+            })
+        histograms = []
+        for (name, labels), histogram in sorted(list(self.histograms.items()), key=metric_sort_key):
+            histograms.append({
+                "name": name,
+                "labels": dict(labels),
+                "count": histogram.count,
+                "sum": histogram.sum,
+                "mean": histogram.sum / histogram.count if histogram.count > 0 else None,
+                "p50": histogram.quantile(0.5),
+                "p90": histogram.quantile(0.9),
+                "p99": histogram.quantile(0.99),
+            })
+        return {"uptime_seconds": uptime, "counters": counters, "histograms": histograms}
+
+    def prometheus_text(self):
+        # The server thread reads while the handler thread adds new label sets, so the metrics are copied first, which
+        # is atomic for dictionaries
+        counters = list(self.counters.items())
+        histograms = list(self.histograms.items())
+        lines = []
+        counter_names = sorted({name for (name, _), _ in counters})
+        for counter_name in counter_names:
+            lines.append("# TYPE {} counter".format(counter_name))
+            for (name, labels), value in counters:
+                if name == counter_name:
+                    lines.append("{}{} {}".format(name, format_prometheus_labels(labels), value))
+        histogram_names = sorted({name for (name, _), _ in histograms})
+        for histogram_name in histogram_names:
+            lines.append("# TYPE {} histogram".format(histogram_name))
+            for (name, labels), histogram in histograms:
+                if name != histogram_name:
+                    continue
+                cumulative_bucket_counts = histogram.cumulative_bucket_counts()
+                upper_bounds = [repr(b) for b in histogram.buckets] + ["+Inf"]
+                for upper_bound, cumulative_count in zip(upper_bounds, cumulative_bucket_counts):
+                    bucket_labels = labels + (("le", upper_bound),)
+                    lines.append("{}_bucket{} {}".format(name, format_prometheus_labels(bucket_labels),
+                                                         cumulative_count))
+                lines.append("{}_sum{} {}".format(name, format_prometheus_labels(labels), histogram.sum))
+                lines.append("{}_count{} {}".format(name, format_prometheus_labels(labels), histogram.count))
+        return "\n".join(lines) + "\n"
+
+
+def metric_sort_key(metric):
+    (name, labels), _ = metric
+    return name, str(labels)
+
+
+def format_prometheus_labels(labels):
+    if len(labels) == 0:
+        return ""
+    formatted_labels = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        formatted_labels.append("{}=\"{}\"".format(key, value))
+    return "{" + ",".join(formatted_labels) + "}"
+
+
+metrics_registry = MetricsRegistry()
+
+
+class MetricsServer:
+
+    def __init__(self, registry=metrics_registry, host="127.0.0.1", port=9100):
+        self.registry = registry
+        self.server = HTTPServer((host, port), self.create_request_handler_class())
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_port
+
+    def start(self):
+        self.thread = Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def create_request_handler_class(self):
+        registry = self.registry
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return MetricsRequestHandler
@@ -15,7 +15,7 @@ class NmeaParser:
         checksum = int(checksum_bytes.decode(), 16)
         if not cls.is_nmea_checksum_valid(data_bytes, checksum):
             error_message = "The checksum of the given nmea sentence '{}' is not correct!"
-            raise InvalidNmeaSentenceException(error_message.format(sentence))
+            raise InvalidNmeaChecksumException(error_message.format(sentence))
         data_fields = data_bytes.split(b',')
         descriptor = data_fields.pop(0).decode()
         device_descriptor = descriptor[:2]
@@ -214,5 +214,32 @@ class InvalidNmeaSentenceException(Exception):
     pass
 
 
+class InvalidNmeaChecksumException(InvalidNmeaSentenceException):
+    pass
+
+
 class NmeaSentenceNotSupportedException(Exception):
     pass
+
+
+nmea_time_field_indices = {"RMC": 1, "GGA": 1, "GLL": 5}
+
+
+def nmea_time_of_day(sentence):
+    fields = sentence.split("*", 1)[0].split(",")
+    time_field_index = nmea_time_field_indices.get(fields[0][-3:])
+    if time_field_index is None or len(fields) <= time_field_index:
+        return None
+    time_string = fields[time_field_index]
+    try:
+        return dt.datetime.strptime(time_string, '%H%M%S.%f' if "." in time_string else '%H%M%S').time()
+    except ValueError:
+        return None
+
+
+def parse_error_type(exception):
+    if isinstance(exception, InvalidNmeaChecksumException):
+        return "invalid_checksum"
+    if isinstance(exception, InvalidNmeaSentenceException):
+        return "invalid_sentence"
+    return "unsupported_sentence_type"
@@ -0,0 +1,110 @@
+from mana.feeder import StopFeeding
+from mana.timeline import TimelineFeeder, load_timeline_arrays, timeline_state, timeline_satellite_integer_fields, \
+    timeline_satellite_boolean_fields
+from mana.tracing import tracer
+from mana.utility import lazy_import
+
+np = lazy_import("numpy")
+
+
+class BatchTimelineFeeder(TimelineFeeder):
+
+    def run(self):
+        handler = self.handler
+        columns = load_timeline_arrays(self.timeline_file())
+        batch_methods = [method for method in handler.methods if is_batch_method(method)]
+        streaming_methods = [method for method in handler.methods if not is_batch_method(method)]
+        min_spoofing_indicator = handler.min_reported_spoofing_indicator()
+        detections = []
+        if streaming_methods:
+            with handler.recorded_detections(streaming_methods, lambda: self.row) as streaming_detections:
+                super().run()
+            detections.extend(streaming_detections)
+        for device_index, device_id in enumerate(columns["device_ids"].tolist()):
+            if handler.device(device_id) is None:
+                continue
+            rows = np.flatnonzero(columns["device_index"] == device_index)
+            for method in batch_methods:
+                evaluated_rows, previous_rows = batch_evaluated_rows(method, columns, rows)
+                spoofing_indicators = method.detect_batch(columns, evaluated_rows, previous_rows)
+                is_reported = spoofing_indicators > min_spoofing_indicator
+                evaluated_rows, spoofing_indicators = evaluated_rows[is_reported], spoofing_indicators[is_reported]
+                position = handler.methods.index(method)
+                detections.extend((row, position, device_id, spoofing_indicator, None)
+                                  for row, spoofing_indicator in zip(evaluated_rows.tolist(),
+                                                                     spoofing_indicators.tolist()))
+        states = {}
+
+        def load_state(row):
+            # Detections of several methods often share a row
+            if row not in states:
+                states.clear()
+                states[row] = timeline_state(columns, row)
+            return states[row]
+
+        try:
+            handler.hand_over_detections(detections, load_state)
+        except StopFeeding:
+            self.stop()
+
+
+def is_batch_method(method):
+    return method.batch and not method.calibration and not method.debug and not tracer.enabled
+
+
+def batch_evaluated_rows(method, columns, rows):
+    # The streaming path skips a state if a required field is missing, if it equals the last evaluated state in the
+    # variable fields, or if too few satellites are defined. A skipped state never equals the last evaluated state in
+    # the variable fields, so comparing each candidate state with the previous candidate gives the same selection.
+    is_candidate = np.ones(len(rows), dtype=bool)
+    for field in method.required_state_fields:
+        if field != "satellites":
+            is_candidate &= ~is_missing(columns[field][rows])
+    if method.min_sufficient_satellite_state_count > 0:
+        is_defined = np.ones(len(columns["is_visible"]), dtype=bool)
+        for field in method.required_satellite_state_fields:
+            if field in timeline_satellite_integer_fields:
+                is_defined &= ~np.isnan(columns[field])
+        defined = np.concatenate(([0], np.cumsum(is_defined)))
+        defined_count = defined[columns["satellite_end"][rows]] - defined[columns["satellite_start"][rows]]
+        is_candidate &= defined_count >= method.min_sufficient_satellite_state_count
+    candidate_rows = rows[is_candidate]
+    is_different = np.ones(len(candidate_rows), dtype=bool)
+    if method.variable_state_fields and len(candidate_rows) > 1:
+        is_different[1:] = False
+        for field in method.variable_state_fields:
+            if field == "satellites":
+                is_different[1:] |= are_satellites_different(columns, candidate_rows[1:], candidate_rows[:-1])
+            else:
+                is_different[1:] |= ~are_equal(columns[field][candidate_rows[1:]],
+                                               columns[field][candidate_rows[:-1]])
+    accepted_rows = candidate_rows[is_different]
+    return accepted_rows[1:], accepted_rows[:-1]
+
+
+def is_missing(values):
+    if np.issubdtype(values.dtype, np.datetime64):
+        return np.isnat(values)
+    if np.issubdtype(values.dtype, np.floating):
+        return np.isnan(values)
+    return np.zeros(len(values), dtype=bool)
+
+
+def are_equal(values, other_values):
+    return (values == other_values) | (is_missing(values) & is_missing(other_values))
+
+
+def are_satellites_different(columns, rows, other_rows):
+    counts = columns["satellite_count"][rows]
+    is_different = counts != columns["satellite_count"][other_rows]
+    compared = np.flatnonzero(~is_different & (counts > 0))
+    compared_counts = counts[compared]
+    segments = np.repeat(np.arange(len(compared)), compared_counts)
+    offsets = np.arange(len(segments)) - np.repeat(np.cumsum(compared_counts) - compared_counts, compared_counts)
+    satellites = columns["satellite_start"][rows[compared]][segments] + offsets
+    other_satellites = columns["satellite_start"][other_rows[compared]][segments] + offsets
+    is_satellite_different = np.zeros(len(segments), dtype=bool)
+    for field in timeline_satellite_integer_fields + timeline_satellite_boolean_fields:
+        is_satellite_different |= ~are_equal(columns[field][satellites], columns[field][other_satellites])
+    is_different[compared] = np.bincount(segments, weights=is_satellite_different, minlength=len(compared)) > 0
+    return is_different
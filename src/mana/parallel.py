@@ -0,0 +1,114 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from mana.feeder import Feeder, PcapFeeder, SentenceFeeder, StopFeeding
+from mana.handler import Handler, DetectionHandler
+from mana.tracing import tracer
+
+
+class SentenceRecordingHandler(Handler):
+
+    def __init__(self, device_ids=None):
+        self.device_ids = None if device_ids is None else set(device_ids)
+        self.sentences = []
+
+    def handle(self, device_id, time, sentence):
+        if self.device_ids is None or device_id in self.device_ids:
+            self.sentences.append((device_id, time, sentence))
+
+
+class DeviceParallelFeeder(Feeder):
+
+    def __init__(self, handler, recording, source_feeder_class=PcapFeeder, processes=None):
+        super().__init__(handler)
+        self.recording = recording
+        self.source_feeder_class = source_feeder_class
+        self.processes = processes
+
+    def run(self):
+        handler = self.handler
+        if not isinstance(handler, DetectionHandler) or tracer.enabled:
+            self.run_serially()
+            return
+        device_positions, cross_device_positions = plan_methods(handler)
+        sentences = read_sentences(self.recording, self.source_feeder_class,
+                                   [device.device_id for device in handler.devices])
+        min_spoofing_indicator = handler.min_reported_spoofing_indicator()
+        detect_device = partial(detect_device_sentences,
+                                method_classes=[handler.method_classes[i] for i in device_positions],
+                                method_options=handler.method_options, method_positions=device_positions,
+                                min_spoofing_indicator=min_spoofing_indicator)
+        device_tasks = list(split_sentences_by_device(sentences).items()) if device_positions else []
+        executor = ProcessPoolExecutor(self.processes) if self.processes != 1 and device_tasks else None
+        detections = []
+        try:
+            if executor is not None:
+                futures = [executor.submit(detect_device, device_id, sentence_indices, device_sentences)
+                           for device_id, (sentence_indices, device_sentences) in device_tasks]
+            # Only the methods that compare devices run on the merged stream, while the workers run the others
+            if cross_device_positions:
+                detections.extend(record_detections(handler, [handler.methods[i] for i in cross_device_positions],
+                                                    cross_device_positions, sentences, range(len(sentences)),
+                                                    min_spoofing_indicator))
+            if executor is not None:
+                for future in futures:
+                    detections.extend(future.result())
+            else:
+                for device_id, (sentence_indices, device_sentences) in device_tasks:
+                    detections.extend(detect_device(device_id, sentence_indices, device_sentences))
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        try:
+            handler.hand_over_detections(detections)
+        except StopFeeding:
+            self.stop()
+
+    def run_serially(self):
+        feeder = self.source_feeder_class(self.handler, self.recording)
+        feeder.run()
+        if feeder.stopped:
+            self.stop()
+
+
+def plan_methods(handler):
+    # Calibration measurements have to end up in the methods of the handler, so those methods are not moved either
+    device_positions = []
+    cross_device_positions = []
+    for position, method in enumerate(handler.methods):
+        if method.cross_device or method.calibration:
+            cross_device_positions.append(position)
+        else:
+            device_positions.append(position)
+    return device_positions, cross_device_positions
+
+
+def read_sentences(recording, feeder_class=PcapFeeder, device_ids=None):
+    handler = SentenceRecordingHandler(device_ids)
+    feeder_class(handler, recording).run()
+    return handler.sentences
+
+
+def split_sentences_by_device(sentences):
+    sentences_by_device = {}
+    for index, sentence in enumerate(sentences):
+        sentence_indices, device_sentences = sentences_by_device.setdefault(sentence[0], ([], []))
+        sentence_indices.append(index)
+        device_sentences.append(sentence)
+    return sentences_by_device
+
+
+def detect_device_sentences(device_id, sentence_indices, sentences, method_classes, method_options, method_positions,
+                            min_spoofing_indicator):
+    handler = DetectionHandler(device_ids=[device_id], method_classes=method_classes, method_options=method_options,
+                               detection_threshold=min_spoofing_indicator, on_spoofing_attack=None)
+    return record_detections(handler, handler.methods, method_positions, sentences, sentence_indices,
+                             min_spoofing_indicator)
+
+
+def record_detections(handler, methods, method_positions, sentences, sentence_indices, min_spoofing_indicator):
+    feeder = SentenceFeeder(handler, sentences)
+    with handler.recorded_detections(methods, lambda: sentence_indices[feeder.index], method_positions,
+                                     min_spoofing_indicator) as detections:
+        feeder.run()
+    return detections
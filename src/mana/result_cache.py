@@ -0,0 +1,240 @@
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import tempfile
+from datetime import datetime
+from functools import lru_cache
+from threading import Lock
+
+from mana.metrics import metrics_registry
+
+result_cache_version = 1
+pipeline_module_names = ["mana.feeder", "mana.handler", "mana.nmea_parser", "mana.state", "mana.utility",
+                         "mana.statistics"]
+
+
+class ResultCache:
+
+    def __init__(self, directory=None, max_size_bytes=1 << 30):
+        self.directory = directory or default_result_cache_directory()
+        self.max_size_bytes = max_size_bytes
+        self.lock = Lock()
+        self.recording_digests = {}
+        self.hits = 0
+        self.misses = 0
+        self.corrupted = 0
+        self.evictions = 0
+        self.size_bytes = sum(os.path.getsize(filename) for filename in self.entry_files())
+
+    def get(self, recording, device_ids, feeder_class, method_class, method_options, record_traces=False):
+        key = self.key(recording, device_ids, feeder_class, method_class, method_options, record_traces)
+        summary = self.read_entry(key)
+        with self.lock:
+            if summary is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if metrics_registry.enabled:
+            metrics_registry.increment("mana_result_cache_requests_total", result="miss" if summary is None else "hit")
+        return summary
+
+    def put(self, recording, device_ids, feeder_class, method_class, method_options, summary, record_traces=False):
+        key = self.key(recording, device_ids, feeder_class, method_class, method_options, record_traces)
+        payload = json.dumps(serialize_summary(summary), sort_keys=True)
+        entry = json.dumps({"key": key, "checksum": checksum(payload), "payload": payload})
+        filename = self.entry_file(key)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        previous_size = os.path.getsize(filename) if os.path.exists(filename) else 0
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(filename), suffix=".tmp", delete=False) as file:
+            file.write(entry)
+        os.replace(file.name, filename)
+        with self.lock:
+            self.size_bytes += len(entry) - previous_size
+        if self.size_bytes > self.max_size_bytes:
+            self.evict()
+
+    def read_entry(self, key):
+        filename = self.entry_file(key)
+        try:
+            with open(filename) as file:
+                entry = json.load(file)
+            payload = entry["payload"]
+            if entry["key"] != key or entry["checksum"] != checksum(payload):
+                raise ValueError("Checksum mismatch")
+            summary = deserialize_summary(json.loads(payload))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            self.remove_entry_file(filename)
+            with self.lock:
+                self.corrupted += 1
+            return None
+        os.utime(filename)
+        return summary
+
+    def evict(self):
+        entry_files = sorted(self.entry_files(), key=os.path.getmtime)
+        for filename in entry_files:
+            if self.size_bytes <= self.max_size_bytes:
+                break
+            self.remove_entry_file(filename)
+            with self.lock:
+                self.evictions += 1
+
+    def remove_entry_file(self, filename):
+        try:
+            size = os.path.getsize(filename)
+            os.remove(filename)
+        except OSError:
+            return
+        with self.lock:
+            self.size_bytes -= size
+
+    def clear(self):
+        for filename in self.entry_files():
+            self.remove_entry_file(filename)
+
+    def entry_files(self):
+        entries_directory = os.path.join(self.directory, "entries")
+        if not os.path.isdir(entries_directory):
+            return []
+        return [os.path.join(root, filename) for root, _, filenames in os.walk(entries_directory)
+                for filename in filenames if filename.endswith(".json")]
+
+    def entry_file(self, key):
+        return os.path.join(self.directory, "entries", key[:2], key + ".json")
+
+    def key(self, recording, device_ids, feeder_class, method_class, method_options, record_traces):
+        description = {
+            "version": result_cache_version,
+            "recording": self.recording_digest(recording),
+            "device_ids": list(device_ids),
+            "feeder": qualified_name(feeder_class),
+            "method": qualified_name(method_class),
+            "method_options": normalize_method_options(method_class, method_options),
+            "code_version": [code_version(cls) for cls in [method_class] + option_method_classes(method_options)],
+            "record_traces": record_traces,
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def recording_digest(self, recording):
+        status = os.stat(recording)
+        fingerprint = (recording, status.st_size, status.st_mtime_ns)
+        digest = self.recording_digests.get(fingerprint)
+        if digest is None:
+            digest = file_digest(recording)
+            self.recording_digests[fingerprint] = digest
+        return digest
+
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests > 0 else 0
+
+    def statistics(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "corrupted": self.corrupted,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes,
+        }
+
+
+def default_result_cache_directory():
+    return os.path.join(os.environ.get("MANA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mana")),
+                        "results")
+
+
+def checksum(payload):
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def file_digest(filename):
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def qualified_name(cls):
+    return "{}:{}".format(cls.__module__, cls.__qualname__)
+
+
+def method_option_names(method_class):
+    names = set()
+    for cls in method_class.__mro__:
+        if "__init__" not in vars(cls):
+            continue
+        for parameter in inspect.signature(cls.__init__).parameters.values():
+            if parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY):
+                names.add(parameter.name)
+    names.difference_update({"self", "handler"})
+    return names
+
+
+def normalize_method_options(method_class, method_options):
+    option_names = method_option_names(method_class)
+    return {name: normalize_value(value) for name, value in method_options.items() if name in option_names}
+
+
+def normalize_value(value):
+    if isinstance(value, dict):
+        return {", ".join(k) if isinstance(k, tuple) else str(k): normalize_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(v) for v in value]
+    if isinstance(value, type):
+        return qualified_name(value)
+    return value
+
+
+@lru_cache(maxsize=None)
+def code_version(method_class):
+    module_names = list(pipeline_module_names)
+    filenames = []
+    for cls in method_class.__mro__:
+        if cls.__module__ == "builtins":
+            continue
+        for module_name in [cls.__module__] + list(getattr(cls, "dependency_modules", [])):
+            if module_name not in module_names:
+                module_names.append(module_name)
+        for filename in getattr(cls, "dependency_files", []):
+            if filename not in filenames:
+                filenames.append(filename)
+    digest = hashlib.sha256()
+    for module_name in module_names:
+        filename = getattr(importlib.import_module(module_name), "__file__", None)
+        if filename is None:
+            digest.update(module_name.encode())
+            continue
+        digest.update(file_digest(filename).encode())
+    for filename in filenames:
+        # Bundled data like the two-line elements and the water map change the results as much as the code
+        digest.update(file_digest(filename).encode() if os.path.exists(filename) else filename.encode())
+    return digest.hexdigest()
+
+
+def option_method_classes(method_options):
+    # The methods of group methods are passed as options
+    method_classes = method_options.get("method_classes") or []
+    return [method_class for method_class in method_classes if isinstance(method_class, type)]
+
+
+def serialize_summary(summary):
+    serialized = dict(summary)
+    trace = summary.get("spoofing_indicator_trace")
+    if trace is not None:
+        serialized["spoofing_indicator_trace"] = [[time.isoformat(), device_id, spoofing_indicator]
+                                                  for time, device_id, spoofing_indicator in trace]
+    return serialized
+
+
+def deserialize_summary(serialized):
+    summary = dict(serialized)
+    trace = serialized.get("spoofing_indicator_trace")
+    if trace is not None:
+        summary["spoofing_indicator_trace"] = [(datetime.fromisoformat(time), device_id, spoofing_indicator)
+                                               for time, device_id, spoofing_indicator in trace]
+    return summary
@@ -0,0 +1,237 @@
+import math
+import random
+from datetime import datetime, timedelta
+from functools import reduce
+
+from mana.feeder import scapy_all
+
+meters_per_degree_latitude = 111320
+knots_to_meters_per_second = 1852 / 3600
+marsim_sentence_types = ["RMC", "GSV", "GSA", "GGA", "GLL", "VTG"]
+
+
+class SpoofingAttack:
+
+    def __init__(self, start=60, carrier_to_noise_density_offset=8):
+        self.start = start
+        self.carrier_to_noise_density_offset = carrier_to_noise_density_offset
+
+    def is_active(self, elapsed_seconds):
+        return elapsed_seconds >= self.start
+
+    def position(self, elapsed_seconds, track):
+        raise NotImplementedError()
+
+    def gps_time_offset(self, elapsed_seconds):
+        return 0.0
+
+
+class SpoofingRamp(SpoofingAttack):
+
+    def __init__(self, start=60, shift_speed=1.0, shift_angle=0.0, carrier_to_noise_density_offset=8):
+        # Simulator attacker: all receivers report the same position, which moves away from the actual position of
+        # the vessel with shift_speed m/s in the direction of shift_angle degrees
+        super().__init__(start, carrier_to_noise_density_offset)
+        self.shift_speed = shift_speed
+        self.shift_angle = shift_angle
+
+    def position(self, elapsed_seconds, track):
+        north, east, _ = track[elapsed_seconds]
+        distance = self.shift_speed * (elapsed_seconds - self.start)
+        angle = math.radians(self.shift_angle)
+        return north + distance * math.cos(angle), east + distance * math.sin(angle)
+
+
+class ReplayAttack(SpoofingAttack):
+
+    def __init__(self, start=60, age=30, distance=50, carrier_to_noise_density_offset=8):
+        # Replay attacker: replays the signals of a similar ship age seconds ago, shifted orthogonally to the route
+        super().__init__(start, carrier_to_noise_density_offset)
+        self.age = age
+        self.distance = distance
+
+    def position(self, elapsed_seconds, track):
+        north, east, course = track[max(0, elapsed_seconds - self.age)]
+        return shifted_position(north, east, course + 90, self.distance)
+
+    def gps_time_offset(self, elapsed_seconds):
+        return -self.age
+
+
+class MeaconingAttack(SpoofingAttack):
+
+    def __init__(self, start=60, delay=0.5, distance=100, carrier_to_noise_density_offset=8):
+        # Meaconing attacker: relays the authentic signals with a delay from a fixed position that is distance meters
+        # away from the ship when the attack starts
+        super().__init__(start, carrier_to_noise_density_offset)
+        self.delay = delay
+        self.distance = distance
+
+    def position(self, elapsed_seconds, track):
+        north, east, course = track[min(self.start, elapsed_seconds)]
+        return shifted_position(north, east, course + 90, self.distance)
+
+    def gps_time_offset(self, elapsed_seconds):
+        return -self.delay
+
+
+class NmeaStreamSimulator:
+
+    def __init__(self, receiver_count=2, receiver_distance=4, duration=120, start_time=datetime(2018, 9, 25, 12),
+                 start_latitude=54.5, start_longitude=10.5, start_course=0.0, speed=20, rate_of_turn=0.5,
+                 clock_drift=10.55e-6, clock_drift_noise=0.0001, position_noise=1.0, height_above_sea_level=10.0,
+                 min_elevation=5, spoofing_attack=None, sentence_types=None, seed=0, device_ids=None):
+        self.receiver_count = len(device_ids) if device_ids is not None else receiver_count
+        self.receiver_distance = receiver_distance
+        self.duration = duration
+        self.start_time = start_time
+        self.start_latitude = start_latitude
+        self.start_longitude = start_longitude
+        self.start_course = start_course
+        self.speed = speed
+        self.rate_of_turn = rate_of_turn
+        self.clock_drift = clock_drift
+        self.clock_drift_noise = clock_drift_noise
+        self.position_noise = position_noise
+        self.height_above_sea_level = height_above_sea_level
+        self.min_elevation = min_elevation
+        self.spoofing_attack = spoofing_attack
+        self.sentence_types = sentence_types or marsim_sentence_types
+        self.seed = seed
+        self.receiver_device_ids = device_ids
+
+    def device_ids(self):
+        if self.receiver_device_ids is not None:
+            return list(self.receiver_device_ids)
+        return ["192.168.0.{}".format(10 + i) for i in range(self.receiver_count)]
+
+    def sentences(self):
+        return [sentence for second_sentences in self.seconds() for sentence in second_sentences]
+
+    def seconds(self):
+        # Yields the sentences of every simulated second ordered by their update time, so long simulations of many
+        # receivers can be streamed
+        from mana.method.orbit_propagator import actual_satellite_constellation_orbit_propagator
+        orbit_propagator = actual_satellite_constellation_orbit_propagator()
+        random_generator = random.Random(self.seed)
+        device_ids = self.device_ids()
+        track = []
+        north, east = 0.0, 0.0
+        for second in range(self.duration):
+            course = (self.start_course + self.rate_of_turn * second) % 360
+            track.append((north, east, course))
+            gps_time = self.start_time + timedelta(seconds=second)
+            latitude, longitude = self.latitude_longitude(north, east)
+            elevations, azimuths = orbit_propagator.observer_views(gps_time, latitude, longitude,
+                                                                   self.height_above_sea_level)
+            satellites = [(pseudo_random_noise, round(elevation), round(azimuth) % 360)
+                          for pseudo_random_noise, elevation, azimuth
+                          in zip(orbit_propagator.pseudo_random_noises, elevations.tolist(), azimuths.tolist())
+                          if elevation >= self.min_elevation][:12]
+            is_spoofed = self.spoofing_attack is not None and self.spoofing_attack.is_active(second)
+            carrier_to_noise_density_offset = 0
+            reported_gps_time = gps_time
+            if is_spoofed:
+                spoofed_north, spoofed_east = self.spoofing_attack.position(second, track)
+                spoofed_position = (spoofed_north + random_generator.gauss(0, self.position_noise),
+                                    spoofed_east + random_generator.gauss(0, self.position_noise))
+                carrier_to_noise_density_offset = self.spoofing_attack.carrier_to_noise_density_offset
+                reported_gps_time = gps_time + timedelta(seconds=self.spoofing_attack.gps_time_offset(second))
+            second_sentences = []
+            for i, device_id in enumerate(device_ids):
+                if is_spoofed:
+                    receiver_north, receiver_east = spoofed_position
+                else:
+                    along = (i - (self.receiver_count - 1) / 2) * self.receiver_distance
+                    receiver_north, receiver_east = shifted_position(north, east, course, along)
+                    receiver_north += random_generator.gauss(0, self.position_noise)
+                    receiver_east += random_generator.gauss(0, self.position_noise)
+                clock_offset = self.clock_drift * second + random_generator.gauss(0, self.clock_drift_noise)
+                update_time = gps_time + timedelta(seconds=clock_offset)
+                receiver_satellites = [
+                    (pseudo_random_noise, elevation, azimuth,
+                     round(random_generator.gauss(42, 2) + carrier_to_noise_density_offset))
+                    for pseudo_random_noise, elevation, azimuth in satellites]
+                receiver_latitude, receiver_longitude = self.latitude_longitude(receiver_north, receiver_east)
+                height_above_sea_level = self.height_above_sea_level + random_generator.gauss(0, self.position_noise)
+                for sentence in self.receiver_sentences(reported_gps_time, receiver_latitude, receiver_longitude,
+                                                        height_above_sea_level, course, receiver_satellites):
+                    second_sentences.append((device_id, update_time, sentence))
+            second_sentences.sort(key=lambda sentence: sentence[1])
+            yield second_sentences
+            distance = self.speed * knots_to_meters_per_second
+            north += distance * math.cos(math.radians(course))
+            east += distance * math.sin(math.radians(course))
+
+    def latitude_longitude(self, north, east):
+        latitude = self.start_latitude + north / meters_per_degree_latitude
+        longitude = self.start_longitude \
+            + east / (meters_per_degree_latitude * math.cos(math.radians(self.start_latitude)))
+        return latitude, longitude
+
+    def receiver_sentences(self, gps_time, latitude, longitude, height_above_sea_level, course, satellites):
+        time_string = "{}.{:02d}".format(gps_time.strftime("%H%M%S"), gps_time.microsecond // 10000)
+        date_string = gps_time.strftime("%d%m%y")
+        position_string = nmea_latitude_longitude(latitude, longitude)
+        bodies = {
+            "RMC": ["GPRMC,{},A,{},{:.1f},{:.1f},{},,,A".format(time_string, position_string, self.speed, course,
+                                                                date_string)],
+            "GSV": gsv_bodies(satellites),
+            "GSA": ["GPGSA,A,3,{},1.8,1.0,1.5".format(",".join(
+                [str(satellite[0]) for satellite in satellites] + [""] * (12 - len(satellites))))],
+            "GGA": ["GPGGA,{},{},1,{:02d},1.0,{:.1f},M,46.8,M,,".format(time_string, position_string, len(satellites),
+                                                                      height_above_sea_level)],
+            "GLL": ["GPGLL,{},{},A,A".format(position_string, time_string)],
+            "VTG": ["GPVTG,{:.1f},T,,M,{:.1f},N,{:.1f},K,A".format(course, self.speed, self.speed * 1.852)],
+        }
+        return [nmea_sentence(body) for sentence_type in self.sentence_types for body in bodies[sentence_type]]
+
+    def write_log(self, filename, sentences=None):
+        with open(filename, "w") as file:
+            for device_id, time, sentence in sentences or self.sentences():
+                file.write("{} {} {}\n".format(time.strftime("%Y-%m-%d %H:%M:%S.%f"), device_id, sentence))
+        return filename
+
+    def write_pcap(self, filename, sentences=None):
+        packets = []
+        bursts = {}
+        for device_id, time, sentence in sentences or self.sentences():
+            bursts.setdefault((time, device_id), []).append(sentence)
+        for (time, device_id), burst in bursts.items():
+            payload = "".join(sentence + "\r\n" for sentence in burst).encode()
+            packet = scapy_all.Ether() / scapy_all.IP(src=device_id) / scapy_all.UDP(sport=10110, dport=10110) \
+                / scapy_all.Raw(load=payload)
+            packet.time = time.timestamp()
+            packets.append(packet)
+        scapy_all.wrpcap(filename, packets)
+        return filename
+
+
+def shifted_position(north, east, angle, distance):
+    return north + distance * math.cos(math.radians(angle)), east + distance * math.sin(math.radians(angle))
+
+
+def nmea_sentence(body):
+    checksum = reduce(lambda a, b: a ^ b, body.encode(), 0)
+    return "${}*{:02X}".format(body, checksum)
+
+
+def nmea_latitude_longitude(latitude, longitude):
+    latitude_degrees, latitude_minutes = divmod(round(abs(latitude) * 60, 5), 60)
+    longitude_degrees, longitude_minutes = divmod(round(abs(longitude) * 60, 5), 60)
+    return "{:02d}{:08.5f},{},{:03d}{:08.5f},{}".format(int(latitude_degrees), latitude_minutes,
+                                                        "N" if latitude >= 0 else "S", int(longitude_degrees),
+                                                        longitude_minutes, "E" if longitude >= 0 else "W")
+
+
+def gsv_bodies(satellites):
+    message_count = max(1, math.ceil(len(satellites) / 4))
+    bodies = []
+    for message_number in range(1, message_count + 1):
+        fields = ["GPGSV", str(message_count), str(message_number), "{:02d}".format(len(satellites))]
+        for pseudo_random_noise, elevation, azimuth, carrier_to_noise_density in \
+                satellites[(message_number - 1) * 4:message_number * 4]:
+            fields.extend(["{:02d}".format(pseudo_random_noise), "{:02d}".format(elevation),
+                           "{:03d}".format(azimuth), "{:02d}".format(carrier_to_noise_density)])
+        bodies.append(",".join(fields))
+    return bodies
@@ -62,3 +62,21 @@ class StateHistory:
             if state.update_time <= reference_time:
                 return state
         return None
+
+    def surrounding_states(self, reference_time):
+        # Same result as (state_before, state_after) for a history ordered by update time, but the scan starts at the
+        # newest state and stops at the reference time instead of walking the whole history from both ends
+        states = self.state_history
+        for index, state in enumerate(states):
+            if state.update_time <= reference_time:
+                break
+        else:
+            return None, states[-1] if states else None
+        if state.update_time < reference_time:
+            return state, states[index - 1] if index > 0 else None
+        state_after = state
+        for next_state in states[index + 1:]:
+            if next_state.update_time != reference_time:
+                break
+            state_after = next_state
+        return state, state_after
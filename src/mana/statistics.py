@@ -0,0 +1,359 @@
+import bisect
+import math
+import random
+from collections import deque
+
+
+def median_of_sorted_values(sorted_values):
+    count = len(sorted_values)
+    if count == 0:
+        return None
+    middle = count // 2
+    if count % 2 == 1:
+        return sorted_values[middle]
+    return (sorted_values[middle - 1] + sorted_values[middle]) / 2
+
+
+class RollingTheilSenRegression:
+
+    def __init__(self, max_count):
+        self.max_count = max_count
+        self.points = deque()
+        self.sorted_slopes = []
+
+    def __len__(self):
+        return len(self.points)
+
+    def add(self, x, y):
+        if len(self.points) >= self.max_count:
+            self.remove_oldest()
+        for previous_x, previous_y in self.points:
+            if previous_x != x:
+                bisect.insort(self.sorted_slopes, (y - previous_y) / (x - previous_x))
+        self.points.append((x, y))
+
+    def remove_oldest(self):
+        oldest_x, oldest_y = self.points.popleft()
+        for x, y in self.points:
+            if x != oldest_x:
+                slope = (y - oldest_y) / (x - oldest_x)
+                del self.sorted_slopes[bisect.bisect_left(self.sorted_slopes, slope)]
+
+    def slope(self):
+        slope = median_of_sorted_values(self.sorted_slopes)
+        return 0 if slope is None else slope
+
+    def intercept(self):
+        slope = self.slope()
+        return median_of_sorted_values(sorted(y - slope * x for x, y in self.points))
+
+    def predict(self, x):
+        if len(self.points) == 0:
+            return None
+        slope = self.slope()
+        return self.intercept() + slope * x
+
+
+class RingBuffer:
+
+    def __init__(self, size):
+        self.size = size
+        self.values = []
+        self.index = 0
+
+    def __len__(self):
+        return len(self.values)
+
+    def __iter__(self):
+        return iter(self.values[self.index:] + self.values[:self.index])
+
+    def is_full(self):
+        return len(self.values) == self.size
+
+    def oldest(self):
+        return self.values[self.index] if self.is_full() else self.values[0]
+
+    def latest(self):
+        return self.values[self.index - 1]
+
+    def append(self, value):
+        if not self.is_full():
+            self.values.append(value)
+            return
+        self.values[self.index] = value
+        self.index = (self.index + 1) % self.size
+
+
+class RollingMean:
+
+    def __init__(self, window_size, fill_value=None):
+        self.window = RingBuffer(window_size)
+        self.total = 0
+        self.update_count = 0
+        if fill_value is not None:
+            for _ in range(window_size):
+                self.add(fill_value)
+
+    def __len__(self):
+        return len(self.window)
+
+    def add(self, value):
+        if self.window.is_full():
+            self.total -= self.window.oldest()
+        self.window.append(value)
+        self.total += value
+        self.update_count += 1
+        if self.update_count % self.window.size == 0:
+            self.total = math.fsum(self.window.values)
+
+    def mean(self):
+        if len(self.window) == 0:
+            return None
+        return self.total / len(self.window)
+
+
+class RollingVariance:
+
+    def __init__(self, window_size):
+        self.window = RingBuffer(window_size)
+        self.mean_value = 0
+        self.squared_deviations = 0
+        self.update_count = 0
+
+    def __len__(self):
+        return len(self.window)
+
+    def add(self, value):
+        if self.window.is_full():
+            oldest = self.window.oldest()
+            self.window.append(value)
+            previous_mean = self.mean_value
+            self.mean_value += (value - oldest) / self.window.size
+            self.squared_deviations += (value - oldest) * (value - self.mean_value + oldest - previous_mean)
+        else:
+            self.window.append(value)
+            delta = value - self.mean_value
+            self.mean_value += delta / len(self.window)
+            self.squared_deviations += delta * (value - self.mean_value)
+        self.update_count += 1
+        if self.update_count % self.window.size == 0:
+            self.mean_value = math.fsum(self.window.values) / len(self.window)
+            self.squared_deviations = math.fsum((v - self.mean_value) ** 2 for v in self.window.values)
+
+    def latest(self):
+        return self.window.latest()
+
+    def mean(self):
+        if len(self.window) == 0:
+            return None
+        return self.mean_value
+
+    def variance(self):
+        if len(self.window) == 0:
+            return None
+        return max(self.squared_deviations, 0) / len(self.window)
+
+    def standard_deviation(self):
+        variance = self.variance()
+        return None if variance is None else math.sqrt(variance)
+
+
+class RollingMinimumMaximum:
+
+    def __init__(self, window_size):
+        self.window_size = window_size
+        self.update_count = 0
+        self.minimum_candidates = deque()
+        self.maximum_candidates = deque()
+
+    def add(self, value):
+        self.update_count += 1
+        oldest_index = self.update_count - self.window_size
+        minimum_candidates, maximum_candidates = self.minimum_candidates, self.maximum_candidates
+        while minimum_candidates and minimum_candidates[-1][1] >= value:
+            minimum_candidates.pop()
+        minimum_candidates.append((self.update_count, value))
+        if minimum_candidates[0][0] <= oldest_index:
+            minimum_candidates.popleft()
+        while maximum_candidates and maximum_candidates[-1][1] <= value:
+            maximum_candidates.pop()
+        maximum_candidates.append((self.update_count, value))
+        if maximum_candidates[0][0] <= oldest_index:
+            maximum_candidates.popleft()
+
+    def minimum(self):
+        return self.minimum_candidates[0][1] if self.minimum_candidates else None
+
+    def maximum(self):
+        return self.maximum_candidates[0][1] if self.maximum_candidates else None
+
+
+class Ewma:
+
+    def __init__(self, weight, initial_value=None):
+        self.weight = weight
+        self.value = initial_value
+
+    def add(self, value):
+        if self.value is None:
+            self.value = value
+        else:
+            self.value = (1 - self.weight) * self.value + self.weight * value
+        return self.value
+
+
+class SmoothedZScorePeakDetector:
+
+    def __init__(self, lag, threshold, influence):
+        self.lag = lag
+        self.threshold = threshold
+        self.influence = influence
+        self.filtered_values = RollingVariance(lag)
+
+    def add(self, value):
+        filtered_values = self.filtered_values
+        if len(filtered_values) < self.lag:
+            filtered_values.add(value)
+            return 0
+        mean = filtered_values.mean()
+        if abs(value - mean) > self.threshold * filtered_values.standard_deviation():
+            signal = 1 if value > mean else -1
+            filtered_values.add(self.influence * value + (1 - self.influence) * filtered_values.latest())
+            return signal
+        filtered_values.add(value)
+        return 0
+
+
+class QuantileSketch:
+
+    def __init__(self, capacity=200, seed=0):
+        self.capacity = capacity
+        self.random = random.Random(seed)
+        self.compactors = [[]]
+        self.count = 0
+        self.size = 0
+        self.max_size = self.level_capacity(0)
+        self.minimum = None
+        self.maximum = None
+
+    def __len__(self):
+        return self.count
+
+    def level_capacity(self, level):
+        # KLL: the capacities shrink geometrically towards the lower levels, which keeps the size in O(capacity)
+        depth = len(self.compactors) - level - 1
+        return max(2, int(math.ceil(self.capacity * (2 / 3) ** depth)))
+
+    def add(self, value):
+        if self.count == 0:
+            self.minimum = self.maximum = value
+        else:
+            self.minimum = min(self.minimum, value)
+            self.maximum = max(self.maximum, value)
+        self.count += 1
+        self.compactors[0].append(value)
+        self.size += 1
+        if self.size >= self.max_size:
+            self.compress()
+
+    def merge(self, other):
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.minimum, self.maximum = other.minimum, other.maximum
+        else:
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+        self.count += other.count
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append([])
+        for compactor, other_compactor in zip(self.compactors, other.compactors):
+            compactor.extend(other_compactor)
+        self.update_size()
+        while self.size >= self.max_size:
+            self.compress()
+
+    def compress(self):
+        for level, compactor in enumerate(self.compactors):
+            if len(compactor) < self.level_capacity(level):
+                continue
+            if level + 1 == len(self.compactors):
+                self.compactors.append([])
+            compactor.sort()
+            remainder = [compactor.pop()] if len(compactor) % 2 == 1 else []
+            self.compactors[level + 1].extend(compactor[self.random.randint(0, 1)::2])
+            self.compactors[level] = remainder
+            break
+        self.update_size()
+
+    def update_size(self):
+        self.size = sum(len(compactor) for compactor in self.compactors)
+        self.max_size = sum(self.level_capacity(level) for level in range(len(self.compactors)))
+
+    def quantile(self, q):
+        if self.count == 0:
+            return None
+        if q <= 0:
+            return self.minimum
+        if q >= 1:
+            return self.maximum
+        weighted_values = sorted((value, 2 ** level) for level, compactor in enumerate(self.compactors)
+                                 for value in compactor)
+        total_weight = sum(weight for _, weight in weighted_values)
+        cumulative_weight = 0
+        for value, weight in weighted_values:
+            cumulative_weight += weight
+            if cumulative_weight >= q * total_weight:
+                return value
+        return self.maximum
+
+
+class LinearRegressionSummary:
+
+    def __init__(self):
+        self.count = 0
+        self.mean_x = 0
+        self.mean_y = 0
+        self.squared_deviations_x = 0
+        self.co_deviations = 0
+
+    def __len__(self):
+        return self.count
+
+    def add(self, x, y):
+        self.count += 1
+        delta_x = x - self.mean_x
+        self.mean_x += delta_x / self.count
+        self.mean_y += (y - self.mean_y) / self.count
+        self.squared_deviations_x += delta_x * (x - self.mean_x)
+        self.co_deviations += delta_x * (y - self.mean_y)
+
+    def merge(self, other):
+        count = self.count + other.count
+        if other.count == 0:
+            return
+        delta_x = other.mean_x - self.mean_x
+        delta_y = other.mean_y - self.mean_y
+        weight = self.count * other.count / count
+        self.mean_x += delta_x * other.count / count
+        self.mean_y += delta_y * other.count / count
+        self.squared_deviations_x += other.squared_deviations_x + delta_x * delta_x * weight
+        self.co_deviations += other.co_deviations + delta_x * delta_y * weight
+        self.count = count
+
+    def slope(self):
+        if self.squared_deviations_x <= 0:
+            return 0
+        return self.co_deviations / self.squared_deviations_x
+
+    def intercept(self):
+        return self.mean_y - self.slope() * self.mean_x
+
+
+def merge_summaries(summary, other_summary):
+    if isinstance(summary, dict):
+        for key, value in other_summary.items():
+            summary[key] = merge_summaries(summary[key], value) if key in summary else value
+        return summary
+    summary.merge(other_summary)
+    return summary
@@ -0,0 +1,21 @@
+import pytest
+
+from mana.simulation import nmea_sentence
+
+
+@pytest.fixture
+def write_recording():
+    def write(filename, heights, speeds=None, device_ids=("DEVICE1",), extra_sentences=()):
+        with open(filename, "w") as file:
+            for second, height in enumerate(heights):
+                time = "2018-08-18 16:48:{:02d}.000000".format(second)
+                sentences = [nmea_sentence(
+                    "GPGGA,1648{:02d}.00,5049.65778,N,00722.80053,E,1,11,1.32,{},M,46.8,M,,".format(second, height))]
+                if speeds is not None:
+                    sentences.append(nmea_sentence(
+                        "GPRMC,1648{:02d}.00,A,5049.65778,N,00722.80053,E,{},265.08,180818,,,A".format(
+                            second, speeds[second])))
+                for device_id in device_ids:
+                    for sentence in sentences + list(extra_sentences):
+                        file.write("{} {} {}\n".format(time, device_id, sentence))
+    return write
@@ -0,0 +1,200 @@
+import json
+import os
+import socket
+from datetime import datetime
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from threading import Thread
+
+from mana.alert import IncidentTracker, Detection, AlertDispatcher, AlertSink, FileAlertSink, \
+    UnixSocketAlertSink, HttpAlertSink, TokenBucket, Alert, coalesce_alerts
+from mana.state import NmeaState
+
+
+class ClockDummy:
+
+    def __init__(self):
+        self.value = 0
+
+    def __call__(self):
+        return self.value
+
+
+class AlertSinkDummy(AlertSink):
+
+    def __init__(self):
+        self.batches = []
+        self.closed = False
+
+    def send(self, alerts):
+        self.batches.append(alerts)
+
+    def close(self):
+        self.closed = True
+
+
+class MethodDummy:
+    pass
+
+
+def create_detection(received_time, device_id="DEVICE1", spoofing_indicator=1):
+    return Detection(device_id=device_id, method_name="MethodDummy", spoofing_indicator=spoofing_indicator,
+                     update_time=datetime(2018, 1, 1, 0, 0, int(received_time)), received_time=received_time)
+
+
+def test_incident_tracker_hysteresis():
+    tracker = IncidentTracker(min_detections=3, incident_timeout=5, update_interval=10)
+    kinds = []
+    for received_time in range(15):
+        kinds.extend(alert.kind for alert in tracker.add_detection(create_detection(received_time)))
+    assert kinds == ["opened", "updated"]
+    assert tracker.expire_incidents(19) == []
+    alerts = tracker.expire_incidents(20)
+    assert [alert.kind for alert in alerts] == ["closed"]
+    assert alerts[0].detection_count == 15
+    assert tracker.incidents == {}
+
+
+def test_incident_tracker_does_not_open_below_min_detections():
+    tracker = IncidentTracker(min_detections=3, incident_timeout=5)
+    alerts = tracker.add_detection(create_detection(0)) + tracker.add_detection(create_detection(10)) + \
+        tracker.add_detection(create_detection(20))
+    assert alerts == []
+    assert tracker.expire_incidents(30) == []
+
+
+def test_incident_tracker_separates_devices():
+    tracker = IncidentTracker()
+    alerts = tracker.add_detection(create_detection(0, device_id="DEVICE1")) + \
+        tracker.add_detection(create_detection(0, device_id="DEVICE2"))
+    assert [alert.device_id for alert in alerts] == ["DEVICE1", "DEVICE2"]
+    assert len(tracker.close_all_incidents()) == 2
+
+
+def test_token_bucket():
+    clock = ClockDummy()
+    token_bucket = TokenBucket(rate=2, capacity=1, clock=clock)
+    assert token_bucket.try_acquire() is True
+    assert token_bucket.try_acquire() is False
+    clock.value = 0.5
+    assert token_bucket.try_acquire() is True
+
+
+def test_coalesce_alerts():
+    alerts = [Alert(kind="opened", device_id="A"), Alert(kind="updated", device_id="A", detection_count=1),
+              Alert(kind="updated", device_id="A", detection_count=2), Alert(kind="closed", device_id="A")]
+    coalesced_alerts = coalesce_alerts(alerts)
+    assert [alert.kind for alert in coalesced_alerts] == ["opened", "updated", "closed"]
+    assert coalesced_alerts[1].detection_count == 2
+
+
+def test_alert_dispatcher_batches_incidents():
+    sink = AlertSinkDummy()
+    dispatcher = AlertDispatcher([sink], batch_size=10, max_batch_delay=60, poll_interval=0.01)
+    dispatcher.start()
+    state = NmeaState(update_time=datetime(2018, 1, 1), last_nmea_sentence="$TEST*16")
+    for _ in range(100):
+        dispatcher.on_spoofing_attack(device_id="DEVICE1", spoofing_indicator=1, method=MethodDummy(), state=state)
+    dispatcher.stop()
+    alerts = [alert for batch in sink.batches for alert in batch]
+    assert [alert.kind for alert in alerts] == ["opened", "closed"]
+    assert alerts[1].detection_count == 100
+    assert alerts[1].method_name == "MethodDummy"
+    assert sink.closed is True
+
+
+def test_alert_dispatcher_drops_detections_when_queue_is_full():
+    dispatcher = AlertDispatcher([AlertSinkDummy()], max_queue_size=2)
+    state = NmeaState(update_time=datetime(2018, 1, 1))
+    for _ in range(5):
+        dispatcher.on_spoofing_attack(device_id="DEVICE1", spoofing_indicator=1, method=MethodDummy(), state=state)
+    assert dispatcher.dropped_detection_count == 3
+
+
+class FailingAlertSink(AlertSink):
+
+    def send(self, alerts):
+        raise OSError()
+
+
+def test_alert_dispatcher_survives_failing_sink():
+    sink = AlertSinkDummy()
+    dispatcher = AlertDispatcher([FailingAlertSink(), sink], poll_interval=0.01)
+    dispatcher.start()
+    state = NmeaState(update_time=datetime(2018, 1, 1))
+    dispatcher.on_spoofing_attack(device_id="DEVICE1", spoofing_indicator=1, method=MethodDummy(), state=state)
+    dispatcher.stop()
+    assert dispatcher.failed_batch_count > 0
+    assert len(sink.batches) > 0
+    assert dispatcher.sent_batch_count == len(sink.batches)
+    assert dispatcher.sent_alert_count == sum(len(batch) for batch in sink.batches)
+    assert dispatcher.undelivered_batch_count == 0
+
+
+def test_alert_dispatcher_counts_undelivered_alerts():
+    dispatcher = AlertDispatcher([FailingAlertSink(), FailingAlertSink()], poll_interval=0.01)
+    dispatcher.start()
+    state = NmeaState(update_time=datetime(2018, 1, 1))
+    dispatcher.on_spoofing_attack(device_id="DEVICE1", spoofing_indicator=1, method=MethodDummy(), state=state)
+    dispatcher.stop()
+    assert dispatcher.sent_alert_count == dispatcher.sent_batch_count == 0
+    assert dispatcher.undelivered_alert_count == 2
+    assert dispatcher.failed_batch_count == 2 * dispatcher.undelivered_batch_count > 0
+
+
+def test_file_alert_sink(tmp_path):
+    filename = os.path.join(tmp_path, "alerts.log")
+    sink = FileAlertSink(filename)
+    sink.send([Alert(kind="opened", device_id="DEVICE1", first_update_time=datetime(2018, 1, 1))])
+    sink.close()
+    with open(filename) as file:
+        entries = [json.loads(line) for line in file]
+    assert entries[0]["kind"] == "opened"
+    assert entries[0]["first_update_time"] == "2018-01-01T00:00:00"
+
+
+def test_unix_socket_alert_sink(tmp_path):
+    path = os.path.join(tmp_path, "alerts.sock")
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(1)
+    received = []
+
+    def serve():
+        connection, _ = server.accept()
+        with connection:
+            data = b""
+            while not data.endswith(b"\n"):
+                data += connection.recv(4096)
+            received.append(data)
+
+    thread = Thread(target=serve)
+    thread.start()
+    sink = UnixSocketAlertSink(path)
+    sink.send([Alert(kind="opened", device_id="DEVICE1")])
+    thread.join(timeout=5)
+    sink.close()
+    server.close()
+    assert json.loads(received[0])["device_id"] == "DEVICE1"
+
+
+def test_http_alert_sink():
+    received = []
+
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers["Content-Length"])
+            received.append(json.loads(self.rfile.read(length)))
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), RequestHandler)
+    thread = Thread(target=server.handle_request)
+    thread.start()
+    sink = HttpAlertSink("http://127.0.0.1:{}/alerts".format(server.server_port))
+    sink.send([Alert(kind="closed", device_id="DEVICE1")])
+    thread.join(timeout=5)
+    server.server_close()
+    assert received[0]["alerts"][0]["kind"] == "closed"
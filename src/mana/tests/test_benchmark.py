@@ -0,0 +1,42 @@
+import os
+
+from mana.benchmark import run_benchmarks, compare_benchmarks, save_benchmark, main
+from mana.method import PhysicalSpeedLimitMethod, PhysicalHeightLimitMethod
+from mana.simulation import NmeaStreamSimulator
+
+
+def test_run_benchmarks_measures_every_stage():
+    benchmark = run_benchmarks(NmeaStreamSimulator(duration=5),
+                               method_classes=[PhysicalSpeedLimitMethod, PhysicalHeightLimitMethod], repeat=1)
+    assert set(benchmark["results"]) == {"feeder.SentenceFeeder", "feeder.LogFeeder", "feeder.PcapFeeder", "parser",
+                                         "history", "method.PhysicalSpeedLimitMethod",
+                                         "method.PhysicalHeightLimitMethod", "end_to_end"}
+    sentence_count = benchmark["simulation"]["sentences"]
+    assert benchmark["results"]["feeder.LogFeeder"]["count"] == sentence_count
+    assert benchmark["results"]["parser"]["count"] == sentence_count
+    assert benchmark["results"]["end_to_end"]["per_second"] > 0
+    assert 0 < benchmark["results"]["method.PhysicalHeightLimitMethod"]["count"] < sentence_count
+    for name in ["parser", "feeder.PcapFeeder", "end_to_end"]:
+        assert benchmark["results"][name]["p50_us"] <= benchmark["results"][name]["p99_us"]
+    assert benchmark["results"]["end_to_end"]["count"] == sentence_count
+
+
+def benchmark_with_throughputs(throughputs):
+    return {"simulation": {}, "results": {name: {"per_second": per_second} for name, per_second in throughputs.items()}}
+
+
+def test_compare_benchmarks_reports_regressions():
+    baseline = benchmark_with_throughputs({"parser": 1000, "history": 100, "end_to_end": 50})
+    benchmark = benchmark_with_throughputs({"parser": 850, "history": 95, "new": 10})
+    comparisons = compare_benchmarks(baseline, benchmark, tolerance=0.1)
+    assert [(name, is_regression) for name, *_, is_regression in comparisons] == [("parser", True),
+                                                                                  ("history", False)]
+
+
+def test_compare_command_fails_on_regression(tmp_path):
+    baseline_file = os.path.join(tmp_path, "baseline.json")
+    benchmark_file = os.path.join(tmp_path, "benchmark.json")
+    save_benchmark(baseline_file, benchmark_with_throughputs({"parser": 1000}))
+    save_benchmark(benchmark_file, benchmark_with_throughputs({"parser": 980}))
+    assert main(["compare", baseline_file, benchmark_file]) == 0
+    assert main(["compare", baseline_file, benchmark_file, "--tolerance", "0.01"]) == 1
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from mana.calibration import calibrate, calibration_mode
+from mana.feeder import LogFeeder
+from mana.method import PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod, load_methods_json, save_methods_json, \
+    MultipleReceiversMethod
+
+
+@pytest.fixture
+def recordings(tmp_path, write_recording):
+    filenames = [os.path.join(tmp_path, "recording{}.log".format(i)) for i in range(2)]
+    write_recording(filenames[0], heights=[0, 1, 2, 3, 4, 5], speeds=[0, 10, 12, 11, 9, 8])
+    write_recording(filenames[1], heights=[0, 6, 7, 8, 9, 10], speeds=[0, 20, 9, 14, 1, 2])
+    return filenames
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_calibrate(recordings, processes):
+    method_classes = [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod]
+    method_options = {"min_height": 0, "max_height": 0, "max_speed": 0}
+    calibrated_method_options = calibrate(recordings, ["DEVICE1"], method_classes, method_options,
+                                          feeder_class=LogFeeder, processes=processes)
+    assert calibrated_method_options == {"min_height": 1, "max_height": 10, "max_speed": 20}
+    assert not PhysicalHeightLimitMethod.calibration
+
+
+def test_calibrate_percentile(recordings):
+    method_options = {"min_height": 0, "max_height": 0, "calibration_percentile": 80}
+    calibrated_method_options = calibrate(recordings, ["DEVICE1"], [PhysicalHeightLimitMethod], method_options,
+                                          feeder_class=LogFeeder, processes=1)
+    assert calibrated_method_options["min_height"] == 2
+    assert calibrated_method_options["max_height"] == 8
+
+
+def test_calibration_mode():
+    with calibration_mode([PhysicalSpeedLimitMethod]):
+        assert PhysicalSpeedLimitMethod.calibration
+        assert not PhysicalHeightLimitMethod.calibration
+    assert not PhysicalSpeedLimitMethod.calibration
+
+
+def test_save_and_load_methods_json(tmp_path):
+    filename = os.path.join(tmp_path, "methods.json")
+    method_options = {"distances": {("DEVICE1", "DEVICE2"): 4}, "max_speed": 30}
+    save_methods_json(filename, ["DEVICE1", "DEVICE2"], [MultipleReceiversMethod, PhysicalSpeedLimitMethod],
+                      method_options)
+    device_ids, method_classes, loaded_method_options = load_methods_json(filename)
+    assert device_ids == ["DEVICE1", "DEVICE2"]
+    assert method_classes == [MultipleReceiversMethod, PhysicalSpeedLimitMethod]
+    assert loaded_method_options == method_options
@@ -0,0 +1,102 @@
+import os
+from datetime import datetime
+from unittest import mock
+
+import pytest
+
+from mana.evaluation import RecordingDetectionHandler, precision_recall_curve, precision_recall_curves, \
+    record_dataset, RecordedSpoofingIndicators, detect_dataset
+from mana.feeder import LogFeeder
+from mana.method import PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod
+from mana.result_cache import ResultCache
+
+
+def test_recording_detection_handler():
+    handler = RecordingDetectionHandler(["DEVICE1"], [PhysicalHeightLimitMethod],
+                                        {"min_height": 0, "max_height": 10}, record_traces=True)
+    method = handler.methods[0]
+    for second, spoofing_indicator in enumerate([0.2, 0.7, 0.1]):
+        state = type("DummyState", (), {"update_time": datetime(2018, 1, 1, 0, 0, second)})
+        handler.handle_spoofing_indicator("DEVICE1", spoofing_indicator, method, state)
+    assert handler.max_spoofing_indicators == {"PhysicalHeightLimitMethod": 0.7}
+    assert [trace[2] for trace in handler.spoofing_indicator_traces["PhysicalHeightLimitMethod"]] == [0.2, 0.7, 0.1]
+
+
+def test_precision_recall_curve():
+    curve = precision_recall_curve([0.9, 0.4, 0.6, 0.1, float("-inf")], [True, True, False, False, True])
+    assert curve.thresholds.tolist() == [float("-inf"), 0.1, 0.4, 0.6, 0.9]
+    assert curve.true_positives.tolist() == [2, 2, 1, 1, 0]
+    assert curve.false_positives.tolist() == [2, 1, 1, 0, 0]
+    assert curve.false_negatives.tolist() == [1, 1, 2, 2, 3]
+    assert curve.at_threshold(0.1) == pytest.approx((2 / 3, 2 / 3, 2 / 3))
+    threshold, precision, recall, f1 = curve.best_threshold()
+    assert threshold == 0.1
+    assert f1 == pytest.approx(2 / 3)
+    assert curve.at_threshold(0.5) == curve.at_threshold(0.4)
+
+
+def test_precision_recall_curves_of_groups():
+    recorded_spoofing_indicators = [
+        RecordedSpoofingIndicators("a", {"A": 0.8, "B": 0.3}),
+        RecordedSpoofingIndicators("b", {"A": 0.2, "B": 0.9}),
+        RecordedSpoofingIndicators("c", {"A": 0.1, "B": 0.1}),
+    ]
+    curves = precision_recall_curves(recorded_spoofing_indicators, [True, True, False],
+                                     groups={"A or B": (max, ["A", "B"]), "A and B": (min, ["A", "B"])})
+    assert set(curves) == {"A", "B", "A or B", "A and B"}
+    assert curves["A or B"].best_threshold() == (0.1, 1, 1, 1)
+    assert curves["A and B"].thresholds.tolist() == [float("-inf"), 0.1, 0.2, 0.3]
+    assert curves["A"].best_threshold()[3] == pytest.approx(1)
+
+
+def test_record_dataset(tmp_path, write_recording):
+    recordings = [os.path.join(tmp_path, "recording{}.log".format(i)) for i in range(2)]
+    write_recording(recordings[0], heights=[0, 1, 2, 3], speeds=[0, 1, 1, 1])
+    write_recording(recordings[1], heights=[0, 1, 50, 3], speeds=[0, 1, 30, 1])
+    recorded_spoofing_indicators = record_dataset(
+        recordings, ["DEVICE1"], [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod],
+        {"min_height": 0, "max_height": 10, "max_speed": 10}, feeder_class=LogFeeder, record_traces=True,
+        processes=1)
+    assert [recorded.recording for recorded in recorded_spoofing_indicators] == recordings
+    assert recorded_spoofing_indicators[0].max_spoofing_indicators["PhysicalHeightLimitMethod"] <= 0
+    assert recorded_spoofing_indicators[1].max_spoofing_indicators["PhysicalHeightLimitMethod"] > 0
+    assert recorded_spoofing_indicators[1].max_spoofing_indicators["PhysicalSpeedLimitMethod"] > 0
+    assert len(recorded_spoofing_indicators[1].spoofing_indicator_traces["PhysicalSpeedLimitMethod"]) > 0
+    curves = precision_recall_curves(recorded_spoofing_indicators, [False, True])
+    assert curves["PhysicalSpeedLimitMethod"].best_threshold()[3] == 1
+
+
+def test_detect_dataset_stops_at_first_detection(tmp_path, write_recording):
+    recordings = [os.path.join(tmp_path, "recording{}.log".format(i)) for i in range(2)]
+    write_recording(recordings[0], heights=[0, 1, 2, 3], speeds=[0, 1, 1, 1])
+    write_recording(recordings[1], heights=[0, 50, 60, 70], speeds=[0, 1, 1, 1])
+    method_options = {"min_height": 0, "max_height": 10}
+    with mock.patch.object(PhysicalHeightLimitMethod, "spoofing_indicator",
+                           side_effect=PhysicalHeightLimitMethod.spoofing_indicator, autospec=True) as method_mock:
+        is_spoofed = detect_dataset(recordings, ["DEVICE1"], [PhysicalHeightLimitMethod], method_options,
+                                    detection_threshold=0.1, feeder_class=LogFeeder, processes=1)
+    assert is_spoofed == [False, True]
+    assert method_mock.call_count == 3 + 1
+
+
+def test_record_dataset_with_result_cache(tmp_path, write_recording):
+    recordings = [os.path.join(tmp_path, "recording{}.log".format(i)) for i in range(2)]
+    write_recording(recordings[0], heights=[0, 1, 2, 3], speeds=[0, 1, 1, 1])
+    write_recording(recordings[1], heights=[0, 1, 50, 3], speeds=[0, 1, 30, 1])
+    result_cache = ResultCache(os.path.join(tmp_path, "cache"))
+    method_classes = [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod]
+    method_options = {"min_height": 0, "max_height": 10, "max_speed": 10}
+    expected = record_dataset(recordings, ["DEVICE1"], method_classes, method_options, feeder_class=LogFeeder,
+                              record_traces=True, processes=1, result_cache=result_cache)
+    assert result_cache.statistics()["misses"] == 4
+    with mock.patch.object(PhysicalHeightLimitMethod, "spoofing_indicator") as height_mock:
+        recorded = record_dataset(recordings, ["DEVICE1"], method_classes, dict(method_options, max_speed=20),
+                                  feeder_class=LogFeeder, record_traces=True, processes=1, result_cache=result_cache)
+    height_mock.assert_not_called()
+    assert result_cache.statistics()["hits"] == 2
+    assert result_cache.statistics()["misses"] == 6
+    for expected_recorded, actual_recorded in zip(expected, recorded):
+        assert expected_recorded.max_spoofing_indicators["PhysicalHeightLimitMethod"] == \
+            actual_recorded.max_spoofing_indicators["PhysicalHeightLimitMethod"]
+        assert expected_recorded.spoofing_indicator_traces["PhysicalHeightLimitMethod"] == \
+            actual_recorded.spoofing_indicator_traces["PhysicalHeightLimitMethod"]
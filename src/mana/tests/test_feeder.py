@@ -1,7 +1,9 @@
-from datetime import datetime
+import socket
+from datetime import datetime, timedelta
 from unittest import mock
 
-from mana.feeder import LogFeeder, SerialFeeder, SerialThread
+from mana.feeder import LogFeeder, SerialFeeder, SerialThread, PcapFeeder, StopFeeding, ReplayClock, UdpFeeder, \
+    NetworkFeeder
 
 
 class LogFeederTestable(LogFeeder):
@@ -17,6 +19,105 @@ def test_log_feeder_run(handler_mock):
     handler_mock.handle.assert_called_with(time=datetime(2018, 1, 1, 12, 0), device_id="PORT", sentence="TEST")
 
 
+def test_log_feeder_stops_feeding(tmp_path):
+    log_file = tmp_path / "test.log"
+    log_file.write_text("".join("2018-01-01 12:00:0{}.0 PORT TEST{}\n".format(i, i) for i in range(5)))
+    handler_mock = mock.MagicMock()
+    handler_mock.handle.side_effect = [None, StopFeeding(), None]
+    feeder = LogFeeder(handler=handler_mock, log_file=str(log_file))
+    feeder.run()
+    assert feeder.stopped
+    assert handler_mock.handle.call_count == 2
+
+
+class FakeTime:
+
+    def __init__(self):
+        self.time = 100.0
+        self.sleeps = []
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.time += seconds
+
+
+def replay_log(tmp_path, replay_clock, handling_seconds=0.0, fake_time=None):
+    log_file = tmp_path / "test.log"
+    log_file.write_text("".join("2018-01-01 12:00:{:04.1f} PORT TEST{}\n".format(second, i)
+                                for i, second in enumerate([0, 0.5, 2, 2, 3])))
+    handler_mock = mock.MagicMock()
+    if fake_time is not None:
+        handler_mock.handle.side_effect = lambda **_: fake_time.sleep(handling_seconds)
+    LogFeeder(handler=handler_mock, log_file=str(log_file), replay_clock=replay_clock).run()
+    assert handler_mock.handle.call_count == 5
+
+
+def test_replay_clock_paces_in_real_time_and_accelerated(tmp_path):
+    for speed, expected_sleeps in [(1, [0.5, 1.5, 1]), (2, [0.25, 0.75, 0.5])]:
+        fake_time = FakeTime()
+        replay_clock = ReplayClock(speed=speed, now=fake_time.now, sleep=fake_time.sleep)
+        replay_log(tmp_path, replay_clock)
+        assert fake_time.sleeps == expected_sleeps
+        assert replay_clock.lag_summary()["max"] == 0
+
+
+def test_replay_clock_replays_as_fast_as_possible(tmp_path):
+    fake_time = FakeTime()
+    replay_clock = ReplayClock(now=fake_time.now, sleep=fake_time.sleep)
+    replay_log(tmp_path, replay_clock)
+    assert fake_time.sleeps == []
+    assert replay_clock.lag_summary()["count"] == 0
+
+
+def test_replay_clock_reports_lag_behind_schedule(tmp_path):
+    fake_time = FakeTime()
+    replay_clock = ReplayClock(speed=1, now=fake_time.now, sleep=fake_time.sleep)
+    replay_log(tmp_path, replay_clock, handling_seconds=0.75, fake_time=fake_time)
+    lag_summary = replay_clock.lag_summary()
+    assert lag_summary["count"] == 5
+    assert lag_summary["late"] == 3
+    assert lag_summary["max"] == 0.75
+
+
+def test_replay_clock_lag_quantiles_beyond_metrics_buckets():
+    fake_time = FakeTime()
+    replay_clock = ReplayClock(speed=1, now=fake_time.now, sleep=fake_time.sleep)
+    start_time = datetime(2018, 1, 1, 12)
+    for second, lag in enumerate([0, 0, 0.75, 30, 30, 30]):
+        fake_time.time = 100.0 + second + lag
+        replay_clock.wait(start_time + timedelta(seconds=second))
+    lag_summary = replay_clock.lag_summary()
+    assert lag_summary["p50"] == 0.75
+    assert lag_summary["p95"] == lag_summary["p99"] == lag_summary["max"] == 30
+
+
+def test_replay_clock_injects_deterministic_jitter(tmp_path):
+    sleeps = []
+    for _ in range(2):
+        fake_time = FakeTime()
+        replay_log(tmp_path, ReplayClock(speed=1, jitter=0.2, seed=3, now=fake_time.now, sleep=fake_time.sleep))
+        sleeps.append(fake_time.sleeps)
+    assert sleeps[0] == sleeps[1]
+    assert sleeps[0] != [0.5, 1.5, 1]
+
+
+def test_pcap_feeder_stops_feeding(tmp_path):
+    from scapy.all import Ether, IP, UDP, Raw, wrpcap
+    pcap_file = str(tmp_path / "test.pcap")
+    packets = [Ether() / IP(src="10.0.0.1") / UDP() / Raw(load="TEST{}\r\nTEST{}\r\n".format(i, i).encode())
+               for i in range(5)]
+    wrpcap(pcap_file, packets)
+    handler_mock = mock.MagicMock()
+    handler_mock.handle.side_effect = [None, None, StopFeeding(), None]
+    feeder = PcapFeeder(handler=handler_mock, pcap_file=pcap_file)
+    feeder.run()
+    assert feeder.stopped
+    assert handler_mock.handle.call_count == 3
+
+
 @mock.patch("mana.handler.Handler")
 @mock.patch("mana.feeder.SerialFeeder.create_serial_thread")
 def test_serial_feeder_run(create_serial_thread_mock, handler_mock):
@@ -51,3 +152,54 @@ def test_serial_thread_run(handler_mock):
     serial_thread = SerialThreadTestable(handler_mock, "PORT")
     serial_thread.run()
     handler_mock.handle.assert_called_with(time=datetime(2018, 1, 1, 12, 0), device_id="PORT", sentence="TEST")
+    handler_mock.flush.assert_called_once_with()
+
+
+def test_udp_feeder_idles_and_flushes_on_stop():
+    handler_mock = mock.MagicMock()
+    feeder = UdpFeeder(handler=handler_mock)
+    udp_socket = mock.MagicMock()
+
+    def receive(_):
+        if handler_mock.idle.call_count == 2:
+            feeder.stop()
+        raise socket.timeout()
+
+    udp_socket.recvfrom.side_effect = receive
+    with mock.patch.object(feeder, "open_socket", return_value=udp_socket):
+        feeder.run()
+    assert handler_mock.idle.call_count == 3
+    handler_mock.flush.assert_called_once_with()
+    udp_socket.close.assert_called_once_with()
+
+
+def test_udp_feeder_does_not_flush_when_handler_stops_feeding():
+    handler_mock = mock.MagicMock()
+    handler_mock.handle.side_effect = StopFeeding()
+    feeder = UdpFeeder(handler=handler_mock)
+    udp_socket = mock.MagicMock()
+    udp_socket.recvfrom.return_value = (b"TEST\r\n", ("127.0.0.1", 10110))
+    with mock.patch.object(feeder, "open_socket", return_value=udp_socket):
+        feeder.run()
+    assert feeder.stopped
+    handler_mock.flush.assert_not_called()
+
+
+@mock.patch("mana.feeder.scapy_all")
+def test_network_feeder_idles_between_sniffs_and_flushes_on_stop(scapy_all_mock):
+    handler_mock = mock.MagicMock()
+    feeder = NetworkFeeder(handler=handler_mock, interface="eth0")
+
+    def sniff(**_kwargs):
+        if handler_mock.idle.call_count == 2:
+            feeder.stop()
+
+    scapy_all_mock.sniff.side_effect = sniff
+    feeder.run()
+    sniff_socket = scapy_all_mock.conf.L2listen.return_value
+    scapy_all_mock.conf.L2listen.assert_called_once_with(iface="eth0")
+    assert all(c.kwargs["opened_socket"] is sniff_socket for c in scapy_all_mock.sniff.call_args_list)
+    assert scapy_all_mock.sniff.call_count == 3
+    assert handler_mock.idle.call_count == 2
+    handler_mock.flush.assert_called_once_with()
+    sniff_socket.close.assert_called_once_with()
@@ -1,8 +1,15 @@
-from datetime import datetime
+import os
+from datetime import datetime, timedelta
 from unittest import mock
 
-from mana.handler import DetectionHandler, Device
-from mana.method import Method
+import pytest
+
+from mana.feeder import LogFeeder, SentenceFeeder, stop_feeding
+from mana.handler import DetectionHandler, Device, DetectionConfiguration, MultiConfigurationDetectionHandler, \
+    ReorderingHandler, feeder_time
+from mana.method import Method, PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod
+from mana.parallel import read_sentences
+from mana.simulation import nmea_sentence
 
 
 class MethodDummy(Method):
@@ -45,3 +52,192 @@ def test_detection_handler_handle(parse_mock):
     state_history_mock.add_state.assert_called_once()
     on_spoofing_attack_mock.assert_called_with(device_id=device_id, spoofing_indicator=1, method=mock.ANY,
                                                state=mock.ANY)
+
+
+def test_detection_handler_redirected_spoofing_indicators(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 5, 12, 3, 20, 4], speeds=[0, 4, 8, 12, 2, 1],
+                    device_ids=["DEVICE1", "DEVICE2"])
+    on_spoofing_attack_mock = mock.MagicMock()
+    handler = DetectionHandler(["DEVICE1"], [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod],
+                               {"min_height": 0, "max_height": 10, "max_speed": 5}, 0, on_spoofing_attack_mock)
+    methods = handler.methods
+    on_spoofing_indicator_mock = mock.MagicMock(side_effect=[None, RuntimeError()])
+    with pytest.raises(RuntimeError):
+        with handler.redirected_spoofing_indicators(methods[:1], on_spoofing_indicator_mock):
+            LogFeeder(handler, recording).run()
+    assert [c.args[2] for c in on_spoofing_indicator_mock.call_args_list] == [methods[0], methods[0]]
+    assert handler.methods == methods and handler.on_spoofing_indicator is None
+    on_spoofing_attack_mock.assert_not_called()
+
+
+def test_detection_handler_hands_over_recorded_detections(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 5, 12, 3, 20, 4], speeds=[0, 4, 8, 12, 2, 1])
+    sentences = read_sentences(recording, LogFeeder)
+    detections_by_run = []
+    for is_recorded in [False, True]:
+        on_spoofing_attack_mock = mock.MagicMock()
+        handler = DetectionHandler(["DEVICE1"], [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod],
+                                   {"min_height": 0, "max_height": 10, "max_speed": 5}, 0, on_spoofing_attack_mock)
+        feeder = SentenceFeeder(handler, sentences)
+        if is_recorded:
+            with handler.recorded_detections(handler.methods, lambda: feeder.index,
+                                             min_spoofing_indicator=handler.min_reported_spoofing_indicator()) \
+                    as detections:
+                feeder.run()
+            on_spoofing_attack_mock.assert_not_called()
+            # Detections without a state load it by their sentence index
+            index, position, device_id, spoofing_indicator, state = detections[0]
+            detections[0] = (index, position, device_id, spoofing_indicator, None)
+            load_state_mock = mock.MagicMock(return_value=state)
+            handler.hand_over_detections(detections[::-1], load_state_mock)
+            load_state_mock.assert_called_once_with(index)
+        else:
+            feeder.run()
+        detections_by_run.append([(type(c.kwargs["method"]), c.kwargs["spoofing_indicator"], c.kwargs["state"])
+                                  for c in on_spoofing_attack_mock.call_args_list])
+    assert len(detections_by_run[0]) > 2
+    assert [detection[:2] for detection in detections_by_run[1]] == [detection[:2] for detection in
+                                                                     detections_by_run[0]]
+
+
+def detection_summary(configuration, device_id, spoofing_indicator, method, state):
+    return configuration.name, device_id, spoofing_indicator, type(method).__name__, state
+
+
+def test_multi_configuration_detection_handler(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 5, 12, 3, 20, 4], speeds=[0, 4, 8, 12, 2, 1],
+                    device_ids=["DEVICE1", "DEVICE2"])
+    configurations = [
+        DetectionConfiguration("height", ["DEVICE1"], [PhysicalHeightLimitMethod],
+                               {"min_height": 0, "max_height": 10}, 0),
+        DetectionConfiguration("both", ["DEVICE1", "DEVICE2"], [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod],
+                               {"min_height": 0, "max_height": 15, "max_speed": 10}, 0.1),
+        DetectionConfiguration("speed", ["DEVICE2"], [PhysicalSpeedLimitMethod], {"max_speed": 5}, 0),
+    ]
+    expected_detections = []
+    for configuration in configurations:
+        on_spoofing_attack_mock = mock.MagicMock()
+        handler = DetectionHandler(configuration.device_ids, configuration.method_classes,
+                                   configuration.method_options, configuration.detection_threshold,
+                                   on_spoofing_attack_mock)
+        LogFeeder(handler, recording).run()
+        expected_detections.extend(detection_summary(configuration=configuration, **c.kwargs)
+                                   for c in on_spoofing_attack_mock.call_args_list)
+    on_spoofing_attack_mock = mock.MagicMock()
+    handler = MultiConfigurationDetectionHandler(configurations, on_spoofing_attack=on_spoofing_attack_mock)
+    LogFeeder(handler, recording).run()
+    assert handler.devices == [handler.device("DEVICE1"), handler.device("DEVICE2")]
+    assert handler.configuration_handlers[1].devices == handler.devices
+    detections = [detection_summary(**c.kwargs) for c in on_spoofing_attack_mock.call_args_list]
+    assert sorted(detections, key=str) == sorted(expected_detections, key=str)
+    assert handler.detection_counts == {"height": 2, "both": 6, "speed": 4}
+
+
+def test_multi_configuration_detection_handler_stops_after_all_configurations(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 5, 12, 3], speeds=[0, 0, 0, 0], device_ids=["DEVICE1", "DEVICE2"])
+    configurations = [DetectionConfiguration(name, ["DEVICE1"], [PhysicalHeightLimitMethod],
+                                             {"min_height": 0, "max_height": 10}, 0) for name in ["first", "second"]]
+    handler = MultiConfigurationDetectionHandler(configurations, on_spoofing_attack=stop_feeding)
+    feeder = LogFeeder(handler, recording)
+    feeder.run()
+    assert feeder.stopped
+    assert handler.detection_counts == {"first": 1, "second": 1}
+
+
+def test_reordering_handler():
+    start_time = datetime(2018, 1, 1, 12, 0)
+    inner_handler = mock.MagicMock()
+    handler = ReorderingHandler(inner_handler, max_latency=1.0, event_time=feeder_time, drop_late=True, now=lambda: 0)
+    for device_id, second in [("DEVICE1", 0), ("DEVICE2", 0.5), ("DEVICE1", 1), ("DEVICE2", 0.2), ("DEVICE1", 2),
+                              ("DEVICE2", 0.8), ("DEVICE2", 1.5), ("DEVICE1", 3)]:
+        handler.handle(device_id=device_id, time=start_time + timedelta(seconds=second), sentence=str(second))
+    assert [c.kwargs["sentence"] for c in inner_handler.handle.call_args_list] == ["0", "0.2", "0.5", "1", "1.5", "2"]
+    assert handler.watermark == start_time + timedelta(seconds=2)
+    assert handler.late_count == 1
+    handler.flush()
+    assert [c.kwargs["sentence"] for c in inner_handler.handle.call_args_list][6:] == ["3"]
+    inner_handler.flush.assert_called_once_with()
+
+
+def test_reordering_handler_forwards_late_sentences():
+    start_time = datetime(2018, 1, 1, 12, 0)
+    inner_handler = mock.MagicMock()
+    handler = ReorderingHandler(inner_handler, max_latency=0.5, event_time=feeder_time, now=lambda: 0)
+    for second in [0, 2, 1]:
+        handler.handle(device_id="DEVICE1", time=start_time + timedelta(seconds=second), sentence=str(second))
+    assert [c.kwargs["sentence"] for c in inner_handler.handle.call_args_list] == ["0", "1"]
+    assert handler.late_count == 1
+
+
+def test_reordering_handler_orders_by_gps_time():
+    # DEVICE2 is delayed by two seconds, so the times of the feeder disagree with the GPS times of the sentences
+    start_time = datetime(2018, 8, 18, 16, 48, 10)
+    gga = "GPGGA,1648{:02d}.00,5049.65778,N,00722.80053,E,1,11,1.32,0,M,46.8,M,,"
+    gsa = nmea_sentence("GPGSA,A,3,01,02,03,,,,,,,,,,1.6,1.0,1.2")
+    inner_handler = mock.MagicMock()
+    handler = ReorderingHandler(inner_handler, max_latency=1.5, now=lambda: 0)
+    for device_id, second, sentence in [("DEVICE1", 0, nmea_sentence(gga.format(10))), ("DEVICE1", 0, gsa),
+                                        ("DEVICE2", 1, nmea_sentence(gga.format(9))),
+                                        ("DEVICE1", 1, nmea_sentence(gga.format(11))),
+                                        ("DEVICE2", 2, nmea_sentence(gga.format(10))), ("DEVICE2", 2, gsa),
+                                        ("DEVICE1", 2, nmea_sentence(gga.format(12)))]:
+        handler.handle(device_id=device_id, time=start_time + timedelta(seconds=second), sentence=sentence)
+    handler.flush()
+    assert [(c.kwargs["device_id"], c.kwargs["sentence"][7:13] if "GGA" in c.kwargs["sentence"] else "GSA")
+            for c in inner_handler.handle.call_args_list] == [
+        ("DEVICE2", "164809"), ("DEVICE1", "164810"), ("DEVICE1", "GSA"), ("DEVICE2", "164810"), ("DEVICE2", "GSA"),
+        ("DEVICE1", "164811"), ("DEVICE1", "164812")]
+    assert handler.late_count == 0
+    assert [c.kwargs["time"] for c in inner_handler.handle.call_args_list if c.kwargs["device_id"] == "DEVICE2"] == [
+        start_time + timedelta(seconds=1), start_time + timedelta(seconds=2), start_time + timedelta(seconds=2)]
+
+
+def test_reordering_handler_releases_idle_stream():
+    start_time = datetime(2018, 1, 1, 12, 0)
+    clock = [0.0]
+    inner_handler = mock.MagicMock()
+    handler = ReorderingHandler(inner_handler, max_latency=1.0, event_time=feeder_time, now=lambda: clock[0])
+    handler.handle(device_id="DEVICE1", time=start_time, sentence="0")
+    clock[0] = 0.5
+    handler.handle(device_id="DEVICE1", time=start_time + timedelta(seconds=0.2), sentence="0.2")
+    handler.idle()
+    inner_handler.handle.assert_not_called()
+    clock[0] = 1.0
+    handler.idle()
+    assert [c.kwargs["sentence"] for c in inner_handler.handle.call_args_list] == ["0"]
+    clock[0] = 1.5
+    handler.idle()
+    assert [c.kwargs["sentence"] for c in inner_handler.handle.call_args_list] == ["0", "0.2"]
+    inner_handler.flush.assert_not_called()
+
+
+def test_reordering_handler_restores_detections(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 5, 12, 3, 20, 4], speeds=[0, 4, 8, 12, 2, 1],
+                    device_ids=["DEVICE1", "DEVICE2"])
+    with open(recording) as file:
+        lines = file.readlines()
+    # The sentences of DEVICE2 arrive one second late
+    delayed_recording = os.path.join(tmp_path, "delayed_recording.log")
+    with open(delayed_recording, "w") as file:
+        device1_lines = [line for line in lines if "DEVICE1" in line]
+        device2_lines = [line for line in lines if "DEVICE2" in line]
+        for i in range(0, len(device1_lines), 2):
+            file.writelines(device1_lines[i:i + 2] + device2_lines[i - 2:i] if i > 0 else device1_lines[i:i + 2])
+        file.writelines(device2_lines[-2:])
+    method_options = {"min_height": 0, "max_height": 10, "max_speed": 5}
+    detections = []
+    for log_file, create_handler in [(recording, lambda handler: handler),
+                                     (delayed_recording, lambda handler: ReorderingHandler(handler, max_latency=1.5))]:
+        on_spoofing_attack_mock = mock.MagicMock()
+        handler = DetectionHandler(["DEVICE1", "DEVICE2"], [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod],
+                                   method_options, 0, on_spoofing_attack_mock)
+        LogFeeder(create_handler(handler), log_file).run()
+        detections.append([(c.kwargs["device_id"], c.kwargs["state"].update_time)
+                           for c in on_spoofing_attack_mock.call_args_list])
+    assert len(detections[0]) > 0
+    assert detections[1] == detections[0]
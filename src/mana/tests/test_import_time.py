@@ -0,0 +1,55 @@
+import os
+import subprocess
+import sys
+
+import mana
+
+heavy_modules = ["numpy", "ephem", "PIL", "scapy.all", "serial"]
+max_cold_start_seconds = 1.0
+
+
+def run_python(code):
+    source_directory = os.path.dirname(os.path.dirname(os.path.abspath(mana.__file__)))
+    environment = dict(os.environ, PYTHONPATH=source_directory)
+    result = subprocess.run([sys.executable, "-c", code], env=environment, capture_output=True, text=True,
+                            check=True)
+    return result.stdout.strip().splitlines()
+
+
+def loaded_heavy_modules_code(statements):
+    return "\n".join([
+        "import sys",
+        "from importlib.util import _LazyModule",
+        *statements,
+        "for name in {!r}:".format(heavy_modules),
+        "    module = sys.modules.get(name)",
+        "    if module is not None and type(module) is not _LazyModule:",
+        "        print(name)",
+    ])
+
+
+def test_import_does_not_load_heavy_modules():
+    loaded_modules = run_python(loaded_heavy_modules_code([
+        "import mana.handler, mana.feeder, mana.method",
+        "from mana.method import load_methods_json",
+    ]))
+    assert loaded_modules == []
+
+
+def test_import_cold_start_time():
+    output = run_python("\n".join([
+        "from time import perf_counter",
+        "start = perf_counter()",
+        "import mana.handler, mana.feeder, mana.method",
+        "print(perf_counter() - start)",
+    ]))
+    assert float(output[-1]) < max_cold_start_seconds
+
+
+def test_building_lightweight_method_does_not_load_heavy_modules():
+    loaded_modules = run_python(loaded_heavy_modules_code([
+        "from mana.method import method_name_to_class",
+        "method_class = method_name_to_class('PhysicalHeightLimitMethod')",
+        "method_class(None, max_height=100, min_height=0)",
+    ]))
+    assert loaded_modules == []
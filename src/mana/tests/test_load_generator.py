@@ -0,0 +1,112 @@
+import socket
+from datetime import datetime
+from threading import Thread
+
+import pytest
+
+from mana.feeder import UdpFeeder
+from mana.handler import Handler
+from mana.load_generator import UdpLoadGenerator, soak_test, loopback_device_ids, simulated_datagrams
+from mana.method import CarrierToNoiseDensityMethod, TimeDriftMethod
+from mana.simulation import NmeaStreamSimulator, SpoofingRamp
+
+
+class SentenceRecorder(Handler):
+
+    def __init__(self):
+        self.sentences = []
+
+    def handle(self, device_id, time, sentence):
+        self.sentences.append((device_id, sentence))
+
+
+def free_udp_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as udp_socket:
+        udp_socket.bind(("127.0.0.1", 0))
+        return udp_socket.getsockname()[1]
+
+
+def test_loopback_device_ids_are_distinct_addresses():
+    device_ids = loopback_device_ids(600)
+    assert len(set(device_ids)) == 600
+    assert device_ids[:2] == ["127.1.0.1", "127.1.0.2"] and device_ids[250] == "127.1.1.1"
+
+
+@pytest.mark.parametrize("multicast_group", [None, "239.255.10.110"])
+def test_udp_feeder_receives_load_generator_sentences(multicast_group):
+    port = free_udp_port()
+    recorder = SentenceRecorder()
+    feeder = UdpFeeder(recorder, port=port, address="0.0.0.0" if multicast_group else "127.0.0.1",
+                       multicast_group=multicast_group, multicast_interface="127.0.0.1")
+    feeder_thread = Thread(target=feeder.run)
+    feeder_thread.start()
+    feeder.ready.wait()
+    simulator = NmeaStreamSimulator(duration=2, device_ids=loopback_device_ids(3))
+    load_generator = UdpLoadGenerator(simulator, address=multicast_group or "127.0.0.1", port=port, speed=None)
+    load_generator.run()
+    sentences = [(device_id, sentence) for device_id, _, sentence in simulator.sentences()]
+    for _ in range(100):
+        if len(recorder.sentences) == len(sentences):
+            break
+        feeder_thread.join(0.01)
+    feeder.stop()
+    feeder_thread.join()
+    assert load_generator.sent_sentences == len(sentences)
+    assert load_generator.sent_datagrams == 2 * 3
+    assert recorder.sentences == sentences
+
+
+def test_soak_test_reports_latency_and_detections():
+    simulator = NmeaStreamSimulator(duration=6, device_ids=loopback_device_ids(4),
+                                    spoofing_attack=SpoofingRamp(start=2))
+    report = soak_test(simulator, [CarrierToNoiseDensityMethod, TimeDriftMethod],
+                       {"min_carrier_to_noise_density": 20, "max_carrier_to_noise_density": 48,
+                        "max_clock_drift_dev": 0.1},
+                       port=free_udp_port(), speed=None)
+    assert report.sent_sentences == report.received_sentences == len(simulator.sentences())
+    assert report.sentence_loss == 0
+    assert 0 < report.latencies["p50"] <= report.latencies["max"]
+    assert report.expected_detections["CarrierToNoiseDensityMethod"] > 0
+    assert report.detections == report.expected_detections
+    assert report.detection_loss == 0
+
+
+def test_load_generator_bounds_send_times():
+    simulator = NmeaStreamSimulator(duration=3, device_ids=loopback_device_ids(2))
+    load_generator = UdpLoadGenerator(simulator, port=free_udp_port(), speed=None)
+    load_generator.run()
+    assert load_generator.pending_datagrams == {} and len(load_generator.sent_order) == 0
+    # Nothing receives the datagrams, so all but the last datagram expire and are handed over with their send time
+    settled_datagrams = []
+    load_generator = UdpLoadGenerator(simulator, port=free_udp_port(), speed=None, record_send_times=True,
+                                      send_time_retention=0,
+                                      on_datagram=lambda *datagram: settled_datagrams.append(datagram))
+    load_generator.run()
+    assert len(load_generator.sent_order) == 1
+    assert sum(len(datagrams) for datagrams in load_generator.pending_datagrams.values()) == 1
+    load_generator.settle_datagrams()
+    assert len(load_generator.sent_order) == 0
+    assert [(device_id, sentences) for device_id, _, sentences in settled_datagrams] == \
+        [(device_id, sentences) for device_id, _, sentences in simulated_datagrams(simulator)]
+
+
+def test_load_generator_matches_repeated_sentences_by_datagram():
+    settled_datagrams = []
+    load_generator = UdpLoadGenerator(None, record_send_times=True, send_time_retention=60,
+                                      on_datagram=lambda *datagram: settled_datagrams.append(datagram))
+    datagrams = [["$GPRMC,1", "$GPGSA"], ["$GPRMC,2", "$GPGSA"], ["$GPRMC,3", "$GPGSA"], ["$GPRMC,4", "$GPGSA"]]
+    for sentences in datagrams:
+        load_generator.add_send_times("DEVICE1", sentences)
+    send_times = [datagram.send_time for datagram in load_generator.sent_order]
+    receive_times = [datetime(2018, 1, 1, 12, 0, second) for second in range(4)]
+    # The second datagram is lost, so the GSA of the third one takes the send time of the third datagram
+    assert [load_generator.pop_send_time("DEVICE1", sentence, receive_times[i])
+            for i in [0, 2] for sentence in datagrams[i]] == [send_times[0], send_times[0], send_times[2],
+                                                             send_times[2]]
+    assert load_generator.pop_send_time("DEVICE1", "$GPGSA", receive_times[3]) is None
+    load_generator.add_send_times("DEVICE1", ["$GPRMC,5"])
+    assert [sentences for _, _, sentences in settled_datagrams] == datagrams[:3]
+    assert settled_datagrams[0][1] == receive_times[0] and settled_datagrams[2][1] == receive_times[2]
+    assert settled_datagrams[1][1] not in receive_times
+    assert [datagram.sentences for datagram in load_generator.pending_datagrams["DEVICE1"]] == [datagrams[3],
+                                                                                               ["$GPRMC,5"]]
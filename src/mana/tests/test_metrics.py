@@ -0,0 +1,152 @@
+import sys
+import urllib.request
+from datetime import datetime
+from threading import Thread
+from unittest import mock
+
+import pytest
+
+from mana.handler import DetectionHandler
+from mana.method import Method
+from mana.metrics import MetricsRegistry, MetricsServer, Histogram, metrics_registry
+from mana.nmea_parser import NmeaParser
+
+
+class MethodDummy(Method):
+
+    def __init__(self, handler, *args, **kwargs):
+        super().__init__(handler, *args, **kwargs)
+        self.required_state_fields.extend(["latitude"])
+        self.variable_state_fields.extend(["update_time"])
+
+    def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
+        return 1
+
+
+class EnablingMethodDummy(MethodDummy):
+
+    def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
+        metrics_registry.enable()
+        return 1
+
+
+@pytest.fixture
+def enabled_metrics_registry():
+    metrics_registry.enable()
+    yield metrics_registry
+    metrics_registry.disable()
+    metrics_registry.reset()
+
+
+def test_histogram_observe_and_quantile():
+    histogram = Histogram(buckets=(1, 2, 3))
+    for value in [0.5, 1.5, 1.5, 2.5, 10]:
+        histogram.observe(value)
+    assert histogram.count == 5
+    assert histogram.sum == pytest.approx(16)
+    assert histogram.cumulative_bucket_counts() == [1, 3, 4, 5]
+    assert histogram.quantile(0.5) == 2
+    assert histogram.quantile(1) == float('inf')
+
+
+def test_metrics_registry_snapshot_and_prometheus_text():
+    registry = MetricsRegistry()
+    registry.increment("mana_sentences_total", device="DEVICE1")
+    registry.increment("mana_sentences_total", device="DEVICE1")
+    registry.observe("mana_method_seconds", 0.002, method="MethodDummy")
+    snapshot = registry.snapshot()
+    assert snapshot["counters"][0]["labels"] == {"device": "DEVICE1"}
+    assert snapshot["counters"][0]["value"] == 2
+    assert snapshot["histograms"][0]["count"] == 1
+    text = registry.prometheus_text()
+    assert "# TYPE mana_sentences_total counter" in text
+    assert 'mana_sentences_total{device="DEVICE1"} 2' in text
+    assert 'mana_method_seconds_bucket{method="MethodDummy",le="+Inf"} 1' in text
+    assert 'mana_method_seconds_count{method="MethodDummy"} 1' in text
+
+
+def test_metrics_registry_disabled_by_default():
+    handler = DetectionHandler(device_ids=["DEVICE1"], method_classes=[MethodDummy], method_options={},
+                               detection_threshold=0.5, on_spoofing_attack=lambda **kwargs: None)
+    handler.handle(device_id="DEVICE1", time=datetime(2018, 1, 1), sentence="$ABC*13")
+    assert metrics_registry.enabled is False
+    assert metrics_registry.counters == {}
+
+
+def test_detection_handler_metrics(enabled_metrics_registry):
+    handler = DetectionHandler(device_ids=["DEVICE1"], method_classes=[MethodDummy], method_options={},
+                               detection_threshold=0.5, on_spoofing_attack=lambda **kwargs: None)
+    sentences = ["$GPGLL,5049.65778,N,00722.80053,E,164824.00,A,A*6E", "$ABC*13", "$ABC*40", "ABC",
+                 "$GPGLL,5049.65778,N,00722.80053,E,164824.00,A,A*6E"]
+    for i, sentence in enumerate(sentences):
+        handler.handle(device_id="DEVICE1", time=datetime(2018, 1, 1, 0, 0, i), sentence=sentence)
+    registry = enabled_metrics_registry
+    assert registry.counter_value("mana_sentences_total", device="DEVICE1") == 5
+    assert registry.counter_value("mana_parse_errors_total", error="invalid_checksum") == 1
+    assert registry.counter_value("mana_parse_errors_total", error="unsupported_sentence_type") == 1
+    assert registry.counter_value("mana_parse_errors_total", error="invalid_sentence") == 1
+    assert registry.counter_value("mana_method_skips_total", method="MethodDummy", reason="first_state") == 1
+    assert registry.counter_value("mana_method_evaluations_total", method="MethodDummy") == 1
+    assert registry.counter_value("mana_detections_total", method="MethodDummy") == 1
+    assert registry.histogram("mana_parse_seconds").count == 2
+    assert registry.histogram("mana_method_seconds", method="MethodDummy").count == 1
+
+
+def test_detection_handler_metrics_enabled_while_handling(enabled_metrics_registry):
+    # Another thread can enable the metrics while a sentence is parsed or a method evaluates it
+    handler = DetectionHandler(device_ids=["DEVICE1"], method_classes=[EnablingMethodDummy], method_options={},
+                               detection_threshold=0.5, on_spoofing_attack=lambda **kwargs: None)
+    parse = NmeaParser.parse
+    parse_calls = []
+
+    def enabling_parse(*args):
+        parse_calls.append(args)
+        if len(parse_calls) == 1:
+            metrics_registry.enable()
+        return parse(*args)
+
+    with mock.patch("mana.handler.NmeaParser.parse", side_effect=enabling_parse):
+        for i in range(2):
+            metrics_registry.disable()
+            handler.handle(device_id="DEVICE1", time=datetime(2018, 1, 1, 0, 0, i),
+                           sentence="$GPGLL,5049.65778,N,00722.80053,E,164824.00,A,A*6E")
+    registry = enabled_metrics_registry
+    assert registry.histogram("mana_parse_seconds") is None
+    assert registry.histogram("mana_method_seconds", method="EnablingMethodDummy") is None
+    assert registry.counter_value("mana_detections_total", method="EnablingMethodDummy") == 1
+
+
+def test_metrics_server():
+    registry = MetricsRegistry()
+    registry.increment("mana_sentences_total", device="DEVICE1")
+    server = MetricsServer(registry, port=0)
+    server.start()
+    try:
+        with urllib.request.urlopen("http://127.0.0.1:{}/metrics".format(server.port), timeout=5) as response:
+            text = response.read().decode()
+    finally:
+        server.stop()
+    assert 'mana_sentences_total{device="DEVICE1"} 1' in text
+
+
+def test_metrics_registry_concurrent_scrape():
+    registry = MetricsRegistry()
+
+    def record():
+        # Every device adds new label sets while the registry is scraped
+        for device in range(20000):
+            registry.increment("mana_sentences_total", device="DEVICE{}".format(device))
+            registry.observe("mana_parse_seconds", 0.001, device="DEVICE{}".format(device))
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    thread = Thread(target=record)
+    thread.start()
+    try:
+        while thread.is_alive():
+            registry.prometheus_text()
+            registry.snapshot()
+    finally:
+        thread.join()
+        sys.setswitchinterval(switch_interval)
+    assert len(registry.snapshot()["counters"]) == 20000
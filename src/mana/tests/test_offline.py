@@ -0,0 +1,90 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from mana.feeder import stop_feeding
+from mana.handler import DetectionHandler
+from mana.method import PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod, PhysicalRateOfTurnLimitMethod, \
+    CarrierToNoiseDensityMethod, TimeDriftMethod
+from mana.offline import BatchTimelineFeeder
+from mana.simulation import nmea_sentence
+from mana.timeline import TimelineFeeder, convert_recording_to_timeline
+from mana.feeder import LogFeeder
+
+
+def write_random_recording(filename, seed, seconds=40):
+    random_generator = random.Random(seed)
+    start_time = datetime(2018, 8, 18, 16, 0, 0)
+    with open(filename, "w") as file:
+        for second in range(seconds):
+            for device_id in ["DEVICE1", "DEVICE2"]:
+                time = start_time + timedelta(seconds=second // 2, milliseconds=500 * (second % 2))
+                gps_time = time.strftime("%H%M%S.%f")[:9]
+                height = random_generator.choice(["", "5", "5", "12", str(second)])
+                speed = random_generator.choice(["", "1.5", "1.5", "4", "12"])
+                course = random_generator.choice(["10.0", "10.0", "50.0", "355.0"])
+                sentences = [
+                    "GPGGA,{},5049.65778,N,00722.80053,E,1,11,1.32,{},M,46.8,M,,".format(gps_time, height),
+                    "GPRMC,{},A,5049.65778,N,00722.80053,E,{},{},180818,,,A".format(gps_time, speed, course),
+                ]
+                satellites = []
+                for pseudo_random_noise in random_generator.sample(range(1, 9), random_generator.randint(0, 4)):
+                    density = random_generator.choice(["", "20", "35", "50"])
+                    satellites.append("{:02d},45,100,{}".format(pseudo_random_noise, density))
+                if satellites:
+                    sentences.append("GPGSV,1,1,{},{}".format(len(satellites), ",".join(satellites)))
+                for sentence in random_generator.sample(sentences, len(sentences)):
+                    file.write("{} {} {}\n".format(time.strftime("%Y-%m-%d %H:%M:%S.%f"), device_id,
+                                                   nmea_sentence(sentence)))
+
+
+class DetectionRecorder:
+
+    def __init__(self):
+        self.detections = []
+
+    def on_spoofing_attack(self, device_id, spoofing_indicator, method, state):
+        self.detections.append((device_id, spoofing_indicator, type(method).__name__, state))
+
+
+def run_detection(feeder_class, timeline_file, method_classes):
+    recorder = DetectionRecorder()
+    handler = DetectionHandler(device_ids=["DEVICE1", "DEVICE2"], method_classes=method_classes,
+                               method_options={"min_height": 0, "max_height": 10, "max_speed": 3,
+                                               "max_rate_of_turn": 30, "min_speed_to_determine_rate_of_turn": 1,
+                                               "min_carrier_to_noise_density": 25,
+                                               "max_carrier_to_noise_density": 45, "max_clock_drift_dev": 0.5},
+                               detection_threshold=0, on_spoofing_attack=recorder.on_spoofing_attack)
+    feeder_class(handler, timeline_file).run()
+    return recorder.detections
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("method_classes", [
+    [PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod, PhysicalRateOfTurnLimitMethod, CarrierToNoiseDensityMethod],
+    [PhysicalSpeedLimitMethod, TimeDriftMethod, CarrierToNoiseDensityMethod],
+])
+def test_batch_timeline_feeder_matches_streaming(tmp_path, seed, method_classes):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_random_recording(recording, seed)
+    timeline_file = convert_recording_to_timeline(recording, os.path.join(tmp_path, "timeline.npz"),
+                                                  feeder_class=LogFeeder)
+    expected_detections = run_detection(TimelineFeeder, timeline_file, method_classes)
+    detections = run_detection(BatchTimelineFeeder, timeline_file, method_classes)
+    assert len(expected_detections) > 0
+    assert detections == expected_detections
+
+
+def test_batch_timeline_feeder_stops_feeding(tmp_path):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_random_recording(recording, 0)
+    timeline_file = convert_recording_to_timeline(recording, os.path.join(tmp_path, "timeline.npz"),
+                                                  feeder_class=LogFeeder)
+    handler = DetectionHandler(device_ids=["DEVICE1"], method_classes=[PhysicalHeightLimitMethod],
+                               method_options={"min_height": 0, "max_height": 10}, detection_threshold=0,
+                               on_spoofing_attack=stop_feeding)
+    feeder = BatchTimelineFeeder(handler, timeline_file)
+    feeder.run()
+    assert feeder.stopped
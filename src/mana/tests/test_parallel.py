@@ -0,0 +1,75 @@
+import os
+
+import pytest
+
+from mana.feeder import LogFeeder, SentenceFeeder, stop_feeding
+from mana.handler import DetectionHandler
+from mana.method import MultipleReceiversMethod, PhysicalSpeedLimitMethod, TimeDriftMethod, \
+    CarrierToNoiseDensityMethod, PhysicalHeightLimitMethod
+from mana.parallel import DeviceParallelFeeder, plan_methods, read_sentences
+from mana.tests.test_offline import write_random_recording
+
+method_classes = [PhysicalSpeedLimitMethod, MultipleReceiversMethod, TimeDriftMethod, CarrierToNoiseDensityMethod]
+method_options = {"max_speed": 3, "distances": {("DEVICE1", "DEVICE2"): 10},
+                  "distance_ratio_thresholds": {("DEVICE1", "DEVICE2"): 0.5}, "max_clock_drift_dev": 0.1,
+                  "min_carrier_to_noise_density": 25, "max_carrier_to_noise_density": 45}
+
+
+class DetectionRecorder:
+
+    def __init__(self):
+        self.detections = []
+
+    def on_spoofing_attack(self, device_id, spoofing_indicator, method, state):
+        self.detections.append((device_id, spoofing_indicator, method, state))
+
+
+def run_detection(feeder):
+    recorder = DetectionRecorder()
+    handler = DetectionHandler(device_ids=["DEVICE1", "DEVICE2"], method_classes=method_classes,
+                               method_options=method_options, detection_threshold=0,
+                               on_spoofing_attack=recorder.on_spoofing_attack)
+    feeder(handler).run()
+    assert all(method in handler.methods for _, _, method, _ in recorder.detections)
+    return [(device_id, spoofing_indicator, type(method).__name__, state)
+            for device_id, spoofing_indicator, method, state in recorder.detections]
+
+
+def test_plan_methods_keeps_cross_device_methods_on_the_merged_stream():
+    handler = DetectionHandler(device_ids=["DEVICE1", "DEVICE2"], method_classes=method_classes,
+                               method_options=method_options, detection_threshold=0, on_spoofing_attack=None)
+    assert plan_methods(handler) == ([0, 2, 3], [1])
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("processes", [1, 2])
+def test_device_parallel_feeder_matches_serial_detection(tmp_path, seed, processes):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_random_recording(recording, seed)
+    expected_detections = run_detection(lambda handler: LogFeeder(handler, recording))
+    detections = run_detection(lambda handler: DeviceParallelFeeder(handler, recording, source_feeder_class=LogFeeder,
+                                                                    processes=processes))
+    assert {"PhysicalSpeedLimitMethod", "MultipleReceiversMethod", "CarrierToNoiseDensityMethod"} <= \
+        {method_name for _, _, method_name, _ in expected_detections}
+    assert detections == expected_detections
+
+
+def test_sentence_feeder_replays_read_sentences(tmp_path):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_random_recording(recording, 0)
+    sentences = read_sentences(recording, LogFeeder, ["DEVICE1"])
+    assert {device_id for device_id, _, _ in sentences} == {"DEVICE1"}
+    expected_detections = run_detection(lambda handler: LogFeeder(handler, recording))
+    assert run_detection(lambda handler: SentenceFeeder(handler, read_sentences(recording, LogFeeder))) == \
+        expected_detections
+
+
+def test_device_parallel_feeder_stops_feeding(tmp_path):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_random_recording(recording, 0)
+    handler = DetectionHandler(device_ids=["DEVICE1"], method_classes=[PhysicalHeightLimitMethod],
+                               method_options={"min_height": 0, "max_height": 10}, detection_threshold=0,
+                               on_spoofing_attack=stop_feeding)
+    feeder = DeviceParallelFeeder(handler, recording, source_feeder_class=LogFeeder, processes=1)
+    feeder.run()
+    assert feeder.stopped
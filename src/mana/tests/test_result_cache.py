@@ -0,0 +1,124 @@
+import os
+from datetime import datetime
+
+from mana.method import PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod, OrGroupMethod
+from mana.feeder import LogFeeder
+from mana.result_cache import ResultCache, normalize_method_options, method_option_names, code_version
+
+
+def put_summary(result_cache, recording, method_options, max_spoofing_indicator=0.5, method_class=None):
+    result_cache.put(recording, ["DEVICE1"], LogFeeder, method_class or PhysicalHeightLimitMethod, method_options,
+                     {"max_spoofing_indicator": max_spoofing_indicator})
+
+
+def get_summary(result_cache, recording, method_options, method_class=None):
+    return result_cache.get(recording, ["DEVICE1"], LogFeeder, method_class or PhysicalHeightLimitMethod,
+                            method_options)
+
+
+def write_recording(tmp_path, name, content):
+    filename = os.path.join(tmp_path, name)
+    with open(filename, "w") as file:
+        file.write(content)
+    return filename
+
+
+def test_result_cache_get_put(tmp_path):
+    recording = write_recording(tmp_path, "recording.log", "A")
+    result_cache = ResultCache(os.path.join(tmp_path, "cache"))
+    method_options = {"min_height": 0, "max_height": 10, "max_speed": 5}
+    assert get_summary(result_cache, recording, method_options) is None
+    put_summary(result_cache, recording, method_options, float("-inf"))
+    assert get_summary(result_cache, recording, method_options) == {"max_spoofing_indicator": float("-inf")}
+    assert get_summary(result_cache, recording, dict(method_options, max_speed=6)) is not None
+    assert get_summary(result_cache, recording, dict(method_options, max_height=11)) is None
+    assert get_summary(result_cache, recording, method_options, method_class=PhysicalSpeedLimitMethod) is None
+    assert result_cache.statistics()["hits"] == 2
+    assert result_cache.statistics()["misses"] == 3
+    assert ResultCache(os.path.join(tmp_path, "cache")).size_bytes == result_cache.size_bytes > 0
+
+
+def test_result_cache_recording_content_key(tmp_path):
+    recording = write_recording(tmp_path, "recording.log", "A")
+    copied_recording = write_recording(tmp_path, "copy.log", "A")
+    result_cache = ResultCache(os.path.join(tmp_path, "cache"))
+    put_summary(result_cache, recording, {"min_height": 0, "max_height": 10})
+    assert get_summary(result_cache, copied_recording, {"min_height": 0, "max_height": 10}) is not None
+    write_recording(tmp_path, "recording.log", "B")
+    os.utime(recording, ns=(0, 0))
+    assert get_summary(result_cache, recording, {"min_height": 0, "max_height": 10}) is None
+
+
+def test_result_cache_dependency_key(tmp_path):
+    recording = write_recording(tmp_path, "recording.log", "A")
+    data_file = write_recording(tmp_path, "data.txt", "A")
+
+    class DataDependentMethod(PhysicalHeightLimitMethod):
+        dependency_modules = ["mana.method.orbit_propagator"]
+        dependency_files = [data_file]
+
+    result_cache = ResultCache(os.path.join(tmp_path, "cache"))
+    put_summary(result_cache, recording, {}, method_class=DataDependentMethod)
+    assert get_summary(result_cache, recording, {}, method_class=DataDependentMethod) is not None
+    assert code_version(DataDependentMethod) != code_version(PhysicalHeightLimitMethod)
+    write_recording(tmp_path, "data.txt", "B")
+    code_version.cache_clear()
+    assert get_summary(result_cache, recording, {}, method_class=DataDependentMethod) is None
+    group_options = {"method_classes": [DataDependentMethod], "method_options": [{}]}
+    put_summary(result_cache, recording, group_options, method_class=OrGroupMethod)
+    write_recording(tmp_path, "data.txt", "C")
+    code_version.cache_clear()
+    assert get_summary(result_cache, recording, group_options, method_class=OrGroupMethod) is None
+
+
+def test_result_cache_trace(tmp_path):
+    recording = write_recording(tmp_path, "recording.log", "A")
+    result_cache = ResultCache(os.path.join(tmp_path, "cache"))
+    summary = {"max_spoofing_indicator": 0.5,
+               "spoofing_indicator_trace": [(datetime(2018, 1, 1, 0, 0, 1), "DEVICE1", 0.5)]}
+    result_cache.put(recording, ["DEVICE1"], LogFeeder, PhysicalHeightLimitMethod, {}, summary, record_traces=True)
+    assert result_cache.get(recording, ["DEVICE1"], LogFeeder, PhysicalHeightLimitMethod, {}) is None
+    assert result_cache.get(recording, ["DEVICE1"], LogFeeder, PhysicalHeightLimitMethod, {},
+                            record_traces=True) == summary
+
+
+def test_result_cache_integrity_check(tmp_path):
+    recording = write_recording(tmp_path, "recording.log", "A")
+    result_cache = ResultCache(os.path.join(tmp_path, "cache"))
+    put_summary(result_cache, recording, {})
+    entry_file, = result_cache.entry_files()
+    with open(entry_file) as file:
+        entry = file.read()
+    with open(entry_file, "w") as file:
+        file.write(entry.replace("0.5", "0.1"))
+    assert get_summary(result_cache, recording, {}) is None
+    assert result_cache.statistics()["corrupted"] == 1
+    assert result_cache.entry_files() == []
+    assert result_cache.size_bytes == 0
+
+
+def test_result_cache_eviction(tmp_path):
+    recording = write_recording(tmp_path, "recording.log", "A")
+    result_cache = ResultCache(os.path.join(tmp_path, "cache"))
+    put_summary(result_cache, recording, {"max_height": 0})
+    entry_size = result_cache.size_bytes
+    result_cache.max_size_bytes = 2 * entry_size
+    for max_height, mtime in [(0, 1), (1, 2)]:
+        put_summary(result_cache, recording, {"max_height": max_height})
+        os.utime(result_cache.entry_file(result_cache.key(recording, ["DEVICE1"], LogFeeder,
+                                                          PhysicalHeightLimitMethod, {"max_height": max_height},
+                                                          False)), (mtime, mtime))
+    put_summary(result_cache, recording, {"max_height": 2})
+    assert result_cache.statistics()["evictions"] == 1
+    assert get_summary(result_cache, recording, {"max_height": 0}) is None
+    assert get_summary(result_cache, recording, {"max_height": 1}) is not None
+    assert get_summary(result_cache, recording, {"max_height": 2}) is not None
+
+
+def test_normalize_method_options():
+    assert {"calibration_percentile", "min_height", "max_height"} <= method_option_names(PhysicalHeightLimitMethod)
+    assert "method_classes" in method_option_names(OrGroupMethod)
+    method_options = {"max_height": 10, "max_speed": 5, "distances": {("A", "B"): 1}}
+    assert normalize_method_options(PhysicalHeightLimitMethod, method_options) == {"max_height": 10}
+    assert normalize_method_options(OrGroupMethod, {"method_classes": [PhysicalHeightLimitMethod]}) == \
+        {"method_classes": ["mana.method.method:PhysicalHeightLimitMethod"]}
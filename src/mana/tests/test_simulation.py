@@ -0,0 +1,83 @@
+import os
+
+import pytest
+
+from mana.feeder import LogFeeder, PcapFeeder
+from mana.handler import DetectionHandler
+from mana.method import MultipleReceiversMethod, PhysicalSpeedLimitMethod, CarrierToNoiseDensityMethod, \
+    TimeDriftMethod
+from mana.nmea_parser import NmeaParser
+from mana.parallel import read_sentences
+from mana.simulation import NmeaStreamSimulator, SpoofingRamp, ReplayAttack, MeaconingAttack
+from mana.state import NmeaState
+
+
+def test_simulator_is_deterministic():
+    assert NmeaStreamSimulator(duration=5, seed=1).sentences() == NmeaStreamSimulator(duration=5, seed=1).sentences()
+    assert NmeaStreamSimulator(duration=5, seed=1).sentences() != NmeaStreamSimulator(duration=5, seed=2).sentences()
+
+
+def test_simulator_sends_marsim_sentences_of_each_receiver():
+    simulator = NmeaStreamSimulator(receiver_count=3, duration=4)
+    sentences = simulator.sentences()
+    assert {device_id for device_id, _, _ in sentences} == {"192.168.0.10", "192.168.0.11", "192.168.0.12"}
+    assert {sentence[3:6] for _, _, sentence in sentences} == {"RMC", "GSV", "GSA", "GGA", "GLL", "VTG"}
+    times = [time for _, time, _ in sentences]
+    assert times == sorted(times)
+    state = NmeaState()
+    for device_id, time, sentence in sentences:
+        if device_id == "192.168.0.10":
+            state = NmeaParser.parse(state, time, sentence)
+    assert abs(state.latitude - 54.5) < 0.01 and abs(state.longitude - 10.5) < 0.01
+    assert state.speed == 20 and state.course == 1.5
+    assert len(state.satellites) > 4
+    assert (state.update_time - state.gps_time).total_seconds() < 0.01
+
+
+def test_simulator_writes_log_and_pcap_files(tmp_path):
+    simulator = NmeaStreamSimulator(duration=3)
+    sentences = simulator.sentences()
+    log_file = simulator.write_log(os.path.join(tmp_path, "simulation.log"))
+    pcap_file = simulator.write_pcap(os.path.join(tmp_path, "simulation.pcap"))
+    assert read_sentences(log_file, LogFeeder) == sentences
+    assert [(device_id, sentence) for device_id, _, sentence in read_sentences(pcap_file, PcapFeeder)] == \
+        [(device_id, sentence) for device_id, _, sentence in sentences]
+    log_file = simulator.write_log(os.path.join(tmp_path, "part.log"), sentences[:3])
+    assert read_sentences(log_file, LogFeeder) == sentences[:3]
+
+
+def detected_method_names(simulator):
+    detections = []
+    device_ids = simulator.device_ids()
+    handler = DetectionHandler(device_ids=device_ids,
+                               method_classes=[MultipleReceiversMethod, PhysicalSpeedLimitMethod,
+                                               CarrierToNoiseDensityMethod, TimeDriftMethod],
+                               method_options={"distances": {tuple(device_ids): 4},
+                                               "distance_ratio_thresholds": {tuple(device_ids): 0.5}, "max_speed": 30,
+                                               "min_carrier_to_noise_density": 20,
+                                               "max_carrier_to_noise_density": 50, "max_clock_drift_dev": 0.1},
+                               detection_threshold=0.1,
+                               on_spoofing_attack=lambda method, **_: detections.append(type(method).__name__))
+    for device_id, time, sentence in simulator.sentences():
+        handler.handle(device_id, time, sentence)
+    return set(detections)
+
+
+@pytest.mark.parametrize("spoofing_attack, expected_method_names", [
+    (None, set()),
+    (SpoofingRamp(start=20), {"MultipleReceiversMethod", "CarrierToNoiseDensityMethod"}),
+    (ReplayAttack(start=20, age=10), {"MultipleReceiversMethod", "CarrierToNoiseDensityMethod", "TimeDriftMethod"}),
+    (MeaconingAttack(start=20, delay=0.5), {"MultipleReceiversMethod", "CarrierToNoiseDensityMethod",
+                                            "TimeDriftMethod"}),
+])
+def test_spoofing_attacks_are_detected(spoofing_attack, expected_method_names):
+    simulator = NmeaStreamSimulator(duration=40, position_noise=0.2, spoofing_attack=spoofing_attack)
+    assert detected_method_names(simulator) == expected_method_names
+
+
+def test_simulator_streams_seconds_of_custom_receivers():
+    simulator = NmeaStreamSimulator(duration=3, device_ids=["127.1.0.1", "127.1.0.2", "127.1.0.3"])
+    seconds = list(simulator.seconds())
+    assert len(seconds) == 3
+    assert {device_id for device_id, _, _ in seconds[0]} == {"127.1.0.1", "127.1.0.2", "127.1.0.3"}
+    assert [sentence for second in seconds for sentence in second] == simulator.sentences()
@@ -39,6 +39,18 @@ def test_state_history_state_before_after():
     assert state_time_after == expected_state_time_after
 
 
+def test_state_history_surrounding_states():
+    state_history = StateHistory(max_state_history_time_span=20)
+    for i in [0, 2, 2, 2, 4, 6, 6, 8]:
+        state_history.add_state(DummyState(i, dt.datetime(2018, 1, 1, 0, 0, i)))
+    for seconds in range(-1, 10):
+        time = dt.datetime(2018, 1, 1, 0, 0, 0) + dt.timedelta(seconds=seconds)
+        state_before, state_after = state_history.surrounding_states(time)
+        assert state_before is state_history.state_before(time)
+        assert state_after is state_history.state_after(time)
+    assert StateHistory().surrounding_states(dt.datetime(2018, 1, 1)) == (None, None)
+
+
 def test_state_history_state():
     state_history = StateHistory()
     for i in range(10):
@@ -0,0 +1,154 @@
+import bisect
+import random
+from itertools import combinations
+from statistics import median, mean, pvariance
+
+import numpy as np
+import pytest
+
+from mana.statistics import RollingTheilSenRegression, median_of_sorted_values, RingBuffer, RollingMean, \
+    RollingVariance, RollingMinimumMaximum, Ewma, SmoothedZScorePeakDetector, QuantileSketch, LinearRegressionSummary, \
+    merge_summaries
+
+
+@pytest.mark.parametrize("values,expected_median", [([], None), ([1], 1), ([1, 2], 1.5), ([1, 2, 10], 2)])
+def test_median_of_sorted_values(values, expected_median):
+    assert median_of_sorted_values(values) == expected_median
+
+
+def test_rolling_theil_sen_regression_exact_line():
+    regression = RollingTheilSenRegression(max_count=10)
+    for x in range(20):
+        regression.add(x, 2 * x + 1)
+    assert len(regression) == 10
+    assert regression.slope() == pytest.approx(2)
+    assert regression.predict(30) == pytest.approx(61)
+
+
+def test_rolling_theil_sen_regression_horizontal_line():
+    regression = RollingTheilSenRegression(max_count=10)
+    for x in range(5):
+        regression.add(x, 0.5)
+    assert regression.predict(100) == pytest.approx(0.5)
+
+
+def test_rolling_theil_sen_regression_constant_x():
+    regression = RollingTheilSenRegression(max_count=10)
+    assert regression.predict(0) is None
+    regression.add(1, 1)
+    regression.add(1, 3)
+    assert regression.slope() == 0
+    assert regression.predict(5) == pytest.approx(2)
+
+
+def test_rolling_theil_sen_regression_ignores_outliers():
+    regression = RollingTheilSenRegression(max_count=60)
+    for x in range(60):
+        y = 0.00001 * x + (5 if x % 10 == 0 else 0)
+        regression.add(x, y)
+    assert regression.predict(60) == pytest.approx(0.0006, abs=1e-9)
+
+
+def test_rolling_theil_sen_regression_matches_batch_estimate():
+    generator = random.Random(0)
+    regression = RollingTheilSenRegression(max_count=15)
+    points = []
+    for x in range(40):
+        y = 0.1 * x + generator.gauss(0, 1)
+        regression.add(x, y)
+        points = (points + [(x, y)])[-15:]
+    slopes = [(y2 - y1) / (x2 - x1) for (x1, y1), (x2, y2) in combinations(points, 2)]
+    expected_slope = median(slopes)
+    expected_intercept = median(y - expected_slope * x for x, y in points)
+    assert sorted(regression.sorted_slopes) == regression.sorted_slopes
+    assert len(regression.sorted_slopes) == len(slopes)
+    assert regression.slope() == pytest.approx(expected_slope)
+    assert regression.intercept() == pytest.approx(expected_intercept)
+
+
+def test_ring_buffer():
+    ring_buffer = RingBuffer(3)
+    for value in range(5):
+        ring_buffer.append(value)
+    assert list(ring_buffer) == [2, 3, 4]
+    assert ring_buffer.oldest() == 2
+    assert ring_buffer.latest() == 4
+
+
+def test_rolling_mean_fill_value():
+    rolling_mean = RollingMean(4, fill_value=0)
+    assert rolling_mean.mean() == 0
+    rolling_mean.add(1)
+    assert rolling_mean.mean() == 0.25
+    assert RollingMean(4).mean() is None
+
+
+def test_rolling_statistics_match_batch_statistics():
+    generator = random.Random(0)
+    window_size = 7
+    rolling_mean = RollingMean(window_size)
+    rolling_variance = RollingVariance(window_size)
+    rolling_minimum_maximum = RollingMinimumMaximum(window_size)
+    values = []
+    for _ in range(100):
+        value = generator.uniform(-1e6, 1e6) if generator.random() < 0.1 else generator.gauss(0, 1)
+        rolling_mean.add(value)
+        rolling_variance.add(value)
+        rolling_minimum_maximum.add(value)
+        values = (values + [value])[-window_size:]
+        assert rolling_mean.mean() == pytest.approx(mean(values), abs=1e-6)
+        assert rolling_variance.mean() == pytest.approx(mean(values), abs=1e-6)
+        assert rolling_variance.variance() == pytest.approx(pvariance(values), rel=1e-6, abs=1e-3)
+        assert rolling_minimum_maximum.minimum() == min(values)
+        assert rolling_minimum_maximum.maximum() == max(values)
+
+
+def test_ewma():
+    ewma = Ewma(0.25)
+    assert ewma.value is None
+    assert ewma.add(4) == 4
+    assert ewma.add(8) == 5
+    assert Ewma(0.5, initial_value=0).add(2) == 1
+
+
+def test_smoothed_z_score_peak_detector():
+    peak_detector = SmoothedZScorePeakDetector(lag=5, threshold=3, influence=0)
+    values = [1, 1.1, 0.9, 1, 1.1, 1, 10, 1, -10, 1]
+    signals = [peak_detector.add(value) for value in values]
+    assert signals == [0, 0, 0, 0, 0, 0, 1, 0, -1, 0]
+
+
+def test_quantile_sketch_merge():
+    generator = random.Random(0)
+    values = [generator.gauss(0, 1) for _ in range(20000)]
+    sketches = [QuantileSketch(seed=i) for i in range(4)]
+    for i, value in enumerate(values):
+        sketches[i % 4].add(value)
+    sketch = sketches[0]
+    for other_sketch in sketches[1:]:
+        sketch.merge(other_sketch)
+    sorted_values = sorted(values)
+    assert len(sketch) == len(values)
+    assert sketch.size < 4 * sketch.capacity
+    assert (sketch.minimum, sketch.maximum) == (sorted_values[0], sorted_values[-1])
+    assert sketch.quantile(0) == sorted_values[0]
+    assert sketch.quantile(1) == sorted_values[-1]
+    for q in [0.01, 0.25, 0.5, 0.75, 0.99]:
+        rank = bisect.bisect_left(sorted_values, sketch.quantile(q)) / len(values)
+        assert rank == pytest.approx(q, abs=0.02)
+    assert QuantileSketch().quantile(0.5) is None
+
+
+def test_linear_regression_summary_merge():
+    generator = random.Random(0)
+    points = [(x, 3 * x + 2 + generator.gauss(0, 1)) for x in range(100)]
+    summaries = [LinearRegressionSummary() for _ in range(3)]
+    for i, (x, y) in enumerate(points):
+        summaries[i % 3 if i < 50 else 2].add(x, y)
+    summary = merge_summaries({"a": summaries[0]}, {"a": summaries[1], "b": summaries[2]})
+    merged_summary = summary["a"]
+    merged_summary.merge(summary["b"])
+    expected_slope, expected_intercept = np.polyfit(*zip(*points), 1)
+    assert len(merged_summary) == 100
+    assert merged_summary.slope() == pytest.approx(expected_slope)
+    assert merged_summary.intercept() == pytest.approx(expected_intercept)
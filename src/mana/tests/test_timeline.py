@@ -0,0 +1,83 @@
+import os
+
+from mana.feeder import LogFeeder, stop_feeding
+from mana.handler import DetectionHandler
+from mana.method import PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod, CarrierToNoiseDensityMethod
+from mana.timeline import TimelineFeeder, convert_recording_to_timeline, cached_timeline_file, load_timeline
+
+gsv_sentences = ["$GPGSV,4,1,15,01,47,141,47,03,82,041,48,06,21,306,,09,23,209,35*78",
+                 "$GPGSV,4,2,15,11,24,162,30,12,05,339,,14,16,045,11,17,42,266,41*70",
+                 "$GPGSV,4,3,15,18,19,138,33,19,35,298,26,22,59,082,35,23,53,192,43*72",
+                 "$GPGSV,4,4,15,25,00,018,,31,24,061,13,33,28,208,30*41",
+                 "$GPGSA,A,3,11,22,18,03,14,01,09,31,23,19,17,,2.43,1.32,2.04*0B"]
+
+
+class DetectionRecorder:
+
+    def __init__(self):
+        self.detections = []
+
+    def on_spoofing_attack(self, device_id, spoofing_indicator, method, state):
+        self.detections.append((device_id, spoofing_indicator, type(method).__name__, state))
+
+
+def run_detection(feeder_class, recording, **feeder_options):
+    recorder = DetectionRecorder()
+    handler = DetectionHandler(device_ids=["DEVICE1"],
+                               method_classes=[PhysicalHeightLimitMethod, PhysicalSpeedLimitMethod,
+                                               CarrierToNoiseDensityMethod],
+                               method_options={"min_height": 0, "max_height": 10, "max_speed": 10,
+                                               "min_carrier_to_noise_density": 20,
+                                               "max_carrier_to_noise_density": 45},
+                               detection_threshold=0, on_spoofing_attack=recorder.on_spoofing_attack)
+    feeder = feeder_class(handler, recording, **feeder_options)
+    feeder.run()
+    return recorder.detections, handler.device("DEVICE1").state_history.state_history
+
+
+def test_timeline_feeder_replays_parsed_states(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 1, 50, 3, 60], speeds=[0, 1, 30, 1, 1], device_ids=["DEVICE1", "DEVICE2"],
+                    extra_sentences=["$GPGGA,INVALID*00"] + gsv_sentences)
+    timeline_file = convert_recording_to_timeline(recording, os.path.join(tmp_path, "timeline.npz"),
+                                                  feeder_class=LogFeeder)
+    columns = load_timeline(timeline_file)
+    assert columns["device_ids"] == ["DEVICE1", "DEVICE2"]
+    assert len(columns["device_index"]) == 2 * 5 * 7
+    expected_detections, expected_state_history = run_detection(LogFeeder, recording)
+    detections, state_history = run_detection(TimelineFeeder, timeline_file)
+    assert len(expected_detections) > 0
+    assert detections == expected_detections
+    assert state_history == expected_state_history
+    assert type(state_history[0].satellites[0].pseudo_random_noise) is int
+    assert any(satellite.is_active for satellite in state_history[0].satellites)
+
+
+def test_timeline_feeder_caches_timeline(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 1, 50], speeds=[0, 1, 30], device_ids=["DEVICE1", "DEVICE2"],
+                    extra_sentences=["$GPGGA,INVALID*00"] + gsv_sentences)
+    cache_directory = os.path.join(tmp_path, "cache")
+    timeline_file = cached_timeline_file(recording, feeder_class=LogFeeder, cache_directory=cache_directory)
+    assert os.listdir(cache_directory) == [os.path.basename(timeline_file)]
+    modification_time = os.path.getmtime(timeline_file)
+    expected_detections, _ = run_detection(LogFeeder, recording)
+    detections, _ = run_detection(TimelineFeeder, recording, source_feeder_class=LogFeeder,
+                                  cache_directory=cache_directory)
+    assert detections == expected_detections
+    assert os.path.getmtime(timeline_file) == modification_time
+
+
+def test_timeline_feeder_stops_feeding(tmp_path, write_recording):
+    recording = os.path.join(tmp_path, "recording.log")
+    write_recording(recording, heights=[0, 1, 50, 3, 60], speeds=[0, 1, 1, 1, 1], device_ids=["DEVICE1", "DEVICE2"],
+                    extra_sentences=["$GPGGA,INVALID*00"] + gsv_sentences)
+    timeline_file = convert_recording_to_timeline(recording, os.path.join(tmp_path, "timeline.npz"),
+                                                  feeder_class=LogFeeder)
+    handler = DetectionHandler(device_ids=["DEVICE1"], method_classes=[PhysicalHeightLimitMethod],
+                               method_options={"min_height": 0, "max_height": 10}, detection_threshold=0,
+                               on_spoofing_attack=stop_feeding)
+    feeder = TimelineFeeder(handler, timeline_file)
+    feeder.run()
+    assert feeder.stopped
+    assert handler.device("DEVICE1").state_history.state(0).height_above_sea_level == 50
@@ -0,0 +1,79 @@
+import json
+import os
+from datetime import datetime
+
+import pytest
+
+from mana.handler import DetectionHandler
+from mana.method import Method
+from mana.tracing import Tracer, tracer, sentence_type
+
+
+class MethodDummy(Method):
+
+    def __init__(self, handler, *args, **kwargs):
+        super().__init__(handler, *args, **kwargs)
+        self.required_state_fields.extend(["latitude"])
+        self.variable_state_fields.extend(["update_time"])
+
+    def detect_spoofing_attack(self, device_id, latest_state, previous_state, state_history):
+        self._print_debug_message(latest_state.update_time, "MethodDummy", "DETECTED")
+        return 1
+
+
+@pytest.fixture
+def enabled_tracer():
+    tracer.enable()
+    yield tracer
+    tracer.disable()
+
+
+@pytest.mark.parametrize("sentence,expected_sentence_type", [
+    ("$GPGLL,5049.65778,N,00722.80053,E,164824.00,A,A*6E", "GPGLL"),
+    ("$ABC*13", "ABC"),
+    ("ABC", None),
+])
+def test_sentence_type(sentence, expected_sentence_type):
+    assert sentence_type(sentence) == expected_sentence_type
+
+
+@pytest.mark.parametrize("sample_rate,expected_sampled_count", [(1, 10), (0.5, 5), (0.1, 1), (0, 0)])
+def test_tracer_sampling(sample_rate, expected_sampled_count):
+    sampling_tracer = Tracer()
+    sampling_tracer.enable(sample_rate=sample_rate)
+    sampled_count = sum(sampling_tracer.begin_sentence("DEVICE1", "$ABC*13") for _ in range(10))
+    assert sampled_count == expected_sampled_count
+
+
+def test_tracer_max_events():
+    bounded_tracer = Tracer()
+    bounded_tracer.enable(max_events=2)
+    for _ in range(5):
+        bounded_tracer.add_instant("event", "test")
+    assert len(bounded_tracer.events) == 2
+
+
+def test_detection_handler_chrome_trace(enabled_tracer, tmp_path):
+    handler = DetectionHandler(device_ids=["DEVICE1"], method_classes=[MethodDummy], method_options={},
+                               detection_threshold=0.5, on_spoofing_attack=lambda **kwargs: None)
+    for i in range(2):
+        handler.handle(device_id="DEVICE1", time=datetime(2018, 1, 1, 0, 0, i),
+                       sentence="$GPGLL,5049.65778,N,00722.80053,E,164824.00,A,A*6E")
+    filename = os.path.join(tmp_path, "trace.json")
+    enabled_tracer.write_chrome_trace(filename)
+    with open(filename) as file:
+        trace = json.load(file)
+    events = trace["traceEvents"]
+    names = [event["name"] for event in events]
+    assert names.count("feed") == 2
+    assert names.count("parse") == 2
+    assert names.count("history_insert") == 2
+    assert names.count("MethodDummy") == 2
+    thread_names = [event for event in events if event["ph"] == "M"]
+    assert thread_names[0]["args"]["name"] == "DEVICE1"
+    method_span = [event for event in events if event["name"] == "MethodDummy" and event["ph"] == "X"][0]
+    assert method_span["args"]["device_id"] == "DEVICE1"
+    assert method_span["args"]["sentence_type"] == "GPGLL"
+    assert method_span["dur"] >= 0
+    debug_event = [event for event in events if event["ph"] == "i"][0]
+    assert "DETECTED" in debug_event["args"]["message"]
@@ -0,0 +1,66 @@
+import json
+import os
+
+import pytest
+
+from mana.feeder import LogFeeder
+from mana.method import PhysicalHeightLimitMethod, load_methods_json
+from mana.tuning import LabeledRecording, Uniform, LogUniform, grid_candidates, random_candidates, tune, \
+    save_tuning_result
+
+
+@pytest.fixture
+def labeled_recordings(tmp_path, write_recording):
+    labeled_recordings = []
+    for i in range(9):
+        is_spoofed = i % 3 == 0
+        filename = os.path.join(tmp_path, "recording{}.log".format(i))
+        write_recording(filename, [0, 2, 50 + i, 4] if is_spoofed else [0, 2, 8, 4])
+        labeled_recordings.append(LabeledRecording(filename, is_spoofed, scenario="scenario{}".format(i % 2)))
+    return labeled_recordings
+
+
+def test_grid_candidates():
+    candidates = grid_candidates({"max_speed": [1, 2], "max_height": [10, 20, 30]})
+    assert len(candidates) == 6
+    assert {"max_speed": 2, "max_height": 10} in candidates
+
+
+def test_random_candidates():
+    candidates = random_candidates({"max_speed": Uniform(1, 2), "max_height": LogUniform(10, 1000),
+                                    "min_height": [0, -10]}, count=20, seed=1)
+    assert len(candidates) == 20
+    assert all(1 <= candidate["max_speed"] <= 2 for candidate in candidates)
+    assert all(10 <= candidate["max_height"] <= 1000 for candidate in candidates)
+    assert {candidate["min_height"] for candidate in candidates} == {0, -10}
+    assert candidates == random_candidates({"max_speed": Uniform(1, 2), "max_height": LogUniform(10, 1000),
+                                            "min_height": [0, -10]}, count=20, seed=1)
+
+
+@pytest.mark.parametrize("processes", [1, 2])
+def test_tune(labeled_recordings, processes):
+    candidates = grid_candidates({"max_height": [5, 20, 100, 200], "detection_threshold": [0, 0.5]})
+    result = tune(labeled_recordings, candidates, ["DEVICE1"], [PhysicalHeightLimitMethod],
+                  {"min_height": 0, "max_height": 0}, feeder_class=LogFeeder, processes=processes, min_recordings=3,
+                  reduction_factor=2)
+    assert result.candidate["max_height"] == 20
+    assert result.method_options == {"min_height": 0, "max_height": 20}
+    assert result.f1 == 1
+    assert result.scenario_scores["scenario0"]["recordings"] + result.scenario_scores["scenario1"]["recordings"] == 9
+    evaluated_recording_counts = [count for _, _, count in result.candidate_scores]
+    assert min(evaluated_recording_counts) < 9
+    assert max(evaluated_recording_counts) == 9
+
+
+def test_save_tuning_result(labeled_recordings, tmp_path):
+    result = tune(labeled_recordings, grid_candidates({"max_height": [5, 20]}), ["DEVICE1"],
+                  [PhysicalHeightLimitMethod], {"min_height": 0}, feeder_class=LogFeeder, processes=1)
+    methods_json_filepath = os.path.join(tmp_path, "methods.json")
+    scores_filepath = os.path.join(tmp_path, "scores.json")
+    save_tuning_result(methods_json_filepath, scores_filepath, ["DEVICE1"], [PhysicalHeightLimitMethod], result)
+    _, _, method_options = load_methods_json(methods_json_filepath)
+    assert method_options == {"min_height": 0, "max_height": 20}
+    with open(scores_filepath) as f:
+        scores = json.load(f)
+    assert scores["f1"] == 1
+    assert set(scores["scenarios"]) == {"scenario0", "scenario1"}
@@ -3,7 +3,8 @@ from collections import namedtuple
 
 import pytest
 
-from mana.utility import string_to_datetime, minimum_angle_difference
+from mana.utility import string_to_datetime, minimum_angle_difference, distance_between_geograpic_positions, \
+    distances_between_geograpic_positions
 
 
 @pytest.fixture
@@ -29,3 +30,11 @@ def test_string_to_datetime(datetime_string, expected_datetime):
 def test_minimum_angle_difference(angle1, angle2, expected_angle_difference):
     angle_difference = minimum_angle_difference(angle1, angle2)
     assert angle_difference == pytest.approx(expected_angle_difference)
+
+
+def test_distances_between_geograpic_positions():
+    positions = [(0, 0, 0, 1), (54.3, 10.1, 54.30004, 10.1), (-33.9, 151.2, 51.5, -0.1)]
+    latitudes1, longitudes1, latitudes2, longitudes2 = zip(*positions)
+    distances = distances_between_geograpic_positions(latitudes1, longitudes1, latitudes2, longitudes2)
+    for distance, position in zip(distances, positions):
+        assert distance == pytest.approx(distance_between_geograpic_positions(*position))
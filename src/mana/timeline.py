@@ -0,0 +1,205 @@
+import hashlib
+import importlib
+import os
+import tempfile
+
+from mana.feeder import Feeder, PcapFeeder, StopFeeding
+from mana.handler import StateHistoryHandler
+from mana.result_cache import file_digest, qualified_name
+from mana.state import NmeaState, SatelliteState
+from mana.utility import lazy_import
+
+np = lazy_import("numpy")
+
+timeline_version = 1
+timeline_float_fields = ["latitude", "longitude", "height_above_sea_level", "speed", "course", "magnetic_declination",
+                         "geoidal_separation", "positional_dilution_of_precision", "horizontal_dilution_of_precision",
+                         "vertical_dilution_of_precision"]
+timeline_integer_fields = ["gps_quality"]
+timeline_time_fields = ["update_time", "gps_time"]
+timeline_satellite_integer_fields = ["pseudo_random_noise", "elevation", "azimuth", "carrier_to_noise_density"]
+timeline_satellite_boolean_fields = ["is_visible", "is_active"]
+parser_module_names = ["mana.feeder", "mana.handler", "mana.nmea_parser", "mana.state", "mana.timeline"]
+
+
+class TimelineRecordingHandler(StateHistoryHandler):
+
+    def __init__(self, device_ids=None):
+        super().__init__(device_ids or [])
+        self.record_all_devices = device_ids is None
+        self.timeline_device_ids = []
+        self.timeline_device_indices = {}
+        self.columns = {name: [] for name in ["device_index", "last_nmea_sentence", "satellite_count"]
+                        + timeline_time_fields + timeline_float_fields + timeline_integer_fields
+                        + timeline_satellite_integer_fields + timeline_satellite_boolean_fields}
+
+    def device(self, device_id):
+        device = self.devices_by_id.get(device_id)
+        if device is None and self.record_all_devices:
+            device = self.create_device(device_id)
+            self.devices.append(device)
+            self.devices_by_id[device_id] = device
+        return device
+
+    def handle_state(self, device_id, latest_state, state_history):
+        columns = self.columns
+        device_index = self.timeline_device_indices.get(device_id)
+        if device_index is None:
+            device_index = len(self.timeline_device_ids)
+            self.timeline_device_ids.append(device_id)
+            self.timeline_device_indices[device_id] = device_index
+        columns["device_index"].append(device_index)
+        columns["last_nmea_sentence"].append((latest_state.last_nmea_sentence or "").encode())
+        for name in timeline_time_fields + timeline_float_fields + timeline_integer_fields:
+            columns[name].append(getattr(latest_state, name))
+        columns["satellite_count"].append(len(latest_state.satellites))
+        for satellite_state in latest_state.satellites:
+            for name in timeline_satellite_integer_fields + timeline_satellite_boolean_fields:
+                columns[name].append(getattr(satellite_state, name))
+
+    def save_timeline(self, timeline_file):
+        columns = self.columns
+        arrays = {
+            "version": np.array(timeline_version),
+            "device_ids": np.array(self.timeline_device_ids, dtype=str),
+            "device_index": np.array(columns["device_index"], dtype=np.int32),
+            "last_nmea_sentence": np.array(columns["last_nmea_sentence"], dtype=bytes),
+            "satellite_count": np.array(columns["satellite_count"], dtype=np.int32),
+        }
+        for name in timeline_time_fields:
+            arrays[name] = np.array(columns[name], dtype="datetime64[us]")
+        for name in timeline_float_fields + timeline_integer_fields + timeline_satellite_integer_fields:
+            arrays[name] = np.array([np.nan if value is None else value for value in columns[name]], dtype=float)
+        for name in timeline_satellite_boolean_fields:
+            arrays[name] = np.array(columns[name], dtype=bool)
+        directory = os.path.dirname(os.path.abspath(timeline_file))
+        os.makedirs(directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=directory, suffix=".npz", delete=False) as file:
+            np.savez_compressed(file, **arrays)
+        os.replace(file.name, timeline_file)
+
+
+class TimelineFeeder(Feeder):
+
+    def __init__(self, handler, recording, source_feeder_class=PcapFeeder, cache_directory=None):
+        super().__init__(handler)
+        self.recording = recording
+        self.source_feeder_class = source_feeder_class
+        self.cache_directory = cache_directory
+        self.row = None
+
+    def run(self):
+        columns = load_timeline(self.timeline_file())
+        device_ids = columns["device_ids"]
+        satellite_start = 0
+        for i, device_index in enumerate(columns["device_index"]):
+            if self.stopped:
+                break
+            self.row = i
+            self.record_input()
+            satellite_end = satellite_start + columns["satellite_count"][i]
+            device = self.handler.device(device_ids[device_index])
+            if device is not None:
+                latest_state = device.state_history.state(0)
+                if latest_state is None:
+                    latest_state = NmeaState()
+                set_timeline_state(latest_state, columns, i, satellite_start, satellite_end)
+                try:
+                    self.handler.handle_parsed_state(device, latest_state)
+                except StopFeeding:
+                    self.stop()
+            satellite_start = satellite_end
+
+    def timeline_file(self):
+        if self.recording.endswith(".npz"):
+            return self.recording
+        return cached_timeline_file(self.recording, self.source_feeder_class, self.cache_directory)
+
+
+def set_timeline_state(state, columns, i, satellite_start, satellite_end):
+    state.last_nmea_sentence = columns["last_nmea_sentence"][i].decode()
+    for name in timeline_time_fields + timeline_float_fields:
+        setattr(state, name, columns[name][i])
+    for name in timeline_integer_fields:
+        value = columns[name][i]
+        setattr(state, name, None if value is None else int(value))
+    satellites = []
+    for j in range(satellite_start, satellite_end):
+        satellite_state = SatelliteState()
+        for name in timeline_satellite_integer_fields:
+            value = columns[name][j]
+            setattr(satellite_state, name, None if value is None else int(value))
+        for name in timeline_satellite_boolean_fields:
+            setattr(satellite_state, name, columns[name][j])
+        satellites.append(satellite_state)
+    state.satellites = satellites
+
+
+def load_timeline(timeline_file):
+    arrays = load_timeline_arrays(timeline_file)
+    columns = {"device_ids": arrays["device_ids"].tolist()}
+    for name in ["device_index", "last_nmea_sentence", "satellite_count"] + timeline_time_fields \
+            + timeline_satellite_boolean_fields:
+        columns[name] = arrays[name].tolist()
+    for name in timeline_float_fields + timeline_integer_fields + timeline_satellite_integer_fields:
+        values = arrays[name]
+        columns[name] = np.where(np.isnan(values), None, values).tolist()
+    return columns
+
+
+def load_timeline_arrays(timeline_file):
+    with np.load(timeline_file) as arrays:
+        if int(arrays["version"]) != timeline_version:
+            raise ValueError("Unsupported timeline version {}".format(int(arrays["version"])))
+        columns = {name: arrays[name] for name in arrays.files if name != "version"}
+    columns["satellite_end"] = np.cumsum(columns["satellite_count"])
+    columns["satellite_start"] = columns["satellite_end"] - columns["satellite_count"]
+    return columns
+
+
+def timeline_state(columns, i):
+    # Rebuilds the parsed state of a single row from the arrays of load_timeline_arrays
+    row_columns = {"last_nmea_sentence": [columns["last_nmea_sentence"][i]]}
+    for name in timeline_time_fields:
+        row_columns[name] = [columns[name][i].item()]
+    for name in timeline_float_fields + timeline_integer_fields:
+        value = columns[name][i]
+        row_columns[name] = [None if np.isnan(value) else float(value)]
+    satellites = slice(columns["satellite_start"][i], columns["satellite_end"][i])
+    for name in timeline_satellite_integer_fields:
+        values = columns[name][satellites]
+        row_columns[name] = np.where(np.isnan(values), None, values).tolist()
+    for name in timeline_satellite_boolean_fields:
+        row_columns[name] = columns[name][satellites].tolist()
+    state = NmeaState()
+    set_timeline_state(state, row_columns, 0, 0, satellites.stop - satellites.start)
+    return state
+
+
+def convert_recording_to_timeline(recording, timeline_file, feeder_class=PcapFeeder, device_ids=None):
+    handler = TimelineRecordingHandler(device_ids)
+    feeder_class(handler, recording).run()
+    handler.save_timeline(timeline_file)
+    return timeline_file
+
+
+def default_timeline_cache_directory():
+    return os.path.join(os.environ.get("MANA_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "mana")),
+                        "timelines")
+
+
+def parser_code_version():
+    digest = hashlib.sha256()
+    for module_name in parser_module_names:
+        with open(importlib.import_module(module_name).__file__, "rb") as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def cached_timeline_file(recording, feeder_class=PcapFeeder, cache_directory=None):
+    key = hashlib.sha256("{}:{}:{}".format(file_digest(recording), qualified_name(feeder_class),
+                                           parser_code_version()).encode()).hexdigest()
+    timeline_file = os.path.join(cache_directory or default_timeline_cache_directory(), key + ".npz")
+    if not os.path.exists(timeline_file):
+        convert_recording_to_timeline(recording, timeline_file, feeder_class=feeder_class)
+    return timeline_file
@@ -0,0 +1,105 @@
+import json
+import math
+import os
+from collections import deque
+from threading import local
+from time import perf_counter_ns
+
+
+def sentence_type(sentence):
+    if not sentence.startswith('$'):
+        return None
+    return sentence[1:7].split(',')[0].split('*')[0]
+
+
+class Tracer:
+
+    def __init__(self):
+        self.enabled = False
+        self.sample_rate = 1.0
+        self.events = deque()
+        self.sentence_count = 0
+        self.thread_ids = {}
+        self.context = local()
+        self.start_time = perf_counter_ns()
+
+    def enable(self, sample_rate=1.0, max_events=1000000):
+        self.sample_rate = sample_rate
+        self.events = deque(maxlen=max_events)
+        self.sentence_count = 0
+        self.thread_ids = {}
+        self.start_time = perf_counter_ns()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def begin_sentence(self, device_id, sentence):
+        self.sentence_count += 1
+        is_sampled = math.floor(self.sentence_count * self.sample_rate) > \
+            math.floor((self.sentence_count - 1) * self.sample_rate)
+        self.context.is_sampled = is_sampled
+        if is_sampled:
+            self.context.device_id = device_id
+            self.context.sentence_type = sentence_type(sentence)
+        return is_sampled
+
+    def end_sentence(self, start_time):
+        self.add_span("feed", "handler", start_time)
+        self.context.is_sampled = False
+
+    def is_sampled(self):
+        return getattr(self.context, "is_sampled", False)
+
+    @staticmethod
+    def now():
+        return perf_counter_ns()
+
+    def add_span(self, name, category, start_time, end_time=None, **args):
+        if end_time is None:
+            end_time = perf_counter_ns()
+        event = self.create_event(name, category, "X", start_time, args)
+        event["dur"] = (end_time - start_time) / 1000
+        self.events.append(event)
+
+    def add_instant(self, name, category, **args):
+        event = self.create_event(name, category, "i", perf_counter_ns(), args)
+        event["s"] = "t"
+        self.events.append(event)
+
+    def create_event(self, name, category, phase, time, args):
+        device_id = getattr(self.context, "device_id", None)
+        args["device_id"] = device_id
+        args["sentence_type"] = getattr(self.context, "sentence_type", None)
+        return {
+            "name": name,
+            "cat": category,
+            "ph": phase,
+            "ts": (time - self.start_time) / 1000,
+            "pid": os.getpid(),
+            "tid": self.thread_id(device_id),
+            "args": args,
+        }
+
+    def thread_id(self, device_id):
+        thread_id = self.thread_ids.get(device_id)
+        if thread_id is None:
+            thread_id = self.thread_ids.setdefault(device_id, len(self.thread_ids) + 1)
+        return thread_id
+
+    def chrome_trace(self):
+        metadata_events = [{
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": thread_id,
+            "args": {"name": str(device_id)},
+        } for device_id, thread_id in self.thread_ids.items()]
+        return {"traceEvents": metadata_events + list(self.events), "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, filename):
+        with open(filename, 'w') as file:
+            json.dump(self.chrome_trace(), file)
+
+
+tracer = Tracer()
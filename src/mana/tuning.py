@@ -0,0 +1,169 @@
+import itertools
+import json
+import math
+import random
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from mana.feeder import PcapFeeder, StopFeeding
+from mana.handler import DetectionConfiguration, MultiConfigurationDetectionHandler
+from mana.method import save_methods_json
+from mana.utility import calculate_precision_recall_f1
+
+
+class LabeledRecording:
+
+    def __init__(self, recording, is_spoofed, scenario=None):
+        self.recording = recording
+        self.is_spoofed = is_spoofed
+        self.scenario = scenario
+
+
+class Uniform:
+
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+    def sample(self, random_generator):
+        return random_generator.uniform(self.low, self.high)
+
+
+class LogUniform(Uniform):
+
+    def sample(self, random_generator):
+        return math.exp(random_generator.uniform(math.log(self.low), math.log(self.high)))
+
+
+class TuningResult:
+
+    def __init__(self, candidate, method_options, detection_threshold, precision, recall, f1, scenario_scores,
+                 candidate_scores):
+        self.candidate = candidate
+        self.method_options = method_options
+        self.detection_threshold = detection_threshold
+        self.precision = precision
+        self.recall = recall
+        self.f1 = f1
+        self.scenario_scores = scenario_scores
+        self.candidate_scores = candidate_scores
+
+
+def grid_candidates(search_space):
+    names = list(search_space)
+    return [dict(zip(names, values)) for values in itertools.product(*search_space.values())]
+
+
+def random_candidates(search_space, count, seed=0):
+    random_generator = random.Random(seed)
+    return [{name: sample_value(space, random_generator) for name, space in search_space.items()}
+            for _ in range(count)]
+
+
+def sample_value(space, random_generator):
+    if isinstance(space, Uniform):
+        return space.sample(random_generator)
+    return random_generator.choice(space)
+
+
+def candidate_configuration(index, candidate, device_ids, method_classes, method_options, detection_threshold):
+    candidate = dict(candidate)
+    detection_threshold = candidate.pop("detection_threshold", detection_threshold)
+    return DetectionConfiguration(index, device_ids, method_classes, dict(method_options, **candidate),
+                                  detection_threshold)
+
+
+def detect_configurations(recording, configurations, feeder_class=PcapFeeder):
+    handler = MultiConfigurationDetectionHandler(configurations)
+
+    def stop_when_all_detected(**_detection):
+        if all(count > 0 for count in handler.detection_counts.values()):
+            raise StopFeeding()
+
+    handler.on_spoofing_attack = stop_when_all_detected
+    feeder_class(handler, recording).run()
+    return [handler.detection_counts[configuration.name] > 0 for configuration in configurations]
+
+
+def detection_scores(labeled_recordings, detections):
+    tp = sum(1 for r, d in zip(labeled_recordings, detections) if d and r.is_spoofed)
+    fp = sum(1 for r, d in zip(labeled_recordings, detections) if d and not r.is_spoofed)
+    fn = sum(1 for r, d in zip(labeled_recordings, detections) if not d and r.is_spoofed)
+    return calculate_precision_recall_f1(tp, fp, fn)
+
+
+def scenario_scores(labeled_recordings, detections):
+    scenarios = {}
+    for labeled_recording, detection in zip(labeled_recordings, detections):
+        scenario_recordings, scenario_detections = scenarios.setdefault(labeled_recording.scenario, ([], []))
+        scenario_recordings.append(labeled_recording)
+        scenario_detections.append(detection)
+    scores = {}
+    for scenario, (scenario_recordings, scenario_detections) in scenarios.items():
+        precision, recall, f1 = detection_scores(scenario_recordings, scenario_detections)
+        scores[scenario] = {"recordings": len(scenario_recordings), "precision": precision, "recall": recall,
+                            "f1": f1}
+    return scores
+
+
+def tune(labeled_recordings, candidates, device_ids, method_classes, method_options, detection_threshold=0.1,
+         feeder_class=PcapFeeder, processes=None, min_recordings=10, reduction_factor=3, seed=0):
+    configurations = [candidate_configuration(i, candidate, device_ids, method_classes, method_options,
+                                              detection_threshold) for i, candidate in enumerate(candidates)]
+    labeled_recordings = list(labeled_recordings)
+    random.Random(seed).shuffle(labeled_recordings)
+    rounds = math.ceil(math.log(max(len(candidates), 1), reduction_factor))
+    recording_count = min(len(labeled_recordings),
+                          max(min_recordings, math.ceil(len(labeled_recordings) / reduction_factor ** rounds)))
+    detections = [[] for _ in candidates]
+    survivors = list(range(len(candidates)))
+    candidate_scores = {}
+    executor = ProcessPoolExecutor(processes) if processes != 1 else None
+    try:
+        while True:
+            # Successive halving: all survivors are evaluated on the same prefix of the shuffled recordings, so the
+            # results of earlier rounds are kept and only the new recordings of the prefix are processed
+            start = len(detections[survivors[0]])
+            pending_recordings = [r.recording for r in labeled_recordings[start:recording_count]]
+            detect = partial(detect_configurations, configurations=[configurations[i] for i in survivors],
+                             feeder_class=feeder_class)
+            if executor is None:
+                recording_detections = [detect(recording) for recording in pending_recordings]
+            else:
+                recording_detections = list(executor.map(detect, pending_recordings))
+            for detection in recording_detections:
+                for i, is_detected in zip(survivors, detection):
+                    detections[i].append(is_detected)
+            for i in survivors:
+                f1 = detection_scores(labeled_recordings[:recording_count], detections[i])[2] or 0
+                candidate_scores[i] = (f1, recording_count)
+            survivors.sort(key=lambda i: candidate_scores[i][0], reverse=True)
+            if recording_count == len(labeled_recordings) or len(survivors) == 1:
+                break
+            survivors = survivors[:max(1, math.ceil(len(survivors) / reduction_factor))]
+            recording_count = min(len(labeled_recordings), recording_count * reduction_factor)
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    best = survivors[0]
+    evaluated_recordings = labeled_recordings[:len(detections[best])]
+    precision, recall, f1 = detection_scores(evaluated_recordings, detections[best])
+    return TuningResult(candidates[best], configurations[best].method_options, configurations[best].detection_threshold,
+                        precision, recall, f1, scenario_scores(evaluated_recordings, detections[best]),
+                        [(candidates[i], f1, count) for i, (f1, count) in sorted(candidate_scores.items())])
+
+
+def save_tuning_result(methods_json_filepath, scores_filepath, device_ids, method_classes, result):
+    save_methods_json(methods_json_filepath, device_ids, method_classes, result.method_options)
+    scores = {
+        "candidate": {key: repr(value) if isinstance(value, dict) else value
+                      for key, value in result.candidate.items()},
+        "detection_threshold": result.detection_threshold,
+        "precision": result.precision,
+        "recall": result.recall,
+        "f1": result.f1,
+        "scenarios": {str(scenario): score for scenario, score in result.scenario_scores.items()},
+    }
+    with open(scores_filepath, "w") as f:
+        json.dump(scores, f, indent=2)
@@ -1,5 +1,30 @@
 import datetime
+import importlib
+import importlib.util
 import math
+import sys
+
+
+def lazy_import(name):
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError("No module named '{}'".format(name), name=name)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def import_object(path):
+    module_name, _, attribute_name = path.partition(":")
+    return getattr(importlib.import_module(module_name), attribute_name)
+
+
+np = lazy_import("numpy")
 
 
 def string_to_datetime(datetime_string):
@@ -43,6 +68,17 @@ def distance_between_geograpic_positions(latitude1, longitude1, latitude2, longi
     return distance
 
 
+def distances_between_geograpic_positions(latitudes1, longitudes1, latitudes2, longitudes2):
+    latitudes1 = np.radians(latitudes1)
+    latitudes2 = np.radians(latitudes2)
+    dlon = np.radians(longitudes2) - np.radians(longitudes1)
+    dlat = latitudes2 - latitudes1
+    a = np.sin(dlat / 2) ** 2 + np.cos(latitudes1) * np.cos(latitudes2) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    distances = 6378100 * c
+    return distances
+
+
 def calculate_precision_recall_f1(tp, fp, fn):
     try:
         precision = tp / (tp + fp)